@@ -1,8 +1,11 @@
-import os
-import shutil
 from pathlib import Path
+import argparse
 import logging
 
+from manifest import Manifest
+from materialize import MATERIALIZE_MODES, LayoutSync
+from plugin_tree import category_letter, iter_plugin_dirs
+
 # Logging setup
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -10,17 +13,26 @@ logger = logging.getLogger(__name__)
 class AlphabeticalCategorizer:
     """Class for simple categorization of plugins by the first letter of their name"""
     
-    def __init__(self, source_dir="plugins", output_dir="alpha_plugins"):
+    def __init__(self, source_dir="plugins", output_dir="alpha_plugins", mode="copy"):
         self.source_dir = Path(source_dir)
         self.output_dir = Path(output_dir)
         
         # Make sure the output directory exists
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Manifest of the source tree, maintained by the organizer
+        self.manifest = Manifest(self.source_dir)
+        
+        # Materialization mode: copy, hardlink, reflink or symlink
+        self.layout = LayoutSync(self.output_dir, mode, manifest=self.manifest)
     
     def categorize(self):
         """Distributes plugins into alphabetical categories (by first letter)"""
-        # Get a list of all plugins
-        plugin_dirs = [d for d in self.source_dir.iterdir() if d.is_dir()]
+        # Get a list of all plugins from the manifest, walking the tree (flat or lettered) only if there is none
+        if len(self.manifest):
+            plugin_dirs = self.manifest.plugin_dirs()
+        else:
+            plugin_dirs = list(iter_plugin_dirs(self.source_dir))
         total_plugins = len(plugin_dirs)
         
         logger.info(f"Found {total_plugins} plugins to categorize")
@@ -30,26 +42,17 @@ class AlphabeticalCategorizer:
         
         for plugin_dir in plugin_dirs:
             # Take the first letter of the plugin name in uppercase
-            first_letter = plugin_dir.name[0].upper()
+            first_letter = category_letter(plugin_dir.name)
             
             # Add the plugin to the appropriate category
             if first_letter not in categories:
                 categories[first_letter] = []
             categories[first_letter].append(plugin_dir)
         
-        # Create category directories and copy files
+        # Create category directories and place only the plugins that changed
         for letter, plugins in categories.items():
-            category_dir = self.output_dir / letter
-            category_dir.mkdir(exist_ok=True)
-            
             logger.info(f"Creating category {letter} with {len(plugins)} plugins")
-            
-            for plugin_dir in plugins:
-                # Copy the plugin directory to the category
-                dest_dir = category_dir / plugin_dir.name
-                if dest_dir.exists():
-                    shutil.rmtree(dest_dir)
-                shutil.copytree(plugin_dir, dest_dir)
+        self.layout.sync(categories)
         
         logger.info(f"Categorization complete. Created {len(categories)} categories.")
         
@@ -61,8 +64,13 @@ class AlphabeticalCategorizer:
         return categories
 
 def main():
+    arg_parser = argparse.ArgumentParser(description="Categorize plugins by the first letter of their name")
+    arg_parser.add_argument("--mode", default="copy", choices=MATERIALIZE_MODES,
+                            help="how plugins are placed into categories")
+    args = arg_parser.parse_args()
+    
     # Create a class instance and run categorization
-    categorizer = AlphabeticalCategorizer()
+    categorizer = AlphabeticalCategorizer(mode=args.mode)
     categories = categorizer.categorize()
 
 if __name__ == "__main__":
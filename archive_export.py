@@ -0,0 +1,215 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from manifest import Manifest, hash_file, list_files
+from plugin_tree import category_letter
+from storage import atomic_write, temp_path_for
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Фиксированные дата, права и ОС создателя записей: одинаковое дерево дает побайтно одинаковый архив
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+ZIP_FILE_MODE = 0o644 << 16
+ZIP_CREATE_SYSTEM = 3
+INDEX_NAME = "index.json"
+COPY_CHUNK = 1 << 20
+
+def _zip_info(name: str, size: int) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(name, ZIP_DATE)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.external_attr = ZIP_FILE_MODE
+    info.create_system = ZIP_CREATE_SYSTEM
+    info.file_size = size
+    return info
+
+def build_archive(archive_path: str, tree_root: str, plugins: List[Tuple[str, Dict]], category: str) -> Dict:
+    """Упаковывает плагины (ключ манифеста и запись) в zip с индексом; выполняется в пуле процессов.
+
+    Файлы читаются и сжимаются потоково, частями по COPY_CHUNK. Последней
+    записью идет index.json: для каждого плагина — его файлы с размером,
+    SHA-256, смещением локального заголовка и сжатым размером, так что один
+    плагин можно достать по смещениям без распаковки остальных.
+    """
+    start = time.monotonic()
+    archive_path = Path(archive_path)
+    tree_root = Path(tree_root)
+    tmp_path = temp_path_for(archive_path, str(os.getpid()))
+    index = {}
+    total_bytes = 0
+
+    try:
+        with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for key, entry in sorted(plugins):
+                plugin_dir = tree_root / key
+                files = {}
+                for name in sorted(list_files(plugin_dir)):
+                    member = f"{key}/{name}"
+                    path = plugin_dir / name
+                    sha256 = hashlib.sha256()
+                    info = _zip_info(member, path.stat().st_size)
+                    with open(path, 'rb') as src, archive.open(info, 'w') as dst:
+                        for chunk in iter(lambda: src.read(COPY_CHUNK), b""):
+                            sha256.update(chunk)
+                            dst.write(chunk)
+                    files[name] = {"size": info.file_size, "sha256": sha256.hexdigest(),
+                                   "offset": info.header_offset, "compressed_size": info.compress_size}
+                    total_bytes += info.file_size
+                index[key] = {"id": entry.get("id"), "name": entry.get("name"),
+                              "latest_version": entry.get("latest_version"), "files": files}
+
+            index_data = json.dumps({"category": category, "plugins": index}, ensure_ascii=False,
+                                    sort_keys=True, indent=1).encode("utf-8")
+            archive.writestr(_zip_info(INDEX_NAME, len(index_data)), index_data)
+        os.replace(tmp_path, archive_path)
+    except BaseException:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+
+    return {
+        "file": archive_path.name,
+        "category": category,
+        "plugins": len(index),
+        "bytes": total_bytes,
+        "size": archive_path.stat().st_size,
+        "sha256": hash_file(archive_path),
+        "seconds": round(time.monotonic() - start, 3)
+    }
+
+def read_index(archive_path: str) -> Dict:
+    """Индекс архива (читается через центральный каталог zip, без распаковки остального)"""
+    with zipfile.ZipFile(archive_path) as archive:
+        return json.loads(archive.read(INDEX_NAME))
+
+def extract_plugin(archive_path: str, key: str, dest_dir: str) -> List[Path]:
+    """Извлекает из архива один плагин (по ключу вида "A/AFK" или по id) в dest_dir"""
+    index = read_index(archive_path)["plugins"]
+    if key not in index:
+        matches = [plugin_key for plugin_key, plugin in index.items() if plugin.get("id") == key]
+        if not matches:
+            raise KeyError(f"Plugin {key} is not in {archive_path}")
+        key = matches[0]
+
+    written = []
+    with zipfile.ZipFile(archive_path) as archive:
+        for name, meta in sorted(index[key]["files"].items()):
+            target = Path(dest_dir) / key / name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            data = archive.read(f"{key}/{name}")
+            if hashlib.sha256(data).hexdigest() != meta["sha256"]:
+                raise ValueError(f"Checksum mismatch for {key}/{name} in {archive_path}")
+            atomic_write(target, data)
+            written.append(target)
+    return written
+
+class ArchiveExporter:
+    """Сборка архивов для релизов: по архиву на категорию и один архив со всем деревом.
+
+    Список плагинов берется из манифеста дерева. Категории — буквенные
+    директории (by="letters") или корзины PluginCategorizer.optimize_categories
+    (by="buckets"). Архивы собираются параллельно в пуле процессов, начиная с
+    самых больших, а в output_dir/index.json записываются их размеры и хеши.
+    """
+
+    def __init__(self, tree_root: str = "plugins", output_dir: str = "release_archives",
+                 workers: Optional[int] = None):
+        self.tree_root = Path(tree_root)
+        self.output_dir = Path(output_dir)
+        self.workers = workers
+        self.manifest = Manifest(tree_root)
+        if not len(self.manifest):
+            # Манифеста еще нет — строим его в памяти, ничего не записывая в дерево
+            self.manifest.build()
+
+    def categories(self, by: str = "letters", max_plugins_per_category: int = 250) -> Dict[str, List[str]]:
+        """Ключи манифеста плагинов по категориям"""
+        by_letter: Dict[str, List[Path]] = {}
+        for plugin_dir in self.manifest.plugin_dirs():
+            by_letter.setdefault(category_letter(plugin_dir.name), []).append(plugin_dir)
+
+        if by == "letters":
+            groups = by_letter
+        elif by == "buckets":
+            from categorize_plugins import PluginCategorizer
+            categorizer = PluginCategorizer(str(self.tree_root), str(self.output_dir), max_plugins_per_category)
+            groups = categorizer.optimize_categories(
+                {letter: sorted(dirs, key=lambda d: d.name.lower()) for letter, dirs in by_letter.items()})
+        else:
+            raise ValueError(f"Unknown category scheme: {by} (expected letters or buckets)")
+        return {name: [self.manifest.key_for(plugin_dir) for plugin_dir in dirs]
+                for name, dirs in sorted(groups.items())}
+
+    def export(self, by: str = "letters", max_plugins_per_category: int = 250,
+               full_archive: bool = True) -> Dict:
+        start = time.monotonic()
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+        tasks = []
+        for category, keys in self.categories(by, max_plugins_per_category).items():
+            tasks.append((f"plugins-{category}.zip", category, keys))
+        if full_archive:
+            tasks.append(("plugins-all.zip", "all",
+                          [self.manifest.key_for(plugin_dir) for plugin_dir in self.manifest.plugin_dirs()]))
+
+        def task_size(task) -> int:
+            return sum(sum(record[0] for record in self.manifest.get(key)["files"].values()) for key in task[2])
+
+        # Самые большие архивы запускаются первыми, чтобы пул не ждал одного долгого в конце
+        tasks.sort(key=task_size, reverse=True)
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = [
+                executor.submit(build_archive, str(self.output_dir / file_name), str(self.tree_root),
+                                [(key, self.manifest.get(key)) for key in keys], category)
+                for file_name, category, keys in tasks
+            ]
+            archives = [future.result() for future in futures]
+
+        archives.sort(key=lambda archive: archive["file"])
+        for archive in archives:
+            logger.info(f"{archive['file']}: {archive['plugins']} plugins, {archive['bytes']} -> {archive['size']} "
+                        f"bytes in {archive['seconds']:.2f}s")
+        release_index = {"categories": by, "archives": [
+            {key: value for key, value in archive.items() if key != "seconds"} for archive in archives
+        ]}
+        atomic_write(self.output_dir / "index.json",
+                     json.dumps(release_index, ensure_ascii=False, indent=2).encode("utf-8"))
+        logger.info(f"Exported {len(archives)} archives to {self.output_dir} in {time.monotonic() - start:.2f}s")
+        return release_index
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Pack the organized plugin tree into release archives")
+    arg_parser.add_argument("command", nargs="?", default="build", choices=("build", "extract"))
+    arg_parser.add_argument("--tree", default="plugins", help="organized plugin tree")
+    arg_parser.add_argument("--output", default="release_archives", help="directory for the archives")
+    arg_parser.add_argument("--by", default="letters", choices=("letters", "buckets"),
+                            help="one archive per letter folder or per PluginCategorizer bucket")
+    arg_parser.add_argument("--max-per-category", type=int, default=250, help="bucket size for --by buckets")
+    arg_parser.add_argument("--no-full", action="store_true", help="skip the full-dataset archive")
+    arg_parser.add_argument("--workers", type=int, help="number of compression processes")
+    arg_parser.add_argument("--archive", help="archive to extract from")
+    arg_parser.add_argument("--plugin", help="plugin to extract (key such as A/AFK, or plugin id)")
+    arg_parser.add_argument("--dest", default=".", help="extraction directory")
+    args = arg_parser.parse_args()
+
+    if args.command == "extract":
+        if not args.archive or not args.plugin:
+            arg_parser.error("extract requires --archive and --plugin")
+        for path in extract_plugin(args.archive, args.plugin, args.dest):
+            logger.info(f"Extracted {path}")
+        return
+
+    exporter = ArchiveExporter(args.tree, args.output, args.workers)
+    exporter.export(args.by, args.max_per_category, full_archive=not args.no_full)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from rate_limiter import AdaptiveRateLimiter, parse_retry_after
+from umod_parser import Plugin, UmodParser
+
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class AsyncUmodParser(UmodParser):
+    """Асинхронный вариант UmodParser на aiohttp.
+
+    Все запросы идут через одну ClientSession с пулом соединений, число
+    одновременных запросов ограничено concurrency, а темп задается
+    AdaptiveRateLimiter вместо фиксированных пауз. Результат — те же объекты
+    Plugin и те же файлы в output_dir, что и у потокового UmodParser.
+    """
+
+    def __init__(self, output_dir: str = "plugins_data", max_pages: int = 3, concurrency: int = 8,
+                 per_page: int = 10, max_retries: int = 3, request_timeout: float = 30.0,
+                 base_url: str = UmodParser.BASE_URL, rate_limiter: Optional[AdaptiveRateLimiter] = None):
+        super().__init__(output_dir=output_dir, max_workers=concurrency, max_pages=max_pages, base_url=base_url,
+                         rate_limiter=rate_limiter or AdaptiveRateLimiter(initial_rate=4.0, max_rate=20.0),
+                         max_retries=max_retries)
+        self.concurrency = concurrency
+        self.per_page = per_page
+        self.request_timeout = request_timeout
+
+    async def _fetch_json(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                          url: str, params: Dict = None) -> Dict:
+        """Выполняет GET запрос и возвращает JSON с повторами при 429 и сетевых ошибках"""
+        for attempt in range(self.max_retries):
+            # Пауза после 429 тоже выдерживается здесь: ограничитель общий для всех задач
+            await self.rate_limiter.acquire_async()
+
+            try:
+                async with semaphore:
+                    logger.debug(f"Making request to {url}")
+                    start = time.monotonic()
+                    async with session.get(url, params=params) as response:
+                        if response.status == 429:
+                            wait_time = self.rate_limiter.on_throttle(
+                                parse_retry_after(response.headers.get("Retry-After")))
+                            logger.warning(f"Rate limit hit, slowing down to {self.rate_limiter.current_rate:.2f} "
+                                           f"req/s and waiting {wait_time:.2f} seconds before retry")
+                            continue
+                        response.raise_for_status()
+                        data = await response.json(content_type=None)
+                        self.rate_limiter.on_success(time.monotonic() - start)
+                        return data
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status = getattr(e, "status", None)
+                if status is None or status >= 500:
+                    self.rate_limiter.on_error()
+                if attempt == self.max_retries - 1:
+                    logger.error(f"Error making request to {url}: {e}")
+                    raise
+                logger.warning(f"Request failed ({e}), retrying at {self.rate_limiter.current_rate:.2f} req/s...")
+
+        raise Exception("Max retries exceeded")
+
+    async def _fetch_page(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                          page: int) -> List[Dict]:
+        """Загружает одну страницу поиска, при ошибке возвращает пустой список"""
+        try:
+            data = await self._fetch_json(session, semaphore, self.SEARCH_URL,
+                                          self._search_params(page, self.per_page))
+            page_data = data.get("data") or []
+            logger.info(f"Received {len(page_data)} plugins on page {page}")
+            return page_data
+        except Exception as e:
+            logger.error(f"Error fetching bulk page {page}: {e}")
+            return []
+
+    def _handle_page(self, page_data: List[Dict], plugins: List[Plugin]):
+        """Обрабатывает и сохраняет плагины одной страницы и сохраняет состояние обхода.
+
+        Страница записывается одним батчем через журнал, как пакет потокового
+        парсера (UmodParser._process_batch). Вся работа с диском синхронная,
+        поэтому вызывается через run_in_executor, чтобы не останавливать цикл
+        событий с запросами в полете.
+        """
+        self._process_batch(page_data, plugins)
+        if self.manifest is not None:
+            self.manifest.save()
+
+    async def get_all_plugins_async(self) -> List[Plugin]:
+        """Получает список плагинов, загружая страницы поиска параллельно"""
+        plugins = []
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.request_timeout)
+
+        try:
+            async with aiohttp.ClientSession(headers=dict(self.session.headers), connector=connector,
+                                             timeout=timeout) as session:
+                # Первая страница нужна, чтобы узнать общее количество страниц
+                try:
+                    first = await self._fetch_json(session, semaphore, self.SEARCH_URL,
+                                                   self._search_params(1, self.per_page))
+                except Exception as e:
+                    logger.error(f"Error fetching bulk page 1: {e}")
+                    return plugins
+
+                if not first.get("data"):
+                    logger.warning("No data in response")
+                    return plugins
+
+                total_pages = min(int(first.get("last_page", 1)), self.max_pages)
+                logger.info(f"Fetched page 1 of {total_pages} ({len(first['data'])} plugins)")
+                await loop.run_in_executor(None, self._handle_page, first["data"], plugins)
+
+                # Остальные страницы обрабатываем по мере поступления
+                tasks = [
+                    asyncio.create_task(self._fetch_page(session, semaphore, page))
+                    for page in range(2, total_pages + 1)
+                ]
+                for task in asyncio.as_completed(tasks):
+                    await loop.run_in_executor(None, self._handle_page, await task, plugins)
+        finally:
+            # Журнал записи закрывается и при ошибке обхода
+            if self.storage is not None:
+                self.storage.close()
+
+        logger.info(f"Total plugins found: {len(plugins)}")
+        self._save_dataset(plugins)
+        self._print_current_stats()
+        return plugins
+
+def main():
+    parser = AsyncUmodParser(max_pages=100000)
+    try:
+        start = time.monotonic()
+        plugins = asyncio.run(parser.get_all_plugins_async())
+        logger.info(f"Successfully parsed {len(plugins)} plugins in {time.monotonic() - start:.2f} seconds")
+    except Exception as e:
+        logger.error(f"Error during parsing: {e}")
+
+if __name__ == "__main__":
+    main()
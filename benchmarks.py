@@ -0,0 +1,263 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from materialize import MATERIALIZE_MODES
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+HISTORY_VERSION = 1
+# Сколько последних запусков хранится в файле истории
+MAX_HISTORY = 200
+# Метрики, рост которых выше допуска считается регрессией
+REGRESSION_METRICS = ("wall_time", "peak_rss_mb")
+
+def _unthrottled():
+    """Ограничитель темпа без пауз: бенчмарк измеряет работу, а не ожидание"""
+    from rate_limiter import AdaptiveRateLimiter
+    return AdaptiveRateLimiter(initial_rate=1e9, min_rate=1e9, max_rate=1e9)
+
+def _replay_session(options: Dict):
+    from fixtures import FixtureArchive, ReplaySession
+    return ReplaySession(FixtureArchive(options["fixtures"]))
+
+def bench_crawl(options: Dict, work_dir: Path) -> Tuple[int, float]:
+    """UmodParser.get_all_plugins: все страницы поиска и запись JSON по плагинам"""
+    from umod_parser import UmodParser
+    parser = UmodParser(output_dir=str(work_dir / "plugins_data"), max_pages=100000, state_file=None,
+                        rate_limiter=_unthrottled(), session=_replay_session(options))
+    start = time.perf_counter()
+    plugins = parser.get_all_plugins()
+    return len(plugins), time.perf_counter() - start
+
+def bench_process_plugin(options: Dict, work_dir: Path) -> Tuple[int, float]:
+    """UmodParser._process_plugin на записях поисковой выдачи, без запросов"""
+    from fixtures import FixtureArchive
+    from umod_parser import UmodParser
+    items = FixtureArchive(options["fixtures"]).catalog
+    parser = UmodParser(output_dir=str(work_dir / "plugins_data"), state_file=None, rate_limiter=_unthrottled())
+    start = time.perf_counter()
+    processed = sum(1 for item in items if parser._process_plugin(item) is not None)
+    return processed, time.perf_counter() - start
+
+def bench_organize(options: Dict, work_dir: Path) -> Tuple[int, float]:
+    """PluginOrganizer.process_plugin_file для каждого JSON из plugins_data (код, документация, история)"""
+    from organizer import PluginOrganizer
+    organizer = PluginOrganizer(source_dir=options["data_dir"], output_dir=str(work_dir / "plugins"),
+                                rate_limiter=_unthrottled(), blob_dir=str(work_dir / "plugin_blobs"),
+                                history_dir=str(work_dir / "plugin_history"), session=_replay_session(options))
+    json_files = sorted(Path(options["data_dir"]).glob("*.json"))
+    start = time.perf_counter()
+    organized = sum(1 for json_file in json_files if organizer.process_plugin_file(json_file))
+    organizer.storage.close()
+    organizer.blob_store.save()
+    return organized, time.perf_counter() - start
+
+def _bench_categorize(options: Dict, work_dir: Path, method: str) -> Tuple[int, float]:
+    from categorize_plugins import PluginCategorizer
+    categorizer = PluginCategorizer(source_dir=options["tree"],
+                                    output_dir=str(work_dir / "categorized"), mode=options["mode"])
+    start = time.perf_counter()
+    categories = getattr(categorizer, method)()
+    return sum(len(plugins) for plugins in categories.values()), time.perf_counter() - start
+
+def bench_categorize_alphabet(options: Dict, work_dir: Path) -> Tuple[int, float]:
+    """PluginCategorizer.categorize_by_alphabet на настоящем дереве plugins/ (в пустую директорию)"""
+    return _bench_categorize(options, work_dir, "categorize_by_alphabet")
+
+def bench_categorize_prefix(options: Dict, work_dir: Path) -> Tuple[int, float]:
+    """PluginCategorizer.categorize_by_prefix на настоящем дереве plugins/ (в пустую директорию)"""
+    return _bench_categorize(options, work_dir, "categorize_by_prefix")
+
+def bench_load(options: Dict, work_dir: Path) -> Tuple[int, float]:
+    """Холодная загрузка всех записей plugins_data в новом процессе"""
+    from catalog import _load_records
+    start = time.perf_counter()
+    records = _load_records(options["data_dir"])
+    return len(records), time.perf_counter() - start
+
+BENCHMARKS: Dict[str, Callable[[Dict, Path], Tuple[int, float]]] = {
+    "crawl": bench_crawl,
+    "process_plugin": bench_process_plugin,
+    "organize": bench_organize,
+    "categorize_alphabet": bench_categorize_alphabet,
+    "categorize_prefix": bench_categorize_prefix,
+    "load": bench_load,
+}
+
+def _peak_rss_mb() -> float:
+    """Пиковый RSS текущего процесса.
+
+    VmHWM сбрасывается при exec, а ru_maxrss в Linux наследует пик
+    родителя, поэтому он используется только без /proc.
+    """
+    try:
+        with open("/proc/self/status", 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss в Linux — в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _run_in_child(name: str, options: Dict) -> Dict:
+    """Выполняет один бенчмарк в чистом процессе: пиковый RSS относится только к нему"""
+    if not options["verbose"]:
+        logging.disable(logging.WARNING)
+    work_dir = Path(tempfile.mkdtemp(prefix=f"bench-{name}-", dir=options["work_dir"]))
+    try:
+        items, elapsed = BENCHMARKS[name](options, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    peak_rss = _peak_rss_mb()
+    return {
+        "items": items,
+        "wall_time": round(elapsed, 4),
+        "items_per_sec": round(items / elapsed, 2) if elapsed else None,
+        "peak_rss_mb": round(peak_rss, 1)
+    }
+
+def run_benchmarks(names: List[str], options: Dict, repeat: int = 1) -> Dict[str, Dict]:
+    """Запускает бенчмарки repeat раз и оставляет лучший (самый быстрый) результат каждого"""
+    results = {}
+    context = get_context("spawn")
+    for name in names:
+        runs = []
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                runs.append(executor.submit(_run_in_child, name, options).result())
+        results[name] = dict(min(runs, key=lambda run: run["wall_time"]), runs=len(runs))
+        logger.info(f"{name}: {results[name]}")
+    return results
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=Path(__file__).resolve().parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def find_regressions(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[Dict]:
+    """Метрики, выросшие относительно базовой линии больше чем на tolerance"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric in REGRESSION_METRICS:
+            if base.get(metric) and result[metric] > base[metric] * (1 + tolerance):
+                regressions.append({"benchmark": name, "metric": metric, "baseline": base[metric],
+                                    "current": result[metric], "change": round(result[metric] / base[metric] - 1, 3)})
+    return regressions
+
+class BenchmarkHistory:
+    """JSON файл с результатами запусков и базовой линией для поиска регрессий"""
+
+    def __init__(self, history_file: str = "benchmark_history.json"):
+        self.history_file = Path(history_file)
+        self.baseline: Dict[str, Dict] = {}
+        self.runs: List[Dict] = []
+        if self.history_file.exists():
+            with open(self.history_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == HISTORY_VERSION:
+                self.baseline = data.get("baseline", {})
+                self.runs = data.get("runs", [])
+
+    def reference(self) -> Dict[str, Dict]:
+        """Результаты для сравнения: сохраненная базовая линия, а без нее — предыдущий запуск"""
+        if self.baseline:
+            return self.baseline["results"]
+        return self.runs[-1]["results"] if self.runs else {}
+
+    def record(self, results: Dict[str, Dict], set_baseline: bool = False) -> Dict:
+        run = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "results": results
+        }
+        self.runs = (self.runs + [run])[-MAX_HISTORY:]
+        if set_baseline:
+            # Бенчмарки, не запускавшиеся сейчас, сохраняют прежнюю базовую линию
+            merged = dict(self.baseline.get("results", {}), **results)
+            self.baseline = {"timestamp": run["timestamp"], "revision": run["revision"], "results": merged}
+        self.save()
+        return run
+
+    def save(self):
+        tmp_file = self.history_file.with_name(self.history_file.name + ".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"version": HISTORY_VERSION, "baseline": self.baseline, "runs": self.runs}, f, indent=2)
+        os.replace(tmp_file, self.history_file)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark crawl, organize, categorize and load paths")
+    arg_parser.add_argument("benchmarks", nargs="*", help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    arg_parser.add_argument("--tree", default="plugins", help="plugin tree for fixtures and categorization")
+    arg_parser.add_argument("--data-dir", default="plugins_data", help="per-plugin JSON directory")
+    arg_parser.add_argument("--fixtures", default="benchmark_fixtures.zip",
+                            help="fixture archive (synthesized from --tree if missing)")
+    arg_parser.add_argument("--refresh-fixtures", action="store_true", help="synthesize the fixture archive again")
+    arg_parser.add_argument("--mode", default="copy", choices=MATERIALIZE_MODES, help="categorizer materialization mode")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark (the fastest is kept)")
+    arg_parser.add_argument("--history", default="benchmark_history.json", help="results history file")
+    arg_parser.add_argument("--set-baseline", action="store_true", help="store this run as the baseline")
+    arg_parser.add_argument("--tolerance", type=float, default=0.15, help="allowed growth before flagging a regression")
+    arg_parser.add_argument("--verbose", action="store_true", help="keep INFO and WARNING logs of the benchmarked code")
+    args = arg_parser.parse_args()
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        arg_parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    if args.refresh_fixtures or not Path(args.fixtures).exists():
+        from fixtures import synthesize_archive
+        synthesize_archive(args.fixtures, args.tree)
+
+    options = {
+        "tree": os.path.abspath(args.tree),
+        "data_dir": os.path.abspath(args.data_dir),
+        "fixtures": os.path.abspath(args.fixtures),
+        "mode": args.mode,
+        "verbose": args.verbose,
+        "work_dir": tempfile.gettempdir()
+    }
+    results = run_benchmarks(args.benchmarks or list(BENCHMARKS), options, args.repeat)
+
+    history = BenchmarkHistory(args.history)
+    reference = history.reference()
+    history.record(results, args.set_baseline)
+
+    print(f"{'benchmark':<22}{'items':>7}{'time, s':>10}{'items/s':>11}{'RSS, MB':>10}{'vs ref':>9}")
+    for name, result in results.items():
+        base = reference.get(name, {})
+        change = f"{result['wall_time'] / base['wall_time'] - 1:+.0%}" if base.get("wall_time") else "-"
+        print(f"{name:<22}{result['items']:>7}{result['wall_time']:>10.3f}{result['items_per_sec'] or 0:>11.1f}"
+              f"{result['peak_rss_mb']:>10.1f}{change:>9}")
+
+    regressions = find_regressions(results, reference, args.tolerance)
+    for regression in regressions:
+        logger.warning(f"Regression in {regression['benchmark']}: {regression['metric']} "
+                       f"{regression['baseline']} -> {regression['current']} ({regression['change']:+.1%})")
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from storage import temp_path_for
+
+logger = logging.getLogger(__name__)
+
+
+class BlobStore:
+    """Хранилище файлов, адресуемых по SHA-256 содержимого.
+
+    Каждое уникальное содержимое хранится один раз в objects/<aa>/<sha256>, а
+    файлы в дереве плагинов становятся жесткими ссылками на него (или копиями,
+    если ссылку создать нельзя, например между разными файловыми системами).
+    Для каждого URL запоминаются ETag, Last-Modified и размер последнего
+    ответа, чтобы повторная загрузка неизмененного файла не требовалась.
+    """
+
+    def __init__(self, root: str = "plugin_blobs"):
+        self.root = Path(root)
+        self.objects_dir = self.root / "objects"
+        self.index_file = self.root / "index.json"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._remote: Dict[str, Dict] = {}
+        self._dirty = False
+
+        if self.index_file.exists():
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    self._remote = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable blob index {self.index_file}: {e}")
+
+    def path_for(self, sha256: str) -> Path:
+        return self.objects_dir / sha256[:2] / sha256
+
+    def has(self, sha256: Optional[str]) -> bool:
+        return bool(sha256) and self.path_for(sha256).exists()
+
+    def put_stream(self, chunks: Iterable[bytes]) -> str:
+        """Сохраняет поток байтов в хранилище и возвращает SHA-256 содержимого"""
+        digest = hashlib.sha256()
+        fd, tmp_name = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    if chunk:
+                        digest.update(chunk)
+                        f.write(chunk)
+
+            sha256 = digest.hexdigest()
+            blob_path = self.path_for(sha256)
+            if blob_path.exists():
+                # Такое содержимое уже есть — копия не нужна
+                os.unlink(tmp_name)
+            else:
+                blob_path.parent.mkdir(exist_ok=True)
+                os.replace(tmp_name, blob_path)
+            return sha256
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+
+    def put_file(self, path: Path) -> str:
+        """Переносит существующий файл в хранилище и заменяет его ссылкой"""
+        with open(path, 'rb') as f:
+            sha256 = self.put_stream(iter(lambda: f.read(65536), b""))
+        self.link(sha256, path)
+        return sha256
+
+    def link(self, sha256: str, target_path: Path):
+        """Материализует блоб по пути target_path жесткой ссылкой, а при неудаче — копией"""
+        blob_path = self.path_for(sha256)
+        target_path = Path(target_path)
+
+        if target_path.exists() and os.path.samefile(blob_path, target_path):
+            return
+
+        # Старый файл не перезаписываем (он может быть ссылкой на другой блоб), а атомарно
+        # заменяем новой ссылкой: прерванный запуск оставит либо старый файл, либо новый
+        tmp_path = temp_path_for(target_path, uuid.uuid4().hex[:12])
+        try:
+            try:
+                os.link(blob_path, tmp_path)
+            except OSError:
+                shutil.copyfile(blob_path, tmp_path)
+            os.replace(tmp_path, target_path)
+        except BaseException:
+            if tmp_path.exists():
+                tmp_path.unlink()
+            raise
+
+    def get_remote(self, url: str) -> Optional[Dict]:
+        """Сведения о последнем ответе сервера для url, если блоб еще на месте"""
+        with self._lock:
+            remote = self._remote.get(url)
+        return remote if remote and self.has(remote.get("sha256")) else None
+
+    def set_remote(self, url: str, sha256: str, etag: Optional[str], last_modified: Optional[str],
+                   content_length: Optional[int]):
+        with self._lock:
+            self._remote[url] = {
+                "sha256": sha256,
+                "etag": etag,
+                "last_modified": last_modified,
+                "content_length": content_length
+            }
+            self._dirty = True
+
+    def prune(self, referenced: Iterable[str] = ()) -> Dict[str, int]:
+        """Удаляет блобы, на которые больше ничего не ссылается, и возвращает статистику.
+
+        Блоб остается, если у него есть жесткие ссылки помимо самого хранилища
+        (файл в дереве плагинов или в незавершенном батче), если на него
+        указывает индекс URL (нужен для условных запросов) или если его SHA-256
+        есть в referenced. Остальное — прежние версии измененных файлов и
+        отвергнутые загрузки, которые уже не в индексе. Запускать, когда
+        загрузки не идут: только что записанный блоб еще не успел попасть в индекс.
+        """
+        with self._lock:
+            keep = {remote["sha256"] for remote in self._remote.values() if remote.get("sha256")}
+        keep.update(referenced)
+
+        stats = {"kept": 0, "removed": 0, "bytes_freed": 0}
+        for shard_dir in sorted(self.objects_dir.iterdir()):
+            if not shard_dir.is_dir():
+                continue
+            for blob_path in shard_dir.iterdir():
+                stat = blob_path.stat()
+                if stat.st_nlink > 1 or blob_path.name in keep:
+                    stats["kept"] += 1
+                    continue
+                blob_path.unlink()
+                stats["removed"] += 1
+                stats["bytes_freed"] += stat.st_size
+            if not any(shard_dir.iterdir()):
+                shard_dir.rmdir()
+
+        # Временные файлы прерванных put_stream
+        for tmp_path in self.root.glob("*.tmp"):
+            tmp_path.unlink()
+
+        logger.info(f"Pruned {stats['removed']} unreferenced blobs ({stats['bytes_freed']} bytes), "
+                    f"kept {stats['kept']}")
+        return stats
+
+    def save(self):
+        """Сохраняет индекс URL, если он менялся"""
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp_file = self.index_file.with_suffix(".tmp")
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self._remote, f, indent=2)
+            os.replace(tmp_file, self.index_file)
+            self._dirty = False
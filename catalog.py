@@ -0,0 +1,256 @@
+import argparse
+import calendar
+import heapq
+import json
+import logging
+import mmap
+import os
+import sys
+from array import array
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from dataset_store import DatasetReader
+from models import load_json_file
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Числовые колонки хранятся массивами int64, строковые — смещениями uint32 и общим пулом байтов
+NUMERIC_COLUMNS = ("total_downloads", "created_at", "updated_at")
+STRING_COLUMNS = ("id", "name", "author", "latest_version", "description")
+CATALOG_VERSION = 1
+
+def _to_epoch(value: str) -> int:
+    """Дата из JSON (ISO, без часового пояса) в секунды Unix, считая ее UTC"""
+    try:
+        return calendar.timegm(datetime.fromisoformat(value).timetuple())
+    except (TypeError, ValueError):
+        return 0
+
+def _load_records(source_dir: str = "plugins_data", dataset_file: Optional[str] = None) -> List[Dict]:
+    if dataset_file:
+        with DatasetReader(dataset_file) as reader:
+            return reader.load_all()
+    records = []
+    for json_file in Path(source_dir).glob("*.json"):
+        records.append(load_json_file(json_file))
+    return records
+
+def _write_atomic(path: Path, data: bytes):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def build_catalog(output_dir: str = "plugins_catalog", source_dir: str = "plugins_data",
+                  dataset_file: Optional[str] = None) -> int:
+    """Строит колоночный каталог из plugins_data/*.json или единого датасета"""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    records = sorted(_load_records(source_dir, dataset_file), key=lambda record: record["id"])
+
+    # Категории кодируются битовой маской, словарь категорий — в meta.json
+    category_names = sorted({category for record in records for category in record.get("categories") or []})
+    if len(category_names) > 32:
+        raise ValueError(f"Too many categories for a 32-bit mask: {len(category_names)}")
+    category_bits = {name: 1 << i for i, name in enumerate(category_names)}
+
+    numeric = {
+        "total_downloads": array('q', (int(record.get("total_downloads") or 0) for record in records)),
+        "created_at": array('q', (_to_epoch(record.get("created_at")) for record in records)),
+        "updated_at": array('q', (_to_epoch(record.get("updated_at")) for record in records)),
+    }
+    categories = array('I', (
+        sum(category_bits[category] for category in set(record.get("categories") or []))
+        for record in records
+    ))
+
+    for column, values in numeric.items():
+        _write_atomic(output_dir / f"{column}.i64", values.tobytes())
+    _write_atomic(output_dir / "categories.u32", categories.tobytes())
+
+    for column in STRING_COLUMNS:
+        offsets = array('I', [0])
+        pool = bytearray()
+        for record in records:
+            pool += str(record.get(column) or "").encode("utf-8")
+            offsets.append(len(pool))
+        _write_atomic(output_dir / f"{column}.off", offsets.tobytes())
+        _write_atomic(output_dir / f"{column}.str", bytes(pool))
+
+    # meta.json пишется последним: по нему читатель понимает, что каталог собран целиком
+    meta = {
+        "version": CATALOG_VERSION,
+        "byteorder": sys.byteorder,
+        "count": len(records),
+        "categories": category_names,
+        "built_at": datetime.now().isoformat()
+    }
+    _write_atomic(output_dir / "meta.json", json.dumps(meta, indent=2).encode("utf-8"))
+
+    logger.info(f"Built catalog of {len(records)} plugins in {output_dir}")
+    return len(records)
+
+class Catalog:
+    """Каталог плагинов, отображенный в память; строки читаются только при обращении"""
+
+    def __init__(self, catalog_dir: str = "plugins_catalog"):
+        self.catalog_dir = Path(catalog_dir)
+        with open(self.catalog_dir / "meta.json", 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != CATALOG_VERSION or self.meta.get("byteorder") != sys.byteorder:
+            raise ValueError(f"Incompatible catalog in {self.catalog_dir}, rebuild it with build_catalog()")
+
+        self.count = self.meta["count"]
+        self.category_bits = {name: 1 << i for i, name in enumerate(self.meta["categories"])}
+
+        self._maps = []
+        self.columns = {column: self._map(f"{column}.i64", 'q') for column in NUMERIC_COLUMNS}
+        self.columns["categories"] = self._map("categories.u32", 'I')
+        self._strings = {
+            column: (self._map(f"{column}.off", 'I'), self._map(f"{column}.str", None))
+            for column in STRING_COLUMNS
+        }
+
+    def _map(self, filename: str, fmt: Optional[str]) -> memoryview:
+        path = self.catalog_dir / filename
+        if path.stat().st_size == 0:
+            # mmap не умеет отображать пустые файлы
+            return memoryview(array(fmt or 'B'))
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        view = memoryview(mapped)
+        return view.cast(fmt) if fmt else view
+
+    def close(self):
+        self.columns.clear()
+        self._strings.clear()
+        for mapped in self._maps:
+            try:
+                mapped.close()
+            except BufferError:
+                # На отображение еще ссылаются memoryview снаружи — закроется сборщиком мусора
+                pass
+        self._maps.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def string(self, column: str, row: int) -> str:
+        offsets, pool = self._strings[column]
+        return bytes(pool[offsets[row]:offsets[row + 1]]).decode("utf-8")
+
+    def row(self, row: int) -> Dict:
+        """Собирает одну строку каталога в словарь"""
+        result = {column: self.string(column, row) for column in STRING_COLUMNS}
+        for column in NUMERIC_COLUMNS:
+            result[column] = self.columns[column][row]
+        mask = self.columns["categories"][row]
+        result["categories"] = [name for name, bit in self.category_bits.items() if mask & bit]
+        return result
+
+    def query(self) -> "CatalogQuery":
+        return CatalogQuery(self)
+
+class CatalogQuery:
+    """Цепочка фильтров и сортировок над колонками каталога.
+
+    Выборка хранится как список номеров строк; фильтры проходят по колонке
+    один раз, не собирая объекты плагинов и не разбирая JSON.
+    """
+
+    def __init__(self, catalog: Catalog, rows: Optional[List[int]] = None):
+        self.catalog = catalog
+        self.selected = rows
+
+    def _rows(self):
+        return range(self.catalog.count) if self.selected is None else self.selected
+
+    def where(self, column: str, op: str, value: int) -> "CatalogQuery":
+        """Фильтр по числовой колонке: op — один из ==, !=, <, <=, >, >="""
+        values = self.catalog.columns[column]
+        if op == "==":
+            rows = [row for row in self._rows() if values[row] == value]
+        elif op == "!=":
+            rows = [row for row in self._rows() if values[row] != value]
+        elif op == "<":
+            rows = [row for row in self._rows() if values[row] < value]
+        elif op == "<=":
+            rows = [row for row in self._rows() if values[row] <= value]
+        elif op == ">":
+            rows = [row for row in self._rows() if values[row] > value]
+        elif op == ">=":
+            rows = [row for row in self._rows() if values[row] >= value]
+        else:
+            raise ValueError(f"Unsupported operator: {op}")
+        return CatalogQuery(self.catalog, rows)
+
+    def category(self, name: str) -> "CatalogQuery":
+        bit = self.catalog.category_bits.get(name, 0)
+        values = self.catalog.columns["categories"]
+        return CatalogQuery(self.catalog, [row for row in self._rows() if values[row] & bit])
+
+    def updated_since(self, since: datetime) -> "CatalogQuery":
+        return self.where("updated_at", ">=", calendar.timegm(since.timetuple()))
+
+    def created_since(self, since: datetime) -> "CatalogQuery":
+        return self.where("created_at", ">=", calendar.timegm(since.timetuple()))
+
+    def sort(self, column: str, descending: bool = True) -> "CatalogQuery":
+        values = self.catalog.columns[column]
+        return CatalogQuery(self.catalog, sorted(self._rows(), key=values.__getitem__, reverse=descending))
+
+    def top_k(self, column: str, k: int) -> "CatalogQuery":
+        """k строк с наибольшими значениями колонки (через кучу, без полной сортировки)"""
+        values = self.catalog.columns[column]
+        return CatalogQuery(self.catalog, heapq.nlargest(k, self._rows(), key=values.__getitem__))
+
+    def limit(self, n: int) -> "CatalogQuery":
+        return CatalogQuery(self.catalog, list(self._rows())[:n])
+
+    def count(self) -> int:
+        return len(self._rows())
+
+    def ids(self) -> List[str]:
+        return [self.catalog.string("id", row) for row in self._rows()]
+
+    def rows(self) -> List[Dict]:
+        return [self.catalog.row(row) for row in self._rows()]
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Build or query the columnar plugin catalog")
+    arg_parser.add_argument("--catalog", default="plugins_catalog", help="catalog directory")
+    arg_parser.add_argument("--build", action="store_true", help="(re)build the catalog before querying")
+    arg_parser.add_argument("--source", default="plugins_data", help="directory with per-plugin JSON files")
+    arg_parser.add_argument("--dataset", help="build from a consolidated JSONL dataset instead")
+    arg_parser.add_argument("--category", help="only plugins in this category")
+    arg_parser.add_argument("--updated-since", help="only plugins updated on or after this date (YYYY-MM-DD)")
+    arg_parser.add_argument("--top", type=int, default=10, help="number of plugins to show")
+    arg_parser.add_argument("--by", default="total_downloads", choices=NUMERIC_COLUMNS, help="ranking column")
+    args = arg_parser.parse_args()
+
+    if args.build or not (Path(args.catalog) / "meta.json").exists():
+        build_catalog(args.catalog, args.source, args.dataset)
+
+    with Catalog(args.catalog) as catalog:
+        query = catalog.query()
+        if args.category:
+            query = query.category(args.category)
+        if args.updated_since:
+            query = query.updated_since(datetime.fromisoformat(args.updated_since))
+        for row in query.top_k(args.by, args.top).rows():
+            print(f"{row[args.by]:>10}  {row['name']} ({row['id']}) v{row['latest_version']} by {row['author']}")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,14 @@
+import argparse
 import os
-import shutil
 import re
 from pathlib import Path
 import logging
 from collections import defaultdict
 
+from manifest import Manifest
+from materialize import MATERIALIZE_MODES, LayoutSync
+from plugin_tree import category_letter, iter_plugin_dirs
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -12,18 +16,30 @@ logger = logging.getLogger(__name__)
 class PluginCategorizer:
     """Класс для категоризации плагинов по алфавиту, чтобы избежать ограничения GitHub на отображение файлов"""
     
-    def __init__(self, source_dir="plugins", output_dir="categorized_plugins", max_plugins_per_category=250):
+    def __init__(self, source_dir="plugins", output_dir="categorized_plugins", max_plugins_per_category=250, mode="copy"):
         self.source_dir = Path(source_dir)
         self.output_dir = Path(output_dir)
         self.max_plugins_per_category = max_plugins_per_category
         
         # Убедимся, что выходная директория существует
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Манифест дерева источников, который ведет органайзер
+        self.manifest = Manifest(self.source_dir)
+        
+        # Способ размещения: copy, hardlink, reflink или symlink
+        self.layout = LayoutSync(self.output_dir, mode, manifest=self.manifest)
+    
+    def list_plugin_dirs(self):
+        """Директории плагинов из манифеста; обход дерева (плоского или по буквам) — только если манифеста нет"""
+        if len(self.manifest):
+            return self.manifest.plugin_dirs()
+        return list(iter_plugin_dirs(self.source_dir))
     
     def categorize_by_alphabet(self):
         """Распределяет плагины по алфавитным категориям"""
         # Получаем список всех плагинов
-        plugin_dirs = [d for d in self.source_dir.iterdir() if d.is_dir()]
+        plugin_dirs = self.list_plugin_dirs()
         total_plugins = len(plugin_dirs)
         
         logger.info(f"Found {total_plugins} plugins to categorize")
@@ -39,25 +55,16 @@ class PluginCategorizer:
         
         for plugin_dir in plugin_dirs:
             # Берём первую букву названия плагина в верхнем регистре
-            first_letter = plugin_dir.name[0].upper()
+            first_letter = category_letter(plugin_dir.name)
             categories[first_letter].append(plugin_dir)
         
         # Объединяем маленькие категории
         categories_list = self.optimize_categories(categories)
         
-        # Создаем категории и копируем файлы
+        # Создаем категории и размещаем в них только изменившиеся плагины
         for category_name, plugins in categories_list.items():
-            category_dir = self.output_dir / category_name
-            category_dir.mkdir(exist_ok=True)
-            
             logger.info(f"Creating category {category_name} with {len(plugins)} plugins")
-            
-            for plugin_dir in plugins:
-                # Копируем директорию плагина в категорию
-                dest_dir = category_dir / plugin_dir.name
-                if dest_dir.exists():
-                    shutil.rmtree(dest_dir)
-                shutil.copytree(plugin_dir, dest_dir)
+        self.layout.sync(categories_list)
                 
         logger.info(f"Categorization complete. Created {len(categories_list)} categories.")
         return categories_list
@@ -115,7 +122,7 @@ class PluginCategorizer:
     def categorize_by_prefix(self):
         """Распределяет плагины по общим префиксам (например, Zone*, Admin*, etc.)"""
         # Получаем список всех плагинов
-        plugin_dirs = [d for d in self.source_dir.iterdir() if d.is_dir()]
+        plugin_dirs = self.list_plugin_dirs()
         
         # Группируем плагины по префиксам
         prefix_groups = defaultdict(list)
@@ -145,7 +152,7 @@ class PluginCategorizer:
         if no_prefix_group:
             no_prefix_dict = defaultdict(list)
             for plugin_dir in no_prefix_group:
-                first_letter = plugin_dir.name[0].upper()
+                first_letter = category_letter(plugin_dir.name)
                 no_prefix_dict[first_letter].append(plugin_dir)
             
             # Оптимизируем категории без префикса
@@ -153,26 +160,22 @@ class PluginCategorizer:
             for key, value in optimized_no_prefix.items():
                 categories[f"Other-{key}"] = value
         
-        # Создаем категории и копируем файлы
+        # Создаем категории и размещаем в них только изменившиеся плагины
         for category_name, plugins in categories.items():
-            category_dir = self.output_dir / category_name
-            category_dir.mkdir(exist_ok=True)
-            
             logger.info(f"Creating category {category_name} with {len(plugins)} plugins")
-            
-            for plugin_dir in plugins:
-                # Копируем директорию плагина в категорию
-                dest_dir = category_dir / plugin_dir.name
-                if dest_dir.exists():
-                    shutil.rmtree(dest_dir)
-                shutil.copytree(plugin_dir, dest_dir)
+        self.layout.sync(categories)
         
         logger.info(f"Categorization complete. Created {len(categories)} categories.")
         return categories
 
 def main():
+    arg_parser = argparse.ArgumentParser(description="Split the plugins/ tree into categories")
+    arg_parser.add_argument("--mode", default="copy", choices=MATERIALIZE_MODES,
+                            help="how plugins are placed into categories")
+    args = arg_parser.parse_args()
+    
     # Создаем экземпляр класса и запускаем категоризацию
-    categorizer = PluginCategorizer()
+    categorizer = PluginCategorizer(mode=args.mode)
     
     # Выберите метод категоризации:
     # 1. По алфавиту:
@@ -0,0 +1,337 @@
+import argparse
+import difflib
+import hashlib
+import logging
+import os
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from blob_store import BlobStore
+from dataset_store import DatasetReader
+from models import Plugin, dumps, load_json_file, load_plugins
+from plugin_tree import iter_plugin_dirs, load_plugin_json, plugin_source
+from version_history import VersionStore
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+# Поля записи, изменения которых попадают в набор изменений
+TRACKED_FIELDS = ("name", "author", "latest_version", "total_downloads", "updated_at", "categories")
+# Скачивания считаются скачком, если выросли хотя бы на MIN_DOWNLOAD_JUMP и на DOWNLOAD_JUMP_RATIO от прежних
+MIN_DOWNLOAD_JUMP = 100
+DOWNLOAD_JUMP_RATIO = 0.5
+
+VERSION_PART_RE = re.compile(r'\d+')
+
+def _digest(entry: Dict) -> str:
+    """Хеш отслеживаемых полей и исходника: совпадение означает, что сравнивать поля не нужно"""
+    key = [entry.get(field) for field in TRACKED_FIELDS] + [entry.get("source")]
+    return hashlib.sha1(dumps(key)).hexdigest()
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def version_bump(old: str, new: str) -> str:
+    """Вид изменения версии: major, minor, patch, downgrade или other (не разбирается)"""
+    old_parts = [int(part) for part in VERSION_PART_RE.findall(old or "")]
+    new_parts = [int(part) for part in VERSION_PART_RE.findall(new or "")]
+    if not old_parts or not new_parts:
+        return "other"
+    width = max(len(old_parts), len(new_parts), 3)
+    old_parts += [0] * (width - len(old_parts))
+    new_parts += [0] * (width - len(new_parts))
+    if new_parts < old_parts:
+        return "downgrade"
+    for position, kind in enumerate(("major", "minor")):
+        if new_parts[position] != old_parts[position]:
+            return kind
+    return "patch" if new_parts != old_parts else "other"
+
+class SnapshotStore:
+    """Снимки каталога: записи plugins_data и хеши исходников дерева plugins/.
+
+    Снимок — один JSON файл snapshots/<YYYYmmdd-HHMMSS>.json со словарем
+    slug -> отслеживаемые поля и SHA-256 исходника. Исходники, размер и
+    mtime которых не изменились с прошлого снимка, повторно не хешируются.
+    """
+
+    def __init__(self, root: str = "snapshots"):
+        self.root = Path(root)
+
+    def names(self) -> List[str]:
+        """Имена снимков от старого к новому"""
+        if not self.root.exists():
+            return []
+        return sorted(path.stem for path in self.root.glob("*.json"))
+
+    def resolve(self, name: str) -> Path:
+        """Путь к снимку по имени, пути к файлу или псевдонимам latest/previous"""
+        names = self.names()
+        if name in ("latest", "previous"):
+            offset = 1 if name == "latest" else 2
+            if len(names) < offset:
+                raise FileNotFoundError(f"Not enough snapshots in {self.root} for '{name}'")
+            return self.root / f"{names[-offset]}.json"
+        path = Path(name)
+        if path.suffix == ".json" and path.exists():
+            return path
+        path = self.root / f"{name}.json"
+        if not path.exists():
+            raise FileNotFoundError(f"Snapshot '{name}' not found in {self.root}")
+        return path
+
+    def load(self, name: str) -> Dict:
+        data = load_json_file(self.resolve(name))
+        if data.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version in {name}")
+        return data
+
+    def create(self, data_dir: str = "plugins_data", tree_root: str = "plugins",
+               dataset_file: Optional[str] = None, blob_dir: Optional[str] = None,
+               name: Optional[str] = None) -> Path:
+        """Снимает текущее состояние каталога.
+
+        Если задан blob_dir, исходники дополнительно кладутся в хранилище
+        блобов, чтобы позже можно было показать построчный diff их изменений.
+        """
+        start = time.monotonic()
+        previous = {}
+        if self.names():
+            previous = self.load("latest")["plugins"]
+
+        plugins: Dict[str, Dict] = {}
+        for plugin in self._load_plugins(data_dir, dataset_file):
+            plugins[plugin.id] = {
+                "name": plugin.name,
+                "author": plugin.author,
+                "latest_version": plugin.latest_version,
+                "total_downloads": plugin.total_downloads,
+                "updated_at": plugin.updated_at.isoformat(),
+                "categories": plugin.categories,
+                "source": None
+            }
+
+        blob_store = BlobStore(blob_dir) if blob_dir else None
+        hashed = 0
+        for plugin_dir in iter_plugin_dirs(tree_root):
+            data = load_plugin_json(plugin_dir)
+            source = plugin_source(plugin_dir)
+            if not data or data.get("id") not in plugins or not source.exists():
+                continue
+            entry = plugins[data["id"]]
+            stat = source.stat()
+            cached = previous.get(data["id"]) or {}
+            if cached.get("path") == str(source) and cached.get("size") == stat.st_size \
+                    and cached.get("mtime_ns") == stat.st_mtime_ns:
+                entry["source"] = cached["source"]
+            else:
+                entry["source"] = _hash_file(source)
+                hashed += 1
+            entry.update(path=str(source), size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            if blob_store is not None and not blob_store.has(entry["source"]):
+                with open(source, 'rb') as f:
+                    blob_store.put_stream(iter(lambda: f.read(65536), b""))
+
+        for entry in plugins.values():
+            entry["digest"] = _digest(entry)
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        created_at = datetime.now()
+        if name is None:
+            # Имена с точностью до секунды: снимок той же секунды получает суффикс, а не затирает прежний
+            base = created_at.strftime("%Y%m%d-%H%M%S")
+            name, suffix = base, 1
+            while (self.root / f"{name}.json").exists():
+                name, suffix = f"{base}-{suffix}", suffix + 1
+        elif (self.root / f"{name}.json").exists():
+            raise FileExistsError(f"Snapshot '{name}' already exists in {self.root}")
+        path = self.root / f"{name}.json"
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(dumps({"version": SNAPSHOT_VERSION, "name": name, "created_at": created_at.isoformat(),
+                           "plugins": dict(sorted(plugins.items()))}))
+        os.replace(tmp_path, path)
+        logger.info(f"Snapshot {name}: {len(plugins)} plugins, {hashed} sources hashed "
+                    f"in {time.monotonic() - start:.2f}s")
+        return path
+
+    def _load_plugins(self, data_dir: str, dataset_file: Optional[str]) -> Iterable[Plugin]:
+        if dataset_file:
+            with DatasetReader(dataset_file) as reader:
+                return [Plugin.from_dict(record) for record in reader.iter_records()]
+        return load_plugins(data_dir)
+
+def diff_snapshots(old: Dict, new: Dict, min_download_jump: int = MIN_DOWNLOAD_JUMP,
+                   download_jump_ratio: float = DOWNLOAD_JUMP_RATIO) -> Dict:
+    """Набор изменений между двумя снимками.
+
+    Сравнение идет по хеш-индексу slug -> запись: добавленные и удаленные
+    плагины — разность множеств ключей, а у общих сначала сравниваются
+    дайджесты, и только при расхождении — отдельные поля.
+    """
+    old_plugins, new_plugins = old["plugins"], new["plugins"]
+    added = sorted(new_plugins.keys() - old_plugins.keys())
+    removed = sorted(old_plugins.keys() - new_plugins.keys())
+
+    changed = []
+    download_jumps = []
+    for slug in sorted(old_plugins.keys() & new_plugins.keys()):
+        before, after = old_plugins[slug], new_plugins[slug]
+        if before["digest"] == after["digest"]:
+            continue
+        fields = {field: [before.get(field), after.get(field)] for field in TRACKED_FIELDS
+                  if before.get(field) != after.get(field)}
+        change = {"id": slug, "fields": fields, "source_changed": before.get("source") != after.get("source")}
+        if "latest_version" in fields:
+            change["version_bump"] = version_bump(*fields["latest_version"])
+        if "total_downloads" in fields:
+            delta = (after["total_downloads"] or 0) - (before["total_downloads"] or 0)
+            change["downloads_delta"] = delta
+            if delta >= min_download_jump and delta >= download_jump_ratio * (before["total_downloads"] or 0):
+                download_jumps.append({"id": slug, "from": before["total_downloads"],
+                                       "to": after["total_downloads"], "delta": delta})
+        changed.append(change)
+
+    # Заново развертывать нужно новые плагины и те, у которых сменились версия или исходник
+    redeploy = sorted(added + [change["id"] for change in changed
+                               if change["source_changed"] or "latest_version" in change["fields"]])
+    return {
+        "from": {"name": old.get("name"), "created_at": old.get("created_at")},
+        "to": {"name": new.get("name"), "created_at": new.get("created_at")},
+        "summary": {"added": len(added), "removed": len(removed), "changed": len(changed),
+                    "version_bumps": sum(1 for change in changed if "version_bump" in change),
+                    "sources_changed": sum(1 for change in changed if change["source_changed"]),
+                    "redeploy": len(redeploy)},
+        "added": [dict(new_plugins[slug], id=slug) for slug in added],
+        "removed": [dict(old_plugins[slug], id=slug) for slug in removed],
+        "changed": changed,
+        "download_jumps": sorted(download_jumps, key=lambda jump: (-jump["delta"], jump["id"])),
+        "redeploy": redeploy
+    }
+
+def _source_content(slug: str, entry: Dict, blob_store: Optional[BlobStore],
+                    history: Optional[VersionStore]) -> Optional[bytes]:
+    """Исходник из снимка: текущий файл, блоб или версия из истории с тем же SHA-256"""
+    sha256 = entry.get("source")
+    if not sha256:
+        return None
+    path = entry.get("path")
+    if path and os.path.exists(path):
+        content = Path(path).read_bytes()
+        if hashlib.sha256(content).hexdigest() == sha256:
+            return content
+    if blob_store is not None and blob_store.has(sha256):
+        return blob_store.path_for(sha256).read_bytes()
+    if history is not None:
+        for version in history.versions(slug):
+            if version["sha256"] == sha256:
+                return history.get_version(slug, version["version"])
+    return None
+
+def source_diffs(changes: Dict, old: Dict, new: Dict, blob_dir: Optional[str] = "plugin_blobs",
+                 history_dir: Optional[str] = "plugin_history") -> Dict[str, Optional[str]]:
+    """Построчные unified diff измененных .cs файлов (None, если старую версию найти не удалось)"""
+    blob_store = BlobStore(blob_dir) if blob_dir and Path(blob_dir).exists() else None
+    history = VersionStore(history_dir) if history_dir and Path(history_dir).exists() else None
+    diffs = {}
+    for change in changes["changed"]:
+        if not change["source_changed"]:
+            continue
+        slug = change["id"]
+        before = _source_content(slug, old["plugins"][slug], blob_store, history)
+        after = _source_content(slug, new["plugins"][slug], blob_store, history)
+        if before is None or after is None:
+            diffs[slug] = None
+            continue
+        versions = change["fields"].get("latest_version") or [old["plugins"][slug]["latest_version"]] * 2
+        diffs[slug] = "".join(difflib.unified_diff(
+            before.decode("utf-8", errors="replace").splitlines(keepends=True),
+            after.decode("utf-8", errors="replace").splitlines(keepends=True),
+            fromfile=f"{slug}.cs@{versions[0]}", tofile=f"{slug}.cs@{versions[1]}"))
+    return diffs
+
+def render_changelog(changes: Dict) -> str:
+    """Набор изменений в виде Markdown для заметок о синхронизации"""
+    summary = changes["summary"]
+    lines = [f"# Changes {changes['from']['name']} -> {changes['to']['name']}", "",
+             f"{summary['added']} added, {summary['removed']} removed, {summary['changed']} changed, "
+             f"{summary['redeploy']} to redeploy", ""]
+
+    def section(title: str, items: List[str]):
+        if items:
+            lines.extend([f"## {title}", ""] + [f"- {item}" for item in items] + [""])
+
+    section("Added", [f"{plugin['name']} ({plugin['id']}) {plugin['latest_version']}" for plugin in changes["added"]])
+    section("Removed", [f"{plugin['name']} ({plugin['id']})" for plugin in changes["removed"]])
+    section("Updated", [
+        f"{change['id']}: {change['fields']['latest_version'][0]} -> {change['fields']['latest_version'][1]} "
+        f"({change['version_bump']})" for change in changes["changed"] if "version_bump" in change
+    ])
+    section("Source changed without a version bump", [
+        change["id"] for change in changes["changed"] if change["source_changed"] and "version_bump" not in change
+    ])
+    section("Download jumps", [f"{jump['id']}: {jump['from']} -> {jump['to']} (+{jump['delta']})"
+                               for jump in changes["download_jumps"]])
+    return "\n".join(lines)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Snapshot the catalog and report changes between snapshots")
+    arg_parser.add_argument("command", choices=("snapshot", "diff", "list"))
+    arg_parser.add_argument("snapshots", nargs="*", help="for diff: OLD and NEW snapshot (default: previous latest)")
+    arg_parser.add_argument("--root", default="snapshots", help="snapshot directory")
+    arg_parser.add_argument("--data-dir", default="plugins_data", help="per-plugin JSON directory")
+    arg_parser.add_argument("--dataset", metavar="FILE", help="read plugins from a consolidated JSONL dataset")
+    arg_parser.add_argument("--tree", default="plugins", help="organized plugin tree")
+    arg_parser.add_argument("--blobs", default="plugin_blobs", help="blob store for source diffs")
+    arg_parser.add_argument("--keep-sources", action="store_true",
+                            help="store snapshot sources in the blob store so later diffs can show them")
+    arg_parser.add_argument("--format", default="markdown", choices=("markdown", "json"), help="diff output format")
+    arg_parser.add_argument("--output", metavar="FILE", help="write the diff here instead of stdout")
+    arg_parser.add_argument("--source-diffs", metavar="DIR", help="write unified diffs of changed .cs files here")
+    args = arg_parser.parse_args()
+
+    store = SnapshotStore(args.root)
+    if args.command == "snapshot":
+        print(store.create(args.data_dir, args.tree, args.dataset, args.blobs if args.keep_sources else None))
+    elif args.command == "list":
+        for name in store.names():
+            print(name)
+    else:
+        if len(args.snapshots) > 2:
+            arg_parser.error("diff takes at most two snapshots: OLD and NEW")
+        old_name, new_name = (args.snapshots + ["previous", "latest"][len(args.snapshots):])[:2]
+        try:
+            old, new = store.load(old_name), store.load(new_name)
+        except FileNotFoundError as e:
+            arg_parser.error(str(e))
+        start = time.monotonic()
+        changes = diff_snapshots(old, new)
+        logger.info(f"Diffed {len(old['plugins'])} -> {len(new['plugins'])} plugins "
+                    f"in {time.monotonic() - start:.3f}s: {changes['summary']}")
+
+        if args.source_diffs:
+            diff_dir = Path(args.source_diffs)
+            diff_dir.mkdir(parents=True, exist_ok=True)
+            for slug, diff in source_diffs(changes, old, new, args.blobs).items():
+                if diff is None:
+                    logger.warning(f"Previous source of {slug} is not available, no diff written")
+                else:
+                    (diff_dir / f"{slug}.diff").write_text(diff, encoding="utf-8")
+
+        output = render_changelog(changes) if args.format == "markdown" else dumps(changes, indent=True).decode("utf-8")
+        if args.output:
+            Path(args.output).write_text(output, encoding="utf-8")
+        else:
+            print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from plugin_tree import iter_plugin_dirs, load_plugin_json, plugin_source
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# При изменении набора извлекаемых полей версия увеличивается, и кэш пересобирается
+EXTRACTOR_VERSION = 3
+
+_STRING = r'"((?:[^"\\]|\\.)*)"'
+INFO_RE = re.compile(r'\[\s*Info\s*\(\s*' + _STRING + r'\s*,\s*' + _STRING + r'\s*,\s*' + _STRING)
+DESCRIPTION_RE = re.compile(r'\[\s*Description\s*\(\s*' + _STRING)
+USING_RE = re.compile(r'^\s*using\s+(?:static\s+)?(?:\w+\s*=\s*)?([\w.]+)\s*;', re.MULTILINE)
+CLASS_RE = re.compile(r'\bclass\s+(\w+)\s*:\s*(?:\w+\.)*(?:RustPlugin|CovalencePlugin|HurtworldPlugin|'
+                      r'ReignOfKingsPlugin|SevenDaysPlugin|CSPlugin|\w*Plugin)\b')
+PLUGIN_REFERENCE_RE = re.compile(
+    r'\[\s*PluginReference\s*(?:\(\s*"([^"]+)"\s*\))?\s*\]\s*'
+    r'(?:(?:private|public|protected|internal|readonly|static)\s+)*(?:Oxide\.Core\.Plugins\.)?Plugin\s+([\w\s,]+?)\s*[;=]'
+)
+METHOD_RE = re.compile(
+    r'^[ \t]*(?:(?:private|public|protected|internal|static|override|virtual|async|new)\s+)*'
+    r'([\w<>\[\],.?]+)\s+(\w+)\s*\(',
+    re.MULTILINE
+)
+
+# Хуки без префикса On/Can, которые Oxide вызывает по имени
+NAMED_HOOKS = frozenset({"Init", "Loaded", "Unload"})
+# Вызовы других плагинов: Field.Call("Method"), plugins.Find("Name") и хуки через Interface.
+# Шаблоны начинаются с литерала, чтобы движок регулярных выражений не примерял их к каждому слову
+CALL_RE = re.compile(r'\.\s*Call\s*(?:<[^>()]*>)?\s*\(\s*"(\w+)"')
+CALL_TARGET_RE = re.compile(r'(\w+)\s*\??\s*$')
+LOOKUP_RES = (
+    re.compile(r'plugins\.Find\s*\(\s*"(\w+)"\s*\)'),
+    re.compile(r'GetPlugin\s*\(\s*"(\w+)"\s*\)')
+)
+EMIT_RE = re.compile(r'Interface\.(?:Oxide\.)?Call(?:Hook)?\s*(?:<[^>()]*>)?\s*\(\s*"(\w+)"')
+
+# Разбор тел методов-хуков: скобки, строки и комментарии (чтобы не считать скобки внутри них)
+TOKEN_RE = re.compile(r'[{}();]|@?\$?"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|//[^\n]*|/\*.*?\*/', re.DOTALL)
+BODY_START_RE = re.compile(r'\s*(?:where\b[^{;=]*)?(\{|=>|;)')
+LOOP_RE = re.compile(r'\b(?:for|foreach|while)\s*\(|\bdo\s*\{')
+LINQ_RE = re.compile(r'\.(?:Where|Select|SelectMany|Any|All|First|FirstOrDefault|Last|LastOrDefault|Single|'
+                     r'SingleOrDefault|OrderBy|OrderByDescending|ThenBy|GroupBy|Distinct|ToList|ToArray|'
+                     r'ToDictionary|Count|Sum|Min|Max|Average|Aggregate|Skip|Take)\s*(?:<[^>()]*>)?\s*\(')
+
+NOT_A_TYPE = frozenset({"return", "new", "await", "else", "throw", "yield", "case", "goto", "using"})
+
+def looks_like_plugin_source(content: str) -> bool:
+    """Проверяет, что текст похож на исходник плагина uMod/Oxide, а не на HTML или заглушку"""
+    if content.lstrip().startswith("<"):
+        return False
+    if INFO_RE.search(content):
+        return True
+    return "using " in content and ("class " in content or "namespace " in content)
+
+def _unescape(value: str) -> str:
+    return value.replace('\\"', '"').replace("\\\\", "\\")
+
+def _method_body(content: str, params_start: int) -> Optional[str]:
+    """Тело метода по позиции сразу после открывающей скобки параметров; None для объявления без тела"""
+    depth = 1
+    position = params_start
+    for token in TOKEN_RE.finditer(content, params_start):
+        value = token.group()
+        if value == "(":
+            depth += 1
+        elif value == ")":
+            depth -= 1
+            if depth == 0:
+                position = token.end()
+                break
+    else:
+        return None
+
+    start = BODY_START_RE.match(content, position)
+    if not start or start.group(1) == ";":
+        return None
+    # Тело в фигурных скобках заканчивается парной скобкой, тело-выражение (=>) — точкой с запятой
+    expression = start.group(1) == "=>"
+    depth = 0 if expression else 1
+    for token in TOKEN_RE.finditer(content, start.end()):
+        value = token.group()
+        if value in "({":
+            depth += 1
+        elif value in ")}":
+            depth -= 1
+            if depth == 0 and not expression:
+                return content[start.start(1):token.end()]
+        elif value == ";" and expression and depth == 0:
+            return content[start.start(1):token.end()]
+    return None
+
+def extract_metadata(content: str) -> Dict:
+    """Извлекает из исходника плагина атрибуты Info/Description, хуки, PluginReference, вызовы других плагинов и using"""
+    info = INFO_RE.search(content)
+    description = DESCRIPTION_RE.search(content)
+    class_match = CLASS_RE.search(content)
+
+    references = []
+    for attribute_name, field_names in PLUGIN_REFERENCE_RE.findall(content):
+        for field_name in (name.strip() for name in field_names.split(",")):
+            if field_name:
+                # [PluginReference("Name")] задает имя плагина явно, иначе им служит имя поля
+                references.append({"field": field_name, "plugin": attribute_name or field_name})
+
+    hooks = {}
+    for match in METHOD_RE.finditer(content):
+        return_type, name = match.groups()
+        if return_type in NOT_A_TYPE:
+            continue
+        if name in NAMED_HOOKS or (len(name) > 2 and name[:2] == "On" and name[2].isupper()) \
+                or (len(name) > 3 and name[:3] == "Can" and name[3].isupper()):
+            # Перегрузки одного хука суммируются: Oxide вызывает подходящую по сигнатуре
+            cost = hooks.setdefault(name, {"lines": 0, "loops": 0, "linq": 0})
+            body = _method_body(content, match.end())
+            if body:
+                cost["lines"] += body.count("\n") + 1
+                cost["loops"] += len(LOOP_RE.findall(body))
+                cost["linq"] += len(LINQ_RE.findall(body))
+
+    calls = set()
+    for match in CALL_RE.finditer(content):
+        target = CALL_TARGET_RE.search(content, max(0, match.start() - 64), match.start())
+        if target and target.group(1) != "Interface":
+            calls.add((target.group(1), match.group(1)))
+
+    return {
+        "is_source": looks_like_plugin_source(content),
+        "info": {
+            "name": _unescape(info.group(1)),
+            "author": _unescape(info.group(2)),
+            "version": info.group(3)
+        } if info else None,
+        "description": _unescape(description.group(1)) if description else None,
+        "class_name": class_match.group(1) if class_match else None,
+        "usings": sorted(set(USING_RE.findall(content))),
+        "hooks": sorted(hooks),
+        "hook_costs": dict(sorted(hooks.items())),
+        "plugin_references": references,
+        "calls": [{"field": field, "method": method} for field, method in sorted(calls)],
+        "plugin_lookups": sorted({name for pattern in LOOKUP_RES for name in pattern.findall(content)}),
+        "emitted_hooks": sorted(set(EMIT_RE.findall(content))),
+        "lines": content.count("\n") + 1
+    }
+
+def _hash_source(path: Path) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _extract_file(path: str) -> Dict:
+    """Разбирает один исходник (в пуле процессов)"""
+    with open(path, 'rb') as f:
+        return extract_metadata(f.read().decode('utf-8', errors='ignore'))
+
+class MetadataIndex:
+    """Индекс метаданных исходников плагинов, кэшированный по хешу файла.
+
+    Для каждого плагина (по slug) хранится путь к .cs, его размер, mtime, SHA-256
+    и извлеченные метаданные. Файлы с неизменными размером и mtime не читаются
+    вовсе, а с неизменным хешем — не разбираются повторно.
+    """
+
+    def __init__(self, index_file: str = "cs_metadata.json"):
+        self.index_file = Path(index_file)
+        self.plugins: Dict[str, Dict] = {}
+        if self.index_file.exists():
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == EXTRACTOR_VERSION:
+                self.plugins = data.get("plugins", {})
+
+    def get(self, slug: str) -> Optional[Dict]:
+        return self.plugins.get(slug)
+
+    def items(self):
+        return self.plugins.items()
+
+    def update(self, tree_root: str = "plugins", workers: Optional[int] = None) -> Dict[str, int]:
+        """Сканирует дерево плагинов параллельно, разбирая только новые и измененные исходники"""
+        start = time.monotonic()
+        previous = self.plugins
+        current: Dict[str, Dict] = {}
+        by_sha256 = {entry["sha256"]: entry["meta"] for entry in previous.values()}
+        pending: List[Tuple[str, Path, os.stat_result]] = []
+
+        for plugin_dir in iter_plugin_dirs(tree_root):
+            source = plugin_source(plugin_dir)
+            data = load_plugin_json(plugin_dir)
+            if not source.exists() or not data or not data.get("id"):
+                continue
+            slug = data["id"]
+            stat = source.stat()
+            cached = previous.get(slug)
+            if cached and cached["path"] == str(source) and cached["size"] == stat.st_size \
+                    and cached["mtime_ns"] == stat.st_mtime_ns:
+                current[slug] = cached
+            else:
+                pending.append((slug, source, stat))
+
+        # Хеш считается до отправки в пул: исходник с уже известным содержимым в пул не попадает,
+        # а одинаковые новые исходники разбираются один раз
+        hashed = [(slug, source, stat, _hash_source(source)) for slug, source, stat in pending]
+        to_parse: Dict[str, str] = {}
+        for _, source, _, sha256 in hashed:
+            if sha256 not in by_sha256:
+                to_parse.setdefault(sha256, str(source))
+
+        if to_parse:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(_extract_file, list(to_parse.values()), chunksize=8)
+                for sha256, meta in zip(to_parse, results):
+                    by_sha256[sha256] = meta
+
+        for slug, source, stat, sha256 in hashed:
+            current[slug] = {
+                "path": str(source),
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": sha256,
+                "meta": by_sha256[sha256]
+            }
+
+        self.plugins = dict(sorted(current.items()))
+        self.save()
+
+        stats = {"plugins": len(self.plugins), "checked": len(pending), "parsed": len(to_parse),
+                 "removed": len(set(previous) - set(current))}
+        logger.info(f"Metadata index updated in {time.monotonic() - start:.2f}s: {stats}")
+        return stats
+
+    def save(self):
+        tmp_file = self.index_file.with_name(self.index_file.name + ".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"version": EXTRACTOR_VERSION, "plugins": self.plugins}, f,
+                      ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_file, self.index_file)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Extract metadata from plugin C# sources")
+    arg_parser.add_argument("--tree", default="plugins", help="organized plugin tree")
+    arg_parser.add_argument("--index", default="cs_metadata.json", help="metadata index file")
+    arg_parser.add_argument("--workers", type=int, help="number of worker processes")
+    args = arg_parser.parse_args()
+
+    index = MetadataIndex(args.index)
+    index.update(args.tree, args.workers)
+
+if __name__ == "__main__":
+    main()
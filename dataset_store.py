@@ -0,0 +1,207 @@
+import argparse
+import gzip
+import json
+import logging
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from models import dump_json_file, load_json_file, loads
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Формат индекса: заголовок (сигнатура, версия, число записей, размер файла
+# данных), затем для каждой записи смещение, длина, длина slug и сам slug
+INDEX_MAGIC = b"UPDX"
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct("<4sHIQ")
+INDEX_ENTRY = struct.Struct("<QIH")
+
+def index_path_for(dataset_file: Path) -> Path:
+    return dataset_file.with_name(dataset_file.name + ".idx")
+
+def _encode_record(record: Dict) -> bytes:
+    """Компактная JSON строка записи; переводы строк внутри JSON всегда экранированы"""
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+def write_dataset(records: Iterable[Dict], dataset_file: str, compress: bool = False) -> int:
+    """Записывает все записи в один JSONL файл и строит индекс slug -> смещение.
+
+    Для сжатого файла (.jsonl.gz) индекс не строится: произвольный доступ к
+    gzip потоку невозможен без распаковки, такой файл читается потоково.
+    """
+    dataset_file = Path(dataset_file)
+    records = sorted(records, key=lambda record: record["id"])
+    tmp_file = dataset_file.with_name(dataset_file.name + ".tmp")
+
+    entries: List[Tuple[bytes, int, int]] = []
+    if compress:
+        with gzip.open(tmp_file, 'wb') as f:
+            for record in records:
+                f.write(_encode_record(record))
+    else:
+        offset = 0
+        with open(tmp_file, 'wb') as f:
+            for record in records:
+                line = _encode_record(record)
+                f.write(line)
+                entries.append((record["id"].encode("utf-8"), offset, len(line)))
+                offset += len(line)
+    os.replace(tmp_file, dataset_file)
+
+    if not compress:
+        index_file = index_path_for(dataset_file)
+        tmp_index = index_file.with_name(index_file.name + ".tmp")
+        with open(tmp_index, 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(entries), dataset_file.stat().st_size))
+            for slug, offset, length in entries:
+                f.write(INDEX_ENTRY.pack(offset, length, len(slug)))
+                f.write(slug)
+        os.replace(tmp_index, index_file)
+
+    logger.info(f"Wrote {len(records)} plugin records to {dataset_file} ({dataset_file.stat().st_size} bytes)")
+    return len(records)
+
+def export_dataset(source_dir: str = "plugins_data", dataset_file: str = "plugins_data.jsonl",
+                   compress: bool = False) -> int:
+    """Собирает per-plugin JSON файлы в один датасет"""
+    records = []
+    for json_file in Path(source_dir).glob("*.json"):
+        records.append(load_json_file(json_file))
+    return write_dataset(records, dataset_file, compress)
+
+def update_dataset(dataset_file: str, records: Iterable[Dict]) -> int:
+    """Обновляет датасет новыми или измененными записями (по id), сохраняя остальные"""
+    dataset_file = Path(dataset_file)
+    merged = {}
+    if dataset_file.exists():
+        with DatasetReader(dataset_file) as reader:
+            merged = {record["id"]: record for record in reader.load_all()}
+    for record in records:
+        merged[record["id"]] = record
+    return write_dataset(merged.values(), dataset_file, compress=dataset_file.suffix == ".gz")
+
+def write_per_file_view(dataset_file: str, output_dir: str = "plugins_data") -> int:
+    """Разворачивает датасет в привычную раскладку output_dir/<slug>.json"""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    count = 0
+    with DatasetReader(dataset_file) as reader:
+        for record in reader.iter_records():
+            dump_json_file(record, output_dir / f"{record['id']}.json")
+            count += 1
+    logger.info(f"Wrote {count} per-plugin JSON files to {output_dir}")
+    return count
+
+class DatasetReader:
+    """Чтение датасета: потоковый обход, загрузка целиком и доступ по slug через индекс"""
+
+    def __init__(self, dataset_file: str):
+        self.dataset_file = Path(dataset_file)
+        self.compressed = self.dataset_file.suffix == ".gz"
+        self._index: Optional[Dict[str, Tuple[int, int]]] = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open(self):
+        return gzip.open(self.dataset_file, 'rb') if self.compressed else open(self.dataset_file, 'rb')
+
+    def _load_index(self) -> Dict[str, Tuple[int, int]]:
+        """Читает индекс одним чтением; устаревший индекс перестраивается по файлу данных"""
+        if self._index is not None:
+            return self._index
+
+        index = {}
+        index_file = index_path_for(self.dataset_file)
+        data = index_file.read_bytes() if index_file.exists() else b""
+        if len(data) >= INDEX_HEADER.size:
+            magic, version, count, data_size = INDEX_HEADER.unpack_from(data, 0)
+            if magic == INDEX_MAGIC and version == INDEX_VERSION and data_size == self.dataset_file.stat().st_size:
+                position = INDEX_HEADER.size
+                for _ in range(count):
+                    offset, length, slug_length = INDEX_ENTRY.unpack_from(data, position)
+                    position += INDEX_ENTRY.size
+                    index[data[position:position + slug_length].decode("utf-8")] = (offset, length)
+                    position += slug_length
+                self._index = index
+                return index
+
+        logger.warning(f"Index for {self.dataset_file} is missing or stale, scanning the dataset")
+        offset = 0
+        with self._open() as f:
+            for line in f:
+                index[loads(line)["id"]] = (offset, len(line))
+                offset += len(line)
+        self._index = index
+        return index
+
+    def __len__(self) -> int:
+        return len(self._load_index())
+
+    def __contains__(self, slug: str) -> bool:
+        return slug in self._load_index()
+
+    def slugs(self) -> List[str]:
+        return list(self._load_index())
+
+    def get(self, slug: str) -> Optional[Dict]:
+        """Возвращает запись плагина по slug, читая с диска только ее строку"""
+        if self.compressed:
+            return next((record for record in self.iter_records() if record["id"] == slug), None)
+
+        location = self._load_index().get(slug)
+        if location is None:
+            return None
+        offset, length = location
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.dataset_file, 'rb')
+            self._file.seek(offset)
+            line = self._file.read(length)
+        return loads(line)
+
+    def iter_records(self) -> Iterator[Dict]:
+        """Лениво отдает записи по одной, не загружая весь файл в память"""
+        with self._open() as f:
+            for line in f:
+                yield loads(line)
+
+    def load_all(self) -> List[Dict]:
+        """Загружает весь каталог одним чтением и одним проходом парсера"""
+        with self._open() as f:
+            data = f.read().rstrip(b"\n")
+        if not data:
+            return []
+        return loads(b"[" + data.replace(b"\n", b",") + b"]")
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Convert between plugins_data/*.json and a single JSONL dataset")
+    arg_parser.add_argument("--source", default="plugins_data", help="directory with per-plugin JSON files")
+    arg_parser.add_argument("--dataset", default="plugins_data.jsonl", help="consolidated dataset file")
+    arg_parser.add_argument("--gzip", action="store_true", help="write a gzip-compressed dataset without an index")
+    arg_parser.add_argument("--view", metavar="DIR", help="write per-plugin JSON files from the dataset to DIR")
+    args = arg_parser.parse_args()
+
+    if args.view:
+        write_per_file_view(args.dataset, args.view)
+    else:
+        dataset_file = args.dataset + ".gz" if args.gzip and not args.dataset.endswith(".gz") else args.dataset
+        export_dataset(args.source, dataset_file, compress=args.gzip)
+
+if __name__ == "__main__":
+    main()
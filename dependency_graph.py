@@ -0,0 +1,332 @@
+import argparse
+import heapq
+import json
+import logging
+import os
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from cs_metadata import MetadataIndex
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+GRAPH_VERSION = 1
+
+# Виды связей между плагинами:
+#   reference — поле [PluginReference] на другой плагин
+#   call      — вызов Field.Call("Method") через такое поле
+#   lookup    — поиск плагина по имени: plugins.Find("Name") / GetPlugin("Name")
+#   hook      — реализация хука, который другой плагин вызывает через Interface.CallHook
+EDGE_KINDS = ("reference", "call", "lookup", "hook")
+# Без плагинов по связям hook сервер продолжит работать: их хуки просто перестанут вызываться
+HARD_KINDS = frozenset({"reference", "call", "lookup"})
+# Хук, который вызывают больше плагинов, считается общим, а не API конкретного плагина
+MAX_HOOK_EMITTERS = 3
+
+def _build_name_index(metadata: MetadataIndex) -> Dict[str, str]:
+    """Сопоставляет имена плагинов (из пути к .cs, имени класса и атрибута Info) их slug"""
+    names: Dict[str, str] = {}
+    entries = sorted(metadata.items())
+    # Имя файла надежнее всего: по нему Oxide и ищет плагин, поэтому оно заполняется первым
+    for slug, entry in entries:
+        names.setdefault(Path(entry["path"]).stem.lower(), slug)
+    for slug, entry in entries:
+        meta = entry["meta"]
+        if meta.get("class_name"):
+            names.setdefault(meta["class_name"].lower(), slug)
+        if meta.get("info"):
+            names.setdefault(meta["info"]["name"].replace(" ", "").lower(), slug)
+    return names
+
+def _closure(start: str, adjacency: Dict[str, Iterable[str]]) -> Set[str]:
+    """Все вершины, достижимые из start (без нее самой)"""
+    seen = {start}
+    queue = deque([start])
+    while queue:
+        node = queue.popleft()
+        for neighbour in adjacency.get(node, ()):
+            if neighbour not in seen:
+                seen.add(neighbour)
+                queue.append(neighbour)
+    seen.discard(start)
+    return seen
+
+def _strongly_connected(nodes: List[str], adjacency: Dict[str, List[str]]) -> List[List[str]]:
+    """Компоненты сильной связности (итеративный алгоритм Тарьяна), вершины каждой отсортированы"""
+    node_set = set(nodes)
+    index: Dict[str, int] = {}
+    lowlink: Dict[str, int] = {}
+    stack: List[str] = []
+    on_stack: Set[str] = set()
+    components = []
+
+    for root in nodes:
+        if root in index:
+            continue
+        work = [(root, iter(adjacency.get(root, ())))]
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, neighbours = work[-1]
+            for neighbour in neighbours:
+                if neighbour not in node_set:
+                    continue
+                if neighbour not in index:
+                    index[neighbour] = lowlink[neighbour] = len(index)
+                    stack.append(neighbour)
+                    on_stack.add(neighbour)
+                    work.append((neighbour, iter(adjacency.get(neighbour, ()))))
+                    break
+                if neighbour in on_stack:
+                    lowlink[node] = min(lowlink[node], index[neighbour])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(sorted(component))
+    return components
+
+def build_graph(metadata: MetadataIndex) -> Dict:
+    """Строит граф зависимостей по метаданным исходников.
+
+    Ребро A -> B означает, что A обращается к B. Для каждого плагина заранее
+    считается транзитивное множество плагинов, которые сломаются без него.
+    """
+    names = _build_name_index(metadata)
+    edges: Dict[str, Dict[str, Set[str]]] = {slug: defaultdict(set) for slug, _ in metadata.items()}
+    unresolved: Dict[str, Set[str]] = defaultdict(set)
+
+    def add_edge(slug: str, plugin_name: str, kind: str):
+        target = names.get(plugin_name.lower())
+        if target is None:
+            unresolved[slug].add(plugin_name)
+        elif target != slug:
+            edges[slug][target].add(kind)
+
+    emitters: Dict[str, Set[str]] = defaultdict(set)
+    for slug, entry in metadata.items():
+        meta = entry["meta"]
+        for hook in meta.get("emitted_hooks", ()):
+            emitters[hook].add(slug)
+
+        fields = {}
+        for reference in meta.get("plugin_references", ()):
+            fields[reference["field"]] = reference["plugin"]
+            add_edge(slug, reference["plugin"], "reference")
+        for call in meta.get("calls", ()):
+            if call["field"] in fields:
+                add_edge(slug, fields[call["field"]], "call")
+        for plugin_name in meta.get("plugin_lookups", ()):
+            add_edge(slug, plugin_name, "lookup")
+
+    for slug, entry in metadata.items():
+        for hook in entry["meta"].get("hooks", ()):
+            hook_emitters = emitters.get(hook)
+            if hook_emitters and len(hook_emitters) <= MAX_HOOK_EMITTERS:
+                for emitter in hook_emitters:
+                    if emitter != slug:
+                        edges[slug][emitter].add("hook")
+
+    nodes = {
+        slug: {target: sorted(kinds) for target, kinds in sorted(targets.items())}
+        for slug, targets in sorted(edges.items())
+    }
+
+    hard_reverse: Dict[str, List[str]] = defaultdict(list)
+    for slug, targets in nodes.items():
+        for target, kinds in targets.items():
+            if HARD_KINDS.intersection(kinds):
+                hard_reverse[target].append(slug)
+    breaks = {}
+    for slug in nodes:
+        affected = _closure(slug, hard_reverse)
+        if affected:
+            breaks[slug] = sorted(affected)
+
+    return {
+        "version": GRAPH_VERSION,
+        "built_at": time.time(),
+        "nodes": nodes,
+        "breaks": breaks,
+        "unresolved": {slug: sorted(plugin_names) for slug, plugin_names in sorted(unresolved.items())}
+    }
+
+class DependencyGraph:
+    """Граф зависимостей плагинов с ключами-slug и запросами по нему.
+
+    Прямые и обратные списки смежности хранятся в памяти, индекс
+    "что сломается без X" посчитан заранее при построении графа.
+    """
+
+    def __init__(self, graph_file: str = "dependency_graph.json"):
+        self.graph_file = Path(graph_file)
+        self.nodes: Dict[str, Dict[str, List[str]]] = {}
+        self.breaks_index: Dict[str, List[str]] = {}
+        self.unresolved: Dict[str, List[str]] = {}
+        self.reverse: Dict[str, Dict[str, List[str]]] = {}
+        if self.graph_file.exists():
+            with open(self.graph_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == GRAPH_VERSION:
+                self._load(data)
+
+    def _load(self, data: Dict):
+        self.nodes = data["nodes"]
+        self.breaks_index = data["breaks"]
+        self.unresolved = data["unresolved"]
+        self.reverse = defaultdict(dict)
+        for slug, targets in self.nodes.items():
+            for target, kinds in targets.items():
+                self.reverse[target][slug] = kinds
+
+    def rebuild(self, tree_root: str = "plugins", metadata_file: str = "cs_metadata.json",
+                workers: Optional[int] = None) -> Dict[str, int]:
+        """Обновляет индекс метаданных (инкрементально) и пересобирает граф"""
+        start = time.monotonic()
+        metadata = MetadataIndex(metadata_file)
+        metadata.update(tree_root, workers)
+        data = build_graph(metadata)
+        self._load(data)
+        self.save(data)
+
+        stats = {
+            "plugins": len(self.nodes),
+            "edges": sum(len(targets) for targets in self.nodes.values()),
+            "with_dependents": len(self.breaks_index),
+            "unresolved": sum(len(plugin_names) for plugin_names in self.unresolved.values())
+        }
+        logger.info(f"Dependency graph built in {time.monotonic() - start:.2f}s: {stats}")
+        return stats
+
+    def save(self, data: Dict):
+        tmp_file = self.graph_file.with_name(self.graph_file.name + ".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_file, self.graph_file)
+
+    def _adjacency(self, reverse: bool, kinds: Optional[Iterable[str]]) -> Dict[str, List[str]]:
+        source = self.reverse if reverse else self.nodes
+        kinds = set(kinds) if kinds else None
+        return {
+            slug: [other for other, edge_kinds in targets.items() if kinds is None or kinds.intersection(edge_kinds)]
+            for slug, targets in source.items()
+        }
+
+    def dependencies(self, slug: str, transitive: bool = False,
+                     kinds: Optional[Iterable[str]] = None) -> List[str]:
+        """Плагины, к которым обращается slug (транзитивно — вместе с их зависимостями)"""
+        adjacency = self._adjacency(False, kinds)
+        if transitive:
+            return sorted(_closure(slug, adjacency))
+        return sorted(adjacency.get(slug, ()))
+
+    def dependents(self, slug: str, transitive: bool = False,
+                   kinds: Optional[Iterable[str]] = None) -> List[str]:
+        """Плагины, которые обращаются к slug"""
+        adjacency = self._adjacency(True, kinds)
+        if transitive:
+            return sorted(_closure(slug, adjacency))
+        return sorted(adjacency.get(slug, ()))
+
+    def breaks(self, slug: str) -> List[str]:
+        """Что сломается без slug: ответ из заранее посчитанного индекса"""
+        return self.breaks_index.get(slug, [])
+
+    def load_order(self, slugs: Optional[Iterable[str]] = None,
+                   kinds: Optional[Iterable[str]] = HARD_KINDS) -> Tuple[List[str], List[List[str]]]:
+        """Топологический порядок загрузки: зависимости раньше зависящих от них.
+
+        Если заданы slugs, в порядок попадают они и их транзитивные зависимости.
+        Плагины, ссылающиеся друг на друга по кругу, идут подряд одной группой;
+        такие группы возвращаются вторым элементом.
+        """
+        adjacency = self._adjacency(False, kinds)
+        if slugs is None:
+            selected = set(self.nodes)
+        else:
+            selected = set()
+            for slug in slugs:
+                selected.add(slug)
+                selected |= _closure(slug, adjacency)
+
+        components = _strongly_connected(sorted(selected), adjacency)
+        component_of = {slug: i for i, component in enumerate(components) for slug in component}
+
+        # Алгоритм Кана над графом компонент; куча по первому slug компоненты дает детерминированный порядок
+        pending = [0] * len(components)
+        dependents = defaultdict(set)
+        for slug in selected:
+            for target in adjacency.get(slug, ()):
+                if target in selected and component_of[target] != component_of[slug]:
+                    if component_of[slug] not in dependents[component_of[target]]:
+                        dependents[component_of[target]].add(component_of[slug])
+                        pending[component_of[slug]] += 1
+
+        ready = [(components[i][0], i) for i, count in enumerate(pending) if count == 0]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            _, i = heapq.heappop(ready)
+            order.extend(components[i])
+            for dependent in dependents[i]:
+                pending[dependent] -= 1
+                if pending[dependent] == 0:
+                    heapq.heappush(ready, (components[dependent][0], dependent))
+
+        cycles = [component for component in components if len(component) > 1]
+        if cycles:
+            logger.warning(f"Found {len(cycles)} dependency cycles among "
+                           f"{sum(len(component) for component in cycles)} plugins")
+        return order, cycles
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Plugin dependency graph queries")
+    arg_parser.add_argument("--graph", default="dependency_graph.json", help="graph file")
+    arg_parser.add_argument("--tree", default="plugins", help="organized plugin tree")
+    arg_parser.add_argument("--metadata", default="cs_metadata.json", help="source metadata index file")
+    arg_parser.add_argument("--build", action="store_true", help="rebuild the graph before querying")
+    arg_parser.add_argument("--deps", metavar="SLUG", help="show what the plugin depends on")
+    arg_parser.add_argument("--dependents", metavar="SLUG", help="show plugins that depend on the plugin")
+    arg_parser.add_argument("--transitive", action="store_true", help="follow --deps/--dependents transitively")
+    arg_parser.add_argument("--breaks", metavar="SLUG", help="show plugins that break if the plugin is removed")
+    arg_parser.add_argument("--order", nargs="*", metavar="SLUG", help="print load order (for all plugins if empty)")
+    args = arg_parser.parse_args()
+
+    graph = DependencyGraph(args.graph)
+    if args.build or not graph.nodes:
+        graph.rebuild(args.tree, args.metadata)
+
+    for slug in (args.deps, args.dependents, args.breaks, *(args.order or [])):
+        if slug and slug not in graph.nodes and slug not in graph.reverse:
+            arg_parser.error(f"unknown plugin: {slug}")
+
+    if args.deps:
+        for slug in graph.dependencies(args.deps, args.transitive):
+            print(f"{slug}  {','.join(graph.nodes.get(args.deps, {}).get(slug, []))}")
+    if args.dependents:
+        for slug in graph.dependents(args.dependents, args.transitive):
+            print(f"{slug}  {','.join(graph.reverse.get(args.dependents, {}).get(slug, []))}")
+    if args.breaks:
+        for slug in graph.breaks(args.breaks):
+            print(slug)
+    if args.order is not None:
+        order, _ = graph.load_order(args.order or None)
+        for slug in order:
+            print(slug)
+
+if __name__ == "__main__":
+    main()
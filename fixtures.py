@@ -0,0 +1,386 @@
+import argparse
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from plugin_tree import iter_plugin_dirs, load_plugin_json, plugin_source
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Заголовки ответа, которые сохраняются в фикстурах (нужны условным запросам и ограничителю)
+RECORDED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+# Фиксированная дата записей архива: один и тот же набор фикстур дает один и тот же файл
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+SEARCH_PATH = "/plugins/search.json"
+
+def request_key(method: str, url: str, params: Optional[Dict] = None) -> str:
+    """Ключ фикстуры: метод, путь и отсортированные параметры запроса (без хоста)"""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query) + [(str(key), str(value)) for key, value in (params or {}).items()]
+    return f"{method.upper()} {parts.path}" + (f"?{urlencode(sorted(query))}" if query else "")
+
+class FixtureArchive:
+    """Архив записанных HTTP ответов в одном zip файле.
+
+    index.json сопоставляет ключу запроса статус, заголовки и имя тела;
+    тела хранятся по SHA-256 содержимого, одинаковые ответы — один раз.
+    catalog.json (необязательный) — записи поисковой выдачи, из которых
+    mock-сервер собирает search.json для любых параметров страницы.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.entries: Dict[str, Dict] = {}
+        self.catalog: Optional[List[Dict]] = None
+        self._bodies: Dict[str, bytes] = {}
+        self._zip: Optional[zipfile.ZipFile] = None
+        self._lock = threading.Lock()
+        if self.path.exists():
+            self._zip = zipfile.ZipFile(self.path)
+            self.entries = json.loads(self._zip.read("index.json"))
+            if "catalog.json" in self._zip.namelist():
+                self.catalog = json.loads(self._zip.read("catalog.json"))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, key: str, status: int, headers: Dict[str, str], body: bytes):
+        digest = hashlib.sha256(body).hexdigest()
+        with self._lock:
+            self._bodies[digest] = body
+            self.entries[key] = {
+                "status": status,
+                "headers": {name: headers[name] for name in RECORDED_HEADERS if name in headers},
+                "body": digest
+            }
+
+    def get(self, key: str) -> Optional[Tuple[int, Dict[str, str], bytes]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        with self._lock:
+            body = self._bodies.get(entry["body"])
+            if body is None:
+                body = self._bodies[entry["body"]] = self._zip.read(f"bodies/{entry['body']}")
+        return entry["status"], entry["headers"], body
+
+    def save(self):
+        """Записывает архив заново (детерминированно: порядок и даты записей фиксированы)"""
+        with self._lock:
+            if self._zip is not None:
+                for digest in {entry["body"] for entry in self.entries.values()} - set(self._bodies):
+                    self._bodies[digest] = self._zip.read(f"bodies/{digest}")
+                self._zip.close()
+                self._zip = None
+
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as archive:
+                def write(name: str, data: bytes):
+                    archive.writestr(zipfile.ZipInfo(name, ZIP_DATE), data, zipfile.ZIP_DEFLATED)
+                write("index.json", json.dumps(self.entries, sort_keys=True, indent=1).encode("utf-8"))
+                if self.catalog is not None:
+                    write("catalog.json", json.dumps(self.catalog, ensure_ascii=False).encode("utf-8"))
+                for digest in sorted({entry["body"] for entry in self.entries.values()}):
+                    write(f"bodies/{digest}", self._bodies[digest])
+            tmp_path.replace(self.path)
+            self._zip = zipfile.ZipFile(self.path)
+        logger.info(f"Saved {len(self.entries)} fixtures to {self.path}")
+
+    def search_page(self, params: Dict[str, str]) -> Optional[bytes]:
+        """Страница search.json, собранная из каталога для заданных page/per_page/sort/sortdir"""
+        if self.catalog is None:
+            return None
+        page = max(1, int(params.get("page", 1)))
+        per_page = max(1, int(params.get("per_page", 10)))
+        sort = params.get("sort", "title")
+        field = "updated_at" if sort == "updated_at" else "name"
+        items = sorted(self.catalog, key=lambda item: str(item.get(field, "")).lower(),
+                       reverse=params.get("sortdir", "asc") == "desc")
+        last_page = max(1, (len(items) + per_page - 1) // per_page)
+        data = items[(page - 1) * per_page:page * per_page]
+        return json.dumps({"data": data, "current_page": page, "last_page": last_page,
+                           "per_page": per_page, "total": len(items)}).encode("utf-8")
+
+class RecordingSession(requests.Session):
+    """Сессия requests, записывающая успешные ответы в архив фикстур"""
+
+    def __init__(self, archive: FixtureArchive):
+        super().__init__()
+        self.archive = archive
+
+    def request(self, method, url, params=None, **kwargs):
+        response = super().request(method, url, params=params, **kwargs)
+        # 304 не перезаписывает сохраненное тело, а 429 и 5xx — временные ответы
+        if response.status_code < 500 and response.status_code not in (304, 429):
+            body = response.content
+            self.archive.add(request_key(method, url, params), response.status_code, response.headers, body)
+        return response
+
+class ReplaySession(requests.Session):
+    """Сессия requests, отвечающая из архива фикстур без обращения к сети"""
+
+    def __init__(self, archive: FixtureArchive):
+        super().__init__()
+        self.archive = archive
+
+    def request(self, method, url, params=None, **kwargs):
+        key = request_key(method, url, params)
+        fixture = self.archive.get(key)
+        if fixture is None and urlsplit(url).path == SEARCH_PATH:
+            body = self.archive.search_page(dict(parse_qsl(key.partition("?")[2])))
+            fixture = (200, {"Content-Type": "application/json"}, body) if body is not None else None
+        status, headers, body = fixture or (404, {}, b"")
+
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        response._content = body
+        response._content_consumed = True
+        response.encoding = "utf-8"
+        response.url = url
+        response.request = requests.Request(method, url).prepare()
+        return response
+
+@dataclass
+class MockProfile:
+    """Поведение mock-сервера: задержка ответа, доля ошибок 500 и ответов 429"""
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after: int = 1
+    seed: int = 0
+
+PROFILES = {
+    "instant": MockProfile(),
+    "lan": MockProfile(latency=0.005),
+    "realistic": MockProfile(latency=0.15, jitter=0.1),
+    "flaky": MockProfile(latency=0.05, jitter=0.02, error_rate=0.05),
+    "throttled": MockProfile(latency=0.05, throttle_rate=0.1, retry_after=1),
+}
+
+class MockUmodServer:
+    """Локальный HTTP сервер, воспроизводящий фикстуры с заданным профилем.
+
+    Поддерживает условные запросы (If-None-Match по записанному ETag), а
+    search.json для произвольных страниц собирает из каталога архива.
+    """
+
+    def __init__(self, archive: FixtureArchive, profile: MockProfile = PROFILES["instant"],
+                 host: str = "127.0.0.1", port: int = 0):
+        self.archive = archive
+        self.profile = profile
+        self.stats = {"requests": 0, "not_modified": 0, "not_found": 0, "errors": 0, "throttled": 0}
+        self._random = random.Random(profile.seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _roll(self) -> Tuple[float, float]:
+        """Случайные величины одного ответа под общей блокировкой (воспроизводимо при том же seed)"""
+        with self._lock:
+            return self._random.random(), self._random.uniform(-1.0, 1.0)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                logger.debug(f"Mock server: {format % args}")
+
+            def _send(self, status: int, headers: Dict[str, str], body: bytes):
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                server._count("requests")
+                profile = server.profile
+                chance, jitter = server._roll()
+                delay = max(0.0, profile.latency + profile.jitter * jitter)
+                if delay:
+                    time.sleep(delay)
+
+                if chance < profile.throttle_rate:
+                    server._count("throttled")
+                    self._send(429, {"Retry-After": str(profile.retry_after)}, b"")
+                    return
+                if chance < profile.throttle_rate + profile.error_rate:
+                    server._count("errors")
+                    self._send(500, {}, b"")
+                    return
+
+                key = request_key("GET", self.path)
+                fixture = server.archive.get(key)
+                if fixture is None and urlsplit(self.path).path == SEARCH_PATH:
+                    body = server.archive.search_page(dict(parse_qsl(urlsplit(self.path).query)))
+                    fixture = (200, {"Content-Type": "application/json"}, body) if body is not None else None
+                if fixture is None:
+                    server._count("not_found")
+                    self._send(404, {}, b"")
+                    return
+
+                status, headers, body = fixture
+                etag = headers.get("ETag")
+                if etag and self.headers.get("If-None-Match") == etag:
+                    server._count("not_modified")
+                    self._send(304, {"ETag": etag}, b"")
+                    return
+                self._send(status, headers, body)
+
+        return Handler
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-umod", daemon=True)
+        self._thread.start()
+        logger.info(f"Mock umod.org server at {self.base_url} ({len(self.archive)} fixtures, {self.profile})")
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+def _api_timestamp(value: str) -> str:
+    """Дата из сохраненного JSON (ISO) в формат поисковой выдачи API"""
+    try:
+        return datetime.fromisoformat(value).strftime("%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return ""
+
+def synthesize_archive(archive_path: str, tree_root: str = "plugins", limit: Optional[int] = None) -> int:
+    """Собирает архив фикстур из уже загруженного дерева плагинов, без обращения к сети.
+
+    Для каждого плагина создаются запись поисковой выдачи, HTML страница
+    (заголовок и описание) и ответ с .cs файлом с ETag и Last-Modified.
+    """
+    archive = FixtureArchive(archive_path)
+    archive.catalog = []
+    for plugin_dir in iter_plugin_dirs(tree_root):
+        if limit is not None and len(archive.catalog) >= limit:
+            break
+        data = load_plugin_json(plugin_dir)
+        source = plugin_source(plugin_dir)
+        if not data or not data.get("id") or not source.exists():
+            continue
+
+        slug = data["id"]
+        archive.catalog.append({
+            "slug": slug,
+            "name": data.get("name", ""),
+            "author": data.get("author", ""),
+            "description": data.get("description", ""),
+            "latest_release_version": data.get("latest_version", ""),
+            "downloads": data.get("total_downloads", 0),
+            "created_at": _api_timestamp(data.get("created_at")),
+            "updated_at": _api_timestamp(data.get("updated_at")),
+            "category_tags": ",".join(data.get("categories") or [])
+        })
+
+        page = (f'<html><body><h1>{data.get("name", "")}</h1>'
+                f'<div class="description">{data.get("description", "")}</div></body></html>')
+        archive.add(f"GET /plugins/{slug}", 200, {"Content-Type": "text/html; charset=utf-8"}, page.encode("utf-8"))
+
+        code = source.read_bytes()
+        archive.add(f"GET /plugins/{slug}.cs", 200, {
+            "Content-Type": "text/plain; charset=utf-8",
+            "ETag": f'"{hashlib.sha256(code).hexdigest()[:32]}"',
+            "Last-Modified": formatdate(source.stat().st_mtime, usegmt=True)
+        }, code)
+
+    archive.save()
+    logger.info(f"Synthesized fixtures for {len(archive.catalog)} plugins from {tree_root}")
+    return len(archive.catalog)
+
+def record_fixtures(archive_path: str, max_pages: int = 1, limit: Optional[int] = None,
+                    output_dir: str = "fixture_run") -> int:
+    """Один раз проходит по настоящему umod.org и записывает все ответы в архив"""
+    from organizer import PluginOrganizer
+    from umod_parser import UmodParser
+
+    archive = FixtureArchive(archive_path)
+    parser = UmodParser(output_dir=f"{output_dir}/plugins_data", max_pages=max_pages, state_file=None,
+                        session=RecordingSession(archive))
+    parser.get_all_plugins()
+    organizer = PluginOrganizer(source_dir=f"{output_dir}/plugins_data", output_dir=f"{output_dir}/plugins",
+                                blob_dir=f"{output_dir}/plugin_blobs", history_dir=None,
+                                session=RecordingSession(archive))
+    organizer.organize_plugins(limit=limit, resume=False)
+    archive.save()
+    return len(archive)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Record, synthesize and serve umod.org HTTP fixtures")
+    arg_parser.add_argument("command", choices=("record", "synthesize", "serve"))
+    arg_parser.add_argument("--archive", default="umod_fixtures.zip", help="fixture archive file")
+    arg_parser.add_argument("--tree", default="plugins", help="plugin tree to synthesize fixtures from")
+    arg_parser.add_argument("--pages", type=int, default=1, help="search pages to record")
+    arg_parser.add_argument("--limit", type=int, help="maximum number of plugins")
+    arg_parser.add_argument("--port", type=int, default=8765, help="mock server port")
+    arg_parser.add_argument("--profile", default="instant", choices=sorted(PROFILES), help="mock server profile")
+    arg_parser.add_argument("--latency", type=float, help="override the profile latency (seconds)")
+    arg_parser.add_argument("--error-rate", type=float, help="override the profile 500 error rate")
+    arg_parser.add_argument("--throttle-rate", type=float, help="override the profile 429 rate")
+    args = arg_parser.parse_args()
+
+    if args.command == "record":
+        record_fixtures(args.archive, args.pages, args.limit)
+    elif args.command == "synthesize":
+        synthesize_archive(args.archive, args.tree, args.limit)
+    else:
+        profile = PROFILES[args.profile]
+        overrides = {"latency": args.latency, "error_rate": args.error_rate, "throttle_rate": args.throttle_rate}
+        profile = MockProfile(**dict(vars(profile), **{key: value for key, value in overrides.items()
+                                                       if value is not None}))
+        server = MockUmodServer(FixtureArchive(args.archive), profile, port=args.port)
+        server.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.stop()
+            logger.info(f"Mock server stats: {server.stats}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import argparse
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from cs_metadata import MetadataIndex
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Хуки, которые сервер вызывает постоянно (каждый тик, на каждый ввод, урон или предмет)
+HOT_HOOKS = frozenset({
+    "OnTick", "OnFrame", "OnPlayerTick", "OnPlayerInput", "OnEntityTakeDamage", "OnEntitySpawned",
+    "OnEntityKill", "OnEntityDeath", "OnEntityEnter", "OnEntityLeave", "OnPlayerAttack", "OnWeaponFired",
+    "OnServerCommand", "OnItemAddedToContainer", "OnItemRemovedFromContainer", "OnLoseCondition",
+    "OnStructureDamage", "OnPlayerViolation", "OnEntityGroundMissing", "CanMoveItem", "CanLootEntity",
+    "CanBuild", "CanNetworkTo", "OnDispenserGather", "OnCollectiblePickup", "OnItemDropped"
+})
+# Грубая оценка стоимости обработчика: строки тела плюс штраф за циклы и LINQ (аллокации в горячем пути)
+LOOP_WEIGHT = 10
+LINQ_WEIGHT = 5
+
+def hook_cost(cost: Dict[str, int]) -> int:
+    return cost["lines"] + LOOP_WEIGHT * cost["loops"] + LINQ_WEIGHT * cost["linq"]
+
+class HookIndex:
+    """Индекс подписок плагинов на хуки Oxide/uMod.
+
+    Строится поверх индекса метаданных исходников: при обновлении заново
+    разбираются только измененные .cs файлы, а сам индекс хук -> плагины
+    пересобирается из метаданных в памяти.
+    """
+
+    def __init__(self, metadata_file: str = "cs_metadata.json"):
+        self.metadata = MetadataIndex(metadata_file)
+        self.subscribers: Dict[str, Dict[str, Dict[str, int]]] = {}
+        self._rebuild()
+
+    def _rebuild(self):
+        subscribers = defaultdict(dict)
+        for slug, entry in self.metadata.items():
+            for hook, cost in entry["meta"].get("hook_costs", {}).items():
+                subscribers[hook][slug] = dict(cost, score=hook_cost(cost))
+        self.subscribers = dict(subscribers)
+
+    def update(self, tree_root: str = "plugins", workers: Optional[int] = None) -> Dict[str, int]:
+        stats = self.metadata.update(tree_root, workers)
+        self._rebuild()
+        logger.info(f"Hook index covers {len(self.subscribers)} hooks")
+        return stats
+
+    def hooks(self) -> List[str]:
+        """Все хуки, отсортированные по числу подписанных плагинов"""
+        return sorted(self.subscribers, key=lambda hook: (-len(self.subscribers[hook]), hook))
+
+    def plugins_for(self, hook: str) -> List[Dict]:
+        """Плагины, обрабатывающие хук, от самых тяжелых обработчиков к легким"""
+        entries = [dict(cost, plugin=slug) for slug, cost in self.subscribers.get(hook, {}).items()]
+        return sorted(entries, key=lambda entry: (-entry["score"], entry["plugin"]))
+
+    def hooks_for(self, slug: str) -> Dict[str, Dict[str, int]]:
+        """Хуки, на которые подписан плагин, со стоимостью обработчиков"""
+        entry = self.metadata.get(slug)
+        if not entry:
+            return {}
+        return {hook: dict(cost, score=hook_cost(cost)) for hook, cost in entry["meta"].get("hook_costs", {}).items()}
+
+    def audit(self, slugs: Iterable[str], hooks: Iterable[str] = HOT_HOOKS) -> List[Dict]:
+        """Нагрузка набора плагинов на горячие хуки: обработчики и суммарная оценка по каждому хуку"""
+        slugs = set(slugs)
+        report = []
+        for hook in hooks:
+            handlers = [entry for entry in self.plugins_for(hook) if entry["plugin"] in slugs]
+            if handlers:
+                report.append({
+                    "hook": hook,
+                    "handlers": handlers,
+                    "score": sum(entry["score"] for entry in handlers),
+                    "loops": sum(entry["loops"] for entry in handlers),
+                    "linq": sum(entry["linq"] for entry in handlers)
+                })
+        return sorted(report, key=lambda item: (-item["score"], item["hook"]))
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Query which plugins subscribe to which hooks")
+    arg_parser.add_argument("--tree", default="plugins", help="organized plugin tree")
+    arg_parser.add_argument("--metadata", default="cs_metadata.json", help="source metadata index file")
+    arg_parser.add_argument("--no-update", action="store_true", help="query the index without rescanning sources")
+    arg_parser.add_argument("--hook", help="list plugins handling this hook")
+    arg_parser.add_argument("--plugin", metavar="SLUG", help="list hooks handled by this plugin")
+    arg_parser.add_argument("--audit", nargs="+", metavar="SLUG", help="hot-hook load of a plugin set")
+    arg_parser.add_argument("--top", type=int, default=20, help="number of hooks to list by default")
+    args = arg_parser.parse_args()
+
+    index = HookIndex(args.metadata)
+    if not args.no_update:
+        index.update(args.tree)
+
+    if args.hook:
+        for entry in index.plugins_for(args.hook):
+            print(f"{entry['score']:>6}  {entry['plugin']}  lines={entry['lines']} "
+                  f"loops={entry['loops']} linq={entry['linq']}")
+    elif args.plugin:
+        for hook, cost in sorted(index.hooks_for(args.plugin).items(), key=lambda item: -item[1]["score"]):
+            hot = " [hot]" if hook in HOT_HOOKS else ""
+            print(f"{cost['score']:>6}  {hook}{hot}  lines={cost['lines']} loops={cost['loops']} linq={cost['linq']}")
+    elif args.audit:
+        for item in index.audit(args.audit):
+            handlers = ", ".join(f"{entry['plugin']}({entry['score']})" for entry in item["handlers"])
+            print(f"{item['score']:>6}  {item['hook']}: {handlers}")
+    else:
+        for hook in index.hooks()[:args.top]:
+            hot = " [hot]" if hook in HOT_HOOKS else ""
+            print(f"{len(index.subscribers[hook]):>5}  {hook}{hot}")
+
+if __name__ == "__main__":
+    main()
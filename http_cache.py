@@ -0,0 +1,111 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PageCache:
+    """Кэш HTML страниц на время одного запуска с необязательным HTTP-кэшем на диске.
+
+    В памяти хранится не более max_entries последних страниц (LRU). Если задан
+    cache_dir, тело и заголовки ETag/Last-Modified сохраняются на диск, и при
+    следующем запуске страница запрашивается условным запросом: ответ 304
+    отдает сохраненное тело без повторной загрузки.
+    """
+
+    def __init__(self, fetch: Callable[..., Any], cache_dir: Optional[str] = None,
+                 max_entries: int = 256):
+        self.fetch = fetch
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_entries = max_entries
+
+        self._pages: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._url_locks: Dict[str, threading.Lock] = {}
+
+        self.hits = 0
+        self.revalidated = 0
+        self.fetched = 0
+
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _url_lock(self, url: str) -> threading.Lock:
+        """Блокировка на URL, чтобы два потока не загружали одну страницу одновременно"""
+        with self._lock:
+            return self._url_locks.setdefault(url, threading.Lock())
+
+    def _remember(self, url: str, text: str):
+        with self._lock:
+            self._pages[url] = text
+            self._pages.move_to_end(url)
+            while len(self._pages) > self.max_entries:
+                evicted_url, _ = self._pages.popitem(last=False)
+                self._url_locks.pop(evicted_url, None)
+
+    def _entry_path(self, url: str) -> Path:
+        return self.cache_dir / f"{hashlib.sha1(url.encode('utf-8')).hexdigest()}.json"
+
+    def _load_entry(self, url: str) -> Optional[Dict]:
+        if not self.cache_dir:
+            return None
+        entry_path = self._entry_path(url)
+        try:
+            with open(entry_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get("url") == url else None
+
+    def _store_entry(self, url: str, text: str, etag: Optional[str], last_modified: Optional[str]):
+        if not self.cache_dir or not (etag or last_modified):
+            return
+        entry_path = self._entry_path(url)
+        tmp_path = entry_path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"url": url, "etag": etag, "last_modified": last_modified, "body": text}, f,
+                      ensure_ascii=False)
+        os.replace(tmp_path, entry_path)
+
+    def get(self, url: str) -> str:
+        """Возвращает текст страницы, загружая ее не более одного раза за запуск"""
+        with self._url_lock(url):
+            with self._lock:
+                if url in self._pages:
+                    self.hits += 1
+                    self._pages.move_to_end(url)
+                    return self._pages[url]
+
+            entry = self._load_entry(url)
+            headers = {}
+            if entry:
+                if entry.get("etag"):
+                    headers["If-None-Match"] = entry["etag"]
+                if entry.get("last_modified"):
+                    headers["If-Modified-Since"] = entry["last_modified"]
+
+            response = self.fetch(url, headers=headers)
+            if response.status_code == 304 and entry:
+                logger.debug("Page not modified, using cached copy: %s", url)
+                self.revalidated += 1
+                text = entry["body"]
+            else:
+                response.raise_for_status()
+                self.fetched += 1
+                text = response.text
+                metrics.inc("bytes_downloaded_total", len(response.content), kind="page")
+                self._store_entry(url, text, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+
+            self._remember(url, text)
+            return text
+
+    def stats(self) -> Dict:
+        return {"hits": self.hits, "revalidated": self.revalidated, "fetched": self.fetched}
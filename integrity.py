@@ -0,0 +1,207 @@
+import argparse
+import json
+import logging
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from manifest import Manifest, describe_plugin_dir, is_current, list_files
+from plugin_tree import iter_plugin_dirs
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def _normalize_version(version: str) -> Union[Tuple[int, ...], str]:
+    """"v1.2" и "1.2.0" — одна и та же версия; нечисловые версии сравниваются строкой"""
+    version = str(version).strip().lstrip("vV")
+    try:
+        parts = [int(part) for part in version.split(".")]
+    except ValueError:
+        return version
+    while len(parts) > 1 and parts[-1] == 0:
+        parts.pop()
+    return tuple(parts)
+
+def find_problems(entry: Dict) -> List[str]:
+    """Проблемы плагина по записи манифеста: сверка .cs и README с JSON"""
+    files = entry["files"]
+    if not entry.get("id"):
+        return ["invalid_json"]
+
+    problems = []
+    if entry["is_source"] is None:
+        problems.append("missing_source")
+    elif not entry["is_source"]:
+        # HTML страница входа или заглушка вместо исходника
+        problems.append("not_source")
+    elif not entry["source_version"]:
+        problems.append("missing_info")
+    elif entry.get("latest_version") and \
+            _normalize_version(entry["source_version"]) != _normalize_version(entry["latest_version"]):
+        problems.append("version_mismatch")
+
+    if "README.md" not in files:
+        problems.append("missing_readme")
+    else:
+        # README из JSON содержит URL и версию плагина: они должны совпадать с JSON
+        other_plugin = entry["readme_url"] and not entry["readme_url"].rstrip("/").endswith(f"/plugins/{entry['id']}")
+        stale = entry["readme_version"] and entry.get("latest_version") \
+            and entry["readme_version"] != entry["latest_version"]
+        if other_plugin or stale:
+            problems.append("readme_mismatch")
+    return problems
+
+def _describe(plugin_dir: str, known: Optional[Dict], rehash: bool) -> Tuple[Dict, List[str]]:
+    return describe_plugin_dir(Path(plugin_dir), known, rehash)
+
+class IntegrityVerifier:
+    """Проверка целостности дерева плагинов по манифесту и восстановление сломанных плагинов.
+
+    Плагины, у которых набор файлов, размеры и mtime совпадают с манифестом,
+    проверяются по сохраненной записи без чтения файлов. Остальные хешируются
+    и разбираются параллельно в пуле процессов, а манифест обновляется.
+    """
+
+    def __init__(self, tree_root: str = "plugins", manifest_file: Optional[str] = None,
+                 workers: Optional[int] = None):
+        self.tree_root = Path(tree_root)
+        self.manifest = Manifest(tree_root, manifest_file)
+        self.workers = workers
+
+    def verify(self, full: bool = False, plugin_dirs: Optional[List[Path]] = None) -> Dict[str, List[str]]:
+        """Проверяет дерево (или только plugin_dirs) и возвращает проблемы по ключам манифеста.
+
+        full=True пересчитывает хеши всех файлов и сообщает о файлах, содержимое
+        которых изменилось без изменения размера и mtime (hash_mismatch).
+        """
+        start = time.monotonic()
+        scan_all = plugin_dirs is None
+        if scan_all:
+            plugin_dirs = list(iter_plugin_dirs(self.tree_root))
+
+        keys = []
+        pending = []
+        for plugin_dir in plugin_dirs:
+            key = self.manifest.key_for(plugin_dir)
+            keys.append(key)
+            if full or not is_current(self.manifest.get(key), list_files(plugin_dir)):
+                pending.append((key, plugin_dir))
+
+        corrupted: Dict[str, List[str]] = {}
+        if pending:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                results = executor.map(
+                    _describe,
+                    [str(plugin_dir) for _, plugin_dir in pending],
+                    [self.manifest.get(key) for key, _ in pending],
+                    [full] * len(pending),
+                    chunksize=16
+                )
+                for (key, _), (entry, changed) in zip(pending, results):
+                    self.manifest.set(key, entry)
+                    if changed:
+                        corrupted[key] = changed
+
+        removed = 0
+        if scan_all:
+            for key in set(self.manifest.keys()) - set(keys):
+                self.manifest.remove(key)
+                removed += 1
+        self.manifest.save()
+
+        problems = {}
+        for key in keys:
+            found = find_problems(self.manifest.get(key))
+            if key in corrupted:
+                found.append("hash_mismatch")
+            if found:
+                problems[key] = found
+
+        logger.info(f"Verified {len(keys)} plugins in {time.monotonic() - start:.2f}s "
+                    f"({len(pending)} read, {removed} removed from manifest): {len(problems)} with problems")
+        return problems
+
+    def repair(self, problems: Dict[str, List[str]], workers: int = 4, **organizer_options) -> Dict[str, List[str]]:
+        """Заново загружает сломанные плагины через PluginOrganizer.process_plugin_file.
+
+        Плагины группируются по родительской директории (букве): для каждой
+        создается органайзер, пишущий прямо в нее. Возвращает проблемы,
+        оставшиеся после повторной проверки восстановленных плагинов.
+        """
+        from organizer import PluginOrganizer
+        from rate_limiter import AdaptiveRateLimiter
+
+        by_parent: Dict[Path, List[Path]] = defaultdict(list)
+        for key, found in sorted(problems.items()):
+            if "invalid_json" in found:
+                logger.warning(f"Cannot repair {key}: its JSON is unreadable")
+                continue
+            plugin_dir = self.manifest.path_for(key)
+            by_parent[plugin_dir.parent].append(plugin_dir)
+
+        # Один ограничитель темпа на все органайзеры: 429 замедляет всех
+        organizer_options.setdefault("rate_limiter", AdaptiveRateLimiter())
+        repaired_dirs = []
+        for parent, plugin_dirs in sorted(by_parent.items()):
+            organizer = PluginOrganizer(source_dir=str(parent), output_dir=str(parent), max_workers=workers,
+                                        conditional_requests=False, manifest=self.manifest, **organizer_options)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(
+                    lambda plugin_dir: organizer.process_plugin_file(plugin_dir / f"{plugin_dir.name}.json"),
+                    plugin_dirs)
+                for plugin_dir, success in zip(plugin_dirs, results):
+                    if success:
+                        repaired_dirs.append(plugin_dir)
+                    else:
+                        logger.warning(f"Re-fetch failed for {self.manifest.key_for(plugin_dir)}")
+            organizer.storage.close()
+            organizer.blob_store.save()
+
+        remaining = self.verify(plugin_dirs=repaired_dirs) if repaired_dirs else {}
+        for key in problems:
+            if self.manifest.path_for(key) not in repaired_dirs:
+                remaining[key] = problems[key]
+        logger.info(f"Re-fetched {len(repaired_dirs)} of {len(problems)} plugins, "
+                    f"{len(remaining)} still have problems")
+        return remaining
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Verify the organized plugin tree and re-fetch broken plugins")
+    arg_parser.add_argument("--tree", default="plugins", help="organized plugin tree")
+    arg_parser.add_argument("--manifest", help="manifest file (default: <tree>/.manifest.jsonl)")
+    arg_parser.add_argument("--workers", type=int, help="number of worker processes for hashing")
+    arg_parser.add_argument("--full", action="store_true",
+                            help="rehash every file instead of trusting unchanged sizes and mtimes")
+    arg_parser.add_argument("--repair", action="store_true", help="re-fetch plugins that have problems")
+    arg_parser.add_argument("--history", default="plugin_history", metavar="DIR",
+                            help="version history directory used while re-fetching")
+    arg_parser.add_argument("--report", metavar="FILE", help="write the problems found as JSON")
+    args = arg_parser.parse_args()
+
+    verifier = IntegrityVerifier(args.tree, args.manifest, args.workers)
+    problems = verifier.verify(full=args.full)
+
+    counts = defaultdict(int)
+    for found in problems.values():
+        for problem in found:
+            counts[problem] += 1
+    for problem, count in sorted(counts.items()):
+        logger.info(f"  {problem}: {count}")
+
+    if args.repair and problems:
+        problems = verifier.repair(problems, history_dir=args.history)
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(dict(sorted(problems.items())), f, ensure_ascii=False, indent=2)
+        logger.info(f"Wrote report to {args.report}")
+
+    if problems:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
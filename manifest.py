@@ -0,0 +1,282 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from cs_metadata import looks_like_plugin_source
+from models import load_json_file
+from plugin_tree import iter_plugin_dirs
+from storage import atomic_write
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = ".manifest.jsonl"
+MANIFEST_VERSION = 1
+
+# Версия в [Info(...)] бывает и строкой, и числом без кавычек: [Info("Name", "Author", 1.2)]
+INFO_VERSION_RE = re.compile(r'\[\s*Info\s*\(\s*"(?:[^"\\]|\\.)*"\s*,\s*"(?:[^"\\]|\\.)*"\s*,\s*'
+                             r'(?:"([^"]*)"|([\d.]+))')
+README_URL_RE = re.compile(r'^Plugin URL: (\S+)', re.MULTILINE)
+README_VERSION_RE = re.compile(r'^Latest Version: (.+)$', re.MULTILINE)
+
+FileRecord = List  # [size, mtime_ns, sha256]
+
+def hash_file(path: Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def list_files(plugin_dir: Path) -> Dict[str, os.stat_result]:
+    """Файлы директории плагина (включая docs/) с их stat, по относительному пути"""
+    files = {}
+    pending = [(plugin_dir, "")]
+    while pending:
+        directory, prefix = pending.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".tmp"):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append((Path(entry.path), f"{prefix}{entry.name}/"))
+                elif entry.is_file():
+                    files[prefix + entry.name] = entry.stat()
+    return files
+
+def is_current(entry: Optional[Dict], stats: Dict[str, os.stat_result]) -> bool:
+    """Совпадают ли набор файлов, их размеры и mtime с записью манифеста (без чтения файлов)"""
+    if not entry or entry["files"].keys() != stats.keys():
+        return False
+    return all(record[0] == stats[name].st_size and record[1] == stats[name].st_mtime_ns
+               for name, record in entry["files"].items())
+
+def describe_plugin_dir(plugin_dir: Path, known: Optional[Dict] = None,
+                        rehash: bool = False) -> Tuple[Dict, List[str]]:
+    """Строит запись манифеста для директории плагина.
+
+    Хеши файлов с теми же размером и mtime, что в known, берутся из known; с
+    rehash=True они пересчитываются, и файлы, хеш которых изменился при тех же
+    размере и mtime, возвращаются вторым значением как поврежденные.
+    """
+    plugin_dir = Path(plugin_dir)
+    known_files = known["files"] if known else {}
+    files = {}
+    corrupted = []
+    for name, stat in sorted(list_files(plugin_dir).items()):
+        record = known_files.get(name)
+        unchanged = record is not None and record[0] == stat.st_size and record[1] == stat.st_mtime_ns
+        if unchanged and not rehash:
+            files[name] = record
+            continue
+        sha256 = hash_file(plugin_dir / name)
+        if unchanged and sha256 != record[2]:
+            corrupted.append(name)
+        files[name] = [stat.st_size, stat.st_mtime_ns, sha256]
+
+    entry = {"files": files, "id": None, "name": None, "latest_version": None,
+             "is_source": None, "source_version": None, "readme_url": None, "readme_version": None}
+
+    json_name = f"{plugin_dir.name}.json"
+    if json_name in files:
+        try:
+            data = load_json_file(plugin_dir / json_name)
+            entry.update(id=data.get("id"), name=data.get("name"), latest_version=data.get("latest_version"))
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    source_name = f"{plugin_dir.name}.cs"
+    if source_name in files:
+        content = (plugin_dir / source_name).read_text(encoding='utf-8', errors='ignore')
+        info = INFO_VERSION_RE.search(content)
+        entry["is_source"] = looks_like_plugin_source(content)
+        entry["source_version"] = (info.group(1) or info.group(2)) if info else None
+
+    if "README.md" in files:
+        readme = (plugin_dir / "README.md").read_text(encoding='utf-8', errors='ignore')
+        url = README_URL_RE.search(readme)
+        version = README_VERSION_RE.search(readme)
+        entry["readme_url"] = url.group(1) if url else None
+        entry["readme_version"] = version.group(1).strip() if version else None
+
+    return entry, corrupted
+
+def describe_file(path: Path, known: Optional[Dict] = None) -> Dict:
+    """Запись манифеста для отдельного JSON файла плагина (раскладка plugins_data/<slug>.json)"""
+    path = Path(path)
+    stat = path.stat()
+    record = known["files"].get(path.name) if known else None
+    if record is not None and record[0] == stat.st_size and record[1] == stat.st_mtime_ns:
+        return known
+
+    entry = {"files": {path.name: [stat.st_size, stat.st_mtime_ns, hash_file(path)]},
+             "id": None, "name": None, "latest_version": None}
+    try:
+        data = load_json_file(path)
+        entry.update(id=data.get("id"), name=data.get("name"), latest_version=data.get("latest_version"))
+    except (OSError, ValueError, AttributeError):
+        pass
+    return entry
+
+def is_file_entry(key: str, entry: Dict) -> bool:
+    return key in entry["files"]
+
+class Manifest:
+    """Манифест дерева плагинов: файлы каждого плагина с размером, mtime и SHA-256.
+
+    Записи хранятся по пути директории плагина относительно root (например,
+    "A/AFK") или по имени файла для плоской раскладки plugins_data вместе с
+    несколькими извлеченными из файлов полями (id, версии из JSON, исходника и
+    README), чтобы проверки не читали неизменные файлы.
+
+    Файл — JSONL: строка заголовка и по строке на плагин. Писатели (UmodParser,
+    PluginOrganizer) дописывают строку на каждый записанный плагин через
+    record*, а save() в конце запуска переписывает файл компактно. Читатели
+    получают список плагинов, размеры и сигнатуры одним чтением манифеста
+    вместо обхода файловой системы.
+    """
+
+    def __init__(self, root: str = "plugins", manifest_file: Optional[str] = None):
+        self.root = Path(root)
+        self.manifest_file = Path(manifest_file) if manifest_file else self.root / MANIFEST_NAME
+        self.entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._file = None
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.entries.get(key)
+
+    def keys(self) -> List[str]:
+        return list(self.entries)
+
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        return iter(list(self.entries.items()))
+
+    def key_for(self, plugin_dir: Path) -> str:
+        return Path(plugin_dir).relative_to(self.root).as_posix()
+
+    def path_for(self, key: str) -> Path:
+        return self.root / key
+
+    def plugin_dirs(self) -> List[Path]:
+        """Директории плагинов из манифеста, отсортированные по ключу"""
+        return [self.root / key for key, entry in sorted(self.entries.items()) if not is_file_entry(key, entry)]
+
+    def file_entries(self) -> List[Tuple[str, Dict]]:
+        """Записи плоской раскладки (по одному JSON файлу на плагин), отсортированные по имени"""
+        return [(key, entry) for key, entry in sorted(self.entries.items()) if is_file_entry(key, entry)]
+
+    def total_size(self) -> int:
+        return sum(record[0] for entry in self.entries.values() for record in entry["files"].values())
+
+    def signature(self, key: str) -> Optional[List[int]]:
+        """Сигнатура директории плагина в формате materialize.tree_signature: [файлы, байты, последний mtime]"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        records = entry["files"].values()
+        return [len(records), sum(record[0] for record in records), max((record[1] for record in records), default=0)]
+
+    def set(self, key: str, entry: Dict):
+        with self._lock:
+            self.entries[key] = entry
+
+    def record(self, key: str, entry: Dict):
+        """Обновляет запись и сразу дописывает ее в файл манифеста (без перезаписи всего файла)"""
+        line = json.dumps({"key": key, **entry}, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self.entries[key] = entry
+            if self._file is None:
+                new_file = not self.manifest_file.exists() or self.manifest_file.stat().st_size == 0
+                self._file = open(self.manifest_file, 'a', encoding='utf-8')
+                if new_file:
+                    self._file.write(json.dumps({"version": MANIFEST_VERSION}) + "\n")
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def record_dir(self, plugin_dir: Path) -> Dict:
+        """Записывает в манифест директорию плагина после того, как писатель ее обновил"""
+        key = self.key_for(plugin_dir)
+        entry, _ = describe_plugin_dir(plugin_dir, self.entries.get(key))
+        self.record(key, entry)
+        return entry
+
+    def record_file(self, path: Path) -> Dict:
+        """Записывает в манифест JSON файл плагина после того, как писатель его обновил"""
+        key = self.key_for(path)
+        entry = describe_file(path, self.entries.get(key))
+        self.record(key, entry)
+        return entry
+
+    def build(self):
+        """Заполняет манифест по файловой системе: директории плагинов и JSON файлы в корне"""
+        current = {}
+        for plugin_dir in iter_plugin_dirs(self.root):
+            key = self.key_for(plugin_dir)
+            current[key], _ = describe_plugin_dir(plugin_dir, self.entries.get(key))
+        for json_file in sorted(self.root.glob("*.json")):
+            current[json_file.name] = describe_file(json_file, self.entries.get(json_file.name))
+        with self._lock:
+            self.entries = current
+        logger.info(f"Indexed {len(current)} plugins into {self.manifest_file}")
+
+    def ensure_built(self):
+        """Если манифеста еще нет, один раз строит его по уже существующим файлам.
+
+        Писатели вызывают это при запуске: иначе манифест содержал бы только
+        плагины, записанные с момента его появления.
+        """
+        if not self.manifest_file.exists() and self.root.exists():
+            self.build()
+            self.save()
+
+    def remove(self, key: str):
+        with self._lock:
+            self.entries.pop(key, None)
+
+    def load(self):
+        """Читает манифест; манифест другой версии или оборванная строка игнорируются"""
+        self.entries = {}
+        if not self.manifest_file.exists():
+            return
+        with open(self.manifest_file, 'r', encoding='utf-8') as f:
+            header = f.readline()
+            try:
+                if json.loads(header).get("version") != MANIFEST_VERSION:
+                    logger.warning(f"Ignoring manifest {self.manifest_file} of another version")
+                    return
+            except ValueError:
+                return
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                key = record.pop("key")
+                if record.get("removed"):
+                    self.entries.pop(key, None)
+                else:
+                    self.entries[key] = record
+
+    def save(self):
+        """Атомарно переписывает манифест целиком, по строке на плагин в порядке ключей"""
+        with self._lock:
+            # Дописывание после замены файла должно идти уже в новый файл
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            lines = [json.dumps({"version": MANIFEST_VERSION})]
+            lines.extend(json.dumps({"key": key, **entry}, ensure_ascii=False, separators=(",", ":"))
+                         for key, entry in sorted(self.entries.items()))
+            atomic_write(self.manifest_file, ("\n".join(lines) + "\n").encode("utf-8"))
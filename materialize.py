@@ -0,0 +1,177 @@
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from manifest import list_files
+from storage import atomic_write
+
+logger = logging.getLogger(__name__)
+
+# Способы размещения директории плагина в категории
+MATERIALIZE_MODES = ("copy", "hardlink", "reflink", "symlink")
+
+# Код ioctl FICLONE в Linux (клонирование файла на btrfs/xfs без копирования данных)
+FICLONE = 0x40049409
+
+def _hardlink_file(src: str, dst: str):
+    """Создает жесткую ссылку, а если это невозможно — обычную копию"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+def _reflink_file(src: str, dst: str):
+    """Клонирует файл средствами файловой системы, а если она не умеет — копирует"""
+    try:
+        import fcntl
+        with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+        shutil.copystat(src, dst)
+    except (ImportError, OSError):
+        shutil.copy2(src, dst)
+
+def materialize_tree(src: Path, dst: Path, mode: str = "copy"):
+    """Размещает директорию src по пути dst выбранным способом"""
+    if mode == "copy":
+        shutil.copytree(src, dst)
+    elif mode == "hardlink":
+        shutil.copytree(src, dst, copy_function=_hardlink_file)
+    elif mode == "reflink":
+        shutil.copytree(src, dst, copy_function=_reflink_file)
+    elif mode == "symlink":
+        # Относительная ссылка переживает перенос всего дерева в другое место
+        dst.symlink_to(os.path.relpath(src.resolve(), dst.parent.resolve()), target_is_directory=True)
+    else:
+        raise ValueError(f"Unknown materialization mode: {mode} (expected one of {', '.join(MATERIALIZE_MODES)})")
+
+def remove_tree(path: Path):
+    """Удаляет размещенную директорию плагина (в том числе символическую ссылку)"""
+    if path.is_symlink() or path.is_file():
+        path.unlink()
+    elif path.exists():
+        shutil.rmtree(path)
+
+def tree_signature(path: Path) -> List[int]:
+    """Дешевая сигнатура содержимого директории: число файлов, общий размер и последний mtime.
+
+    Файлы перебираются так же, как для манифеста (manifest.list_files), поэтому
+    сигнатура совпадает с Manifest.signature актуальной записи.
+    """
+    stats = list_files(path).values()
+    return [len(stats), sum(stat.st_size for stat in stats), max((stat.st_mtime_ns for stat in stats), default=0)]
+
+class LayoutSync:
+    """Синхронизирует раскладку плагинов по категориям, трогая только изменившееся.
+
+    Состояние предыдущего запуска (категория, источник, способ размещения и
+    сигнатура каждого плагина) хранится в output_dir/.layout.json. Плагин
+    переразмещается, только если у него изменилась категория, способ
+    размещения или содержимое источника. Если передан манифест дерева
+    источников, сигнатуры берутся из него без обхода директорий плагинов.
+    """
+
+    def __init__(self, output_dir: Path, mode: str = "copy", manifest=None):
+        if mode not in MATERIALIZE_MODES:
+            raise ValueError(f"Unknown materialization mode: {mode} (expected one of {', '.join(MATERIALIZE_MODES)})")
+        self.output_dir = Path(output_dir)
+        self.mode = mode
+        self.state_file = self.output_dir / ".layout.json"
+        self.manifest = manifest
+        self._state: Optional[Dict[str, Dict]] = None
+
+    def _load_state(self) -> Dict[str, Dict]:
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f).get("plugins", {})
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, plugins: Dict[str, Dict]):
+        atomic_write(self.state_file, json.dumps({"plugins": plugins}, ensure_ascii=False, indent=2).encode("utf-8"))
+
+    def _signature(self, plugin_dir: Path) -> List[int]:
+        if self.manifest is not None:
+            try:
+                signature = self.manifest.signature(self.manifest.key_for(plugin_dir))
+            except ValueError:
+                signature = None
+            if signature is not None:
+                return signature
+        return tree_signature(plugin_dir)
+
+    def _place(self, name: str, category_name: str, plugin_dir: Path,
+               old_entry: Optional[Dict]) -> Tuple[Dict, bool]:
+        """Размещает плагин, если он изменился; возвращает запись состояния и признак размещения"""
+        dest_dir = self.output_dir / category_name / name
+        # Содержимое символической ссылки всегда актуально, сигнатура не нужна
+        signature = self._signature(plugin_dir) if self.mode != "symlink" else None
+        entry = {
+            "category": category_name,
+            "source": str(plugin_dir),
+            "mode": self.mode,
+            "signature": signature
+        }
+
+        if old_entry == entry and (dest_dir.exists() or dest_dir.is_symlink()):
+            return entry, False
+
+        # Плагин переехал в другую категорию или изменился
+        if old_entry:
+            remove_tree(self.output_dir / old_entry["category"] / name)
+        remove_tree(dest_dir)
+
+        dest_dir.parent.mkdir(parents=True, exist_ok=True)
+        materialize_tree(plugin_dir, dest_dir, self.mode)
+        return entry, True
+
+    def place(self, category_name: str, plugin_dir: Path) -> bool:
+        """Размещает один плагин, не трогая остальные (для потоковой обработки).
+
+        Состояние накапливается в памяти и записывается вызовом save().
+        """
+        if self._state is None:
+            self._state = self._load_state()
+        name = plugin_dir.name
+        self._state[name], placed = self._place(name, category_name, plugin_dir, self._state.get(name))
+        return placed
+
+    def save(self):
+        """Сохраняет состояние, накопленное вызовами place()"""
+        if self._state is not None:
+            self._save_state(self._state)
+
+    def sync(self, categories: Dict[str, List[Path]]) -> Dict[str, int]:
+        """Приводит output_dir к раскладке categories и возвращает статистику изменений"""
+        previous = self._load_state()
+        current = {}
+        stats = {"placed": 0, "unchanged": 0, "removed": 0}
+
+        desired = {}
+        for category_name, plugins in categories.items():
+            for plugin_dir in plugins:
+                desired[plugin_dir.name] = (category_name, plugin_dir)
+
+        # Убираем плагины, которых больше нет в раскладке
+        for name, entry in previous.items():
+            if name not in desired:
+                remove_tree(self.output_dir / entry["category"] / name)
+                stats["removed"] += 1
+
+        for name, (category_name, plugin_dir) in desired.items():
+            current[name], placed = self._place(name, category_name, plugin_dir, previous.get(name))
+            stats["placed" if placed else "unchanged"] += 1
+
+        # Удаляем опустевшие директории категорий
+        for category_name in {entry["category"] for entry in previous.values()} - set(categories):
+            category_dir = self.output_dir / category_name
+            if category_dir.is_dir() and not any(category_dir.iterdir()):
+                category_dir.rmdir()
+
+        self._save_state(current)
+        self._state = current
+        logger.info(f"Layout sync ({self.mode}): {stats['placed']} placed, "
+                     f"{stats['unchanged']} unchanged, {stats['removed']} removed")
+        return stats
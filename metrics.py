@@ -0,0 +1,193 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм по умолчанию (секунды): от быстрых ответов кэша до долгих загрузок
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _format_labels(key: LabelKey, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+class _NoopSpan:
+    """Пустой контекст для выключенных метрик: один общий экземпляр, без замеров времени"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+class _Span:
+    __slots__ = ("registry", "name", "labels", "start")
+
+    def __init__(self, registry: "MetricsRegistry", name: str, labels: Dict[str, object]):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        status = "error" if exc_type is not None else "ok"
+        self.registry.observe("span_duration_seconds", elapsed, span=self.name, status=status, **self.labels)
+        return False
+
+class MetricsRegistry:
+    """Счетчики, гистограммы и интервалы (spans) с выгрузкой в Prometheus или JSON.
+
+    Пока реестр выключен, inc/observe сразу возвращаются, а span отдает
+    общий пустой контекст — инструментирование горячих путей почти ничего
+    не стоит. Метрики идентифицируются именем и набором меток.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, List]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._help: Dict[str, str] = {}
+        self._started = time.time()
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._started = time.time()
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            bounds = self._buckets.setdefault(name, buckets)
+            series = self._histograms.setdefault(name, {})
+            # Счетчики корзин (последняя — +Inf), затем сумма и количество наблюдений
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [0] * (len(bounds) + 1) + [0.0, 0]
+            state[bisect.bisect_left(bounds, value)] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def span(self, name: str, **labels):
+        """Замеряет время блока и записывает его в гистограмму span_duration_seconds"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, name, labels)
+
+    def count_bytes(self, chunks: Iterable[bytes], name: str, **labels) -> Iterator[bytes]:
+        """Пропускает поток частей ответа, добавляя их размер к счетчику name"""
+        if not self.enabled:
+            return iter(chunks)
+        return self._count_chunks(chunks, name, labels)
+
+    def _count_chunks(self, chunks: Iterable[bytes], name: str, labels: Dict[str, object]) -> Iterator[bytes]:
+        total = 0
+        try:
+            for chunk in chunks:
+                total += len(chunk)
+                yield chunk
+        finally:
+            self.inc(name, total, **labels)
+
+    def snapshot(self) -> Dict:
+        """Текущие значения всех метрик в виде словаря (для JSON)"""
+        with self._lock:
+            counters = {
+                name: [{"labels": dict(key), "value": value} for key, value in sorted(series.items())]
+                for name, series in sorted(self._counters.items())
+            }
+            histograms = {}
+            for name, series in sorted(self._histograms.items()):
+                bounds = self._buckets[name]
+                histograms[name] = [
+                    {"labels": dict(key), "count": state[-1], "sum": round(state[-2], 6),
+                     "buckets": dict(zip([str(bound) for bound in bounds] + ["+Inf"], state[:-2]))}
+                    for key, state in sorted(series.items())
+                ]
+        return {"started_at": self._started, "uptime_seconds": round(time.time() - self._started, 3),
+                "counters": counters, "histograms": histograms}
+
+    def to_prometheus(self) -> str:
+        """Текстовый формат экспозиции Prometheus (для node_exporter textfile collector)"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+            for name, series in sorted(self._histograms.items()):
+                bounds = self._buckets[name]
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, state in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip([f"{bound:g}" for bound in bounds] + ["+Inf"], state[:-2]):
+                        cumulative += count
+                        le = f'le="{bound}"'
+                        lines.append(f"{name}_bucket{_format_labels(key, le)} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {state[-2]:.6f}")
+                    lines.append(f"{name}_count{_format_labels(key)} {state[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """Атомарно записывает метрики: .json — снимок JSON, иначе — текст Prometheus"""
+        path = Path(path)
+        data = json.dumps(self.snapshot(), indent=2) if path.suffix == ".json" else self.to_prometheus()
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        logger.info(f"Wrote metrics to {path}")
+
+# Общий реестр процесса: модули пишут в него, а CLI включает его флагом --metrics
+metrics = MetricsRegistry()
+
+metrics.describe("http_requests_total", "HTTP responses by client and status code")
+metrics.describe("http_request_duration_seconds", "HTTP request latency")
+metrics.describe("http_retries_total", "Retried HTTP requests")
+metrics.describe("http_throttled_total", "HTTP 429 responses")
+metrics.describe("http_errors_total", "Network errors and 5xx responses")
+metrics.describe("bytes_downloaded_total", "Response body bytes read")
+metrics.describe("files_written_total", "Files written to the output trees")
+metrics.describe("span_duration_seconds", "Time spent in instrumented stages")
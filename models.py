@@ -0,0 +1,196 @@
+import json
+import logging
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from storage import atomic_write
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Даты хранятся целым числом микросекунд от EPOCH (наивное время, UTC для дат с поясом)
+# и превращаются в datetime только при обращении к атрибуту
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+Timestamp = Union[datetime, int, str]
+
+def to_micros(value: Timestamp) -> int:
+    """Дата (datetime, ISO строка или уже число) в микросекунды от EPOCH"""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) // MICROSECOND
+
+def from_micros(micros: int) -> datetime:
+    return EPOCH + timedelta(microseconds=micros)
+
+def now_micros() -> int:
+    return to_micros(datetime.now())
+
+def dumps(data: Any, indent: bool = False) -> bytes:
+    """JSON в UTF-8 через orjson, если он установлен, иначе через стандартный json"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def loads(data: Union[bytes, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def load_json_file(path: Union[str, Path]) -> Any:
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+def dump_json_file(data: Any, path: Union[str, Path], indent: bool = True):
+    """Записывает JSON атомарно: прерванная запись не оставит обрезанный файл"""
+    atomic_write(path, dumps(data, indent))
+
+class PluginVersion:
+    """Версия плагина; дата выпуска хранится числом (released_at_us)"""
+    __slots__ = ("version", "released_at_us", "download_url", "changelog")
+
+    def __init__(self, version: str, released_at: Timestamp, download_url: str, changelog: Optional[str] = None):
+        self.version = version
+        self.released_at_us = to_micros(released_at)
+        self.download_url = download_url
+        self.changelog = changelog
+
+    @property
+    def released_at(self) -> datetime:
+        return from_micros(self.released_at_us)
+
+    @released_at.setter
+    def released_at(self, value: Timestamp):
+        self.released_at_us = to_micros(value)
+
+    def to_dict(self) -> Dict:
+        return {
+            "version": self.version,
+            "released_at": from_micros(self.released_at_us).isoformat(),
+            "download_url": self.download_url,
+            "changelog": self.changelog
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "PluginVersion":
+        version = cls.__new__(cls)
+        version.version = data.get("version", "")
+        version.released_at_us = _micros_or_zero(data.get("released_at"))
+        version.download_url = data.get("download_url", "")
+        version.changelog = data.get("changelog")
+        return version
+
+    def __eq__(self, other):
+        if not isinstance(other, PluginVersion):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f"PluginVersion(version={self.version!r}, released_at={self.released_at!r})"
+
+class Plugin:
+    """Запись плагина с __slots__ и датами created_at/updated_at в виде чисел.
+
+    Конструктор принимает те же аргументы, что и прежний dataclass; to_dict и
+    from_dict дают и читают ровно тот словарь, что хранится в plugins_data.
+    """
+    __slots__ = ("id", "name", "author", "description", "versions", "categories", "total_downloads",
+                 "latest_version", "created_at_us", "updated_at_us")
+
+    def __init__(self, id: str, name: str, author: str, description: str, versions: List[PluginVersion],
+                 categories: List[str], total_downloads: int, latest_version: str,
+                 created_at: Timestamp, updated_at: Timestamp):
+        self.id = id
+        self.name = name
+        self.author = author
+        self.description = description
+        self.versions = versions
+        self.categories = categories
+        self.total_downloads = total_downloads
+        self.latest_version = latest_version
+        self.created_at_us = to_micros(created_at)
+        self.updated_at_us = to_micros(updated_at)
+
+    @property
+    def created_at(self) -> datetime:
+        return from_micros(self.created_at_us)
+
+    @created_at.setter
+    def created_at(self, value: Timestamp):
+        self.created_at_us = to_micros(value)
+
+    @property
+    def updated_at(self) -> datetime:
+        return from_micros(self.updated_at_us)
+
+    @updated_at.setter
+    def updated_at(self, value: Timestamp):
+        self.updated_at_us = to_micros(value)
+
+    def to_dict(self) -> Dict:
+        """Словарь того вида, в котором плагин хранится на диске"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "author": self.author,
+            "description": self.description,
+            "categories": self.categories,
+            "total_downloads": self.total_downloads,
+            "latest_version": self.latest_version,
+            "created_at": from_micros(self.created_at_us).isoformat(),
+            "updated_at": from_micros(self.updated_at_us).isoformat(),
+            "versions": [version.to_dict() for version in self.versions]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Plugin":
+        plugin = cls.__new__(cls)
+        plugin.id = data["id"]
+        plugin.name = data.get("name", "")
+        # Авторы и категории повторяются у сотен плагинов: одна строка на значение
+        plugin.author = sys.intern(data.get("author") or "")
+        plugin.description = data.get("description", "")
+        plugin.versions = [PluginVersion.from_dict(version) for version in data.get("versions") or ()]
+        plugin.categories = [sys.intern(category) for category in data.get("categories") or ()]
+        plugin.total_downloads = data.get("total_downloads", 0)
+        plugin.latest_version = data.get("latest_version", "")
+        plugin.created_at_us = _micros_or_zero(data.get("created_at"))
+        plugin.updated_at_us = _micros_or_zero(data.get("updated_at"))
+        return plugin
+
+    def __eq__(self, other):
+        if not isinstance(other, Plugin):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f"Plugin(id={self.id!r}, name={self.name!r}, latest_version={self.latest_version!r})"
+
+def _micros_or_zero(value: Optional[str]) -> int:
+    try:
+        return to_micros(value)
+    except (TypeError, ValueError, AttributeError):
+        return 0
+
+def load_plugins(source_dir: str = "plugins_data") -> List[Plugin]:
+    """Загружает все записи <slug>.json из source_dir в модели Plugin"""
+    plugins = []
+    for json_file in sorted(Path(source_dir).glob("*.json")):
+        try:
+            plugins.append(Plugin.from_dict(load_json_file(json_file)))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Cannot load {json_file}: {e}")
+    return plugins
@@ -0,0 +1,253 @@
+import argparse
+import json
+import logging
+import os
+import re
+import time
+import zlib
+from array import array
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from cs_metadata import looks_like_plugin_source
+from plugin_tree import iter_plugin_dirs, load_plugin_json, plugin_source
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SIGNATURE_VERSION = 1
+# Сигнатура из NUM_BINS значений; LSH делит ее на BANDS полос по ROWS значений.
+# Порог срабатывания полос ~ (1 / BANDS) ** (1 / ROWS) ≈ 0.42, точная оценка делается после
+NUM_BINS = 128
+BANDS = 32
+ROWS = NUM_BINS // BANDS
+SHINGLE_SIZE = 5
+VALUE_BITS = 57
+VALUE_MASK = (1 << VALUE_BITS) - 1
+# Хеш кортежа целых детерминирован, но может отличаться между версиями Python:
+# контрольное значение в файле сигнатур позволяет заметить это и пересчитать их
+HASH_CHECK = hash((1, 2, 3, 4, 5)) & 0xFFFFFFFFFFFFFFFF
+
+COMMENT_RE = re.compile(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+TOKEN_RE = re.compile(r'\w+|[^\w\s]')
+
+def tokenize(content: str) -> List[str]:
+    """Токены C# исходника без комментариев и пробелов: форматирование не влияет на сходство"""
+    return TOKEN_RE.findall(COMMENT_RE.sub(" ", content))
+
+def minhash_signature(tokens: List[str]) -> Optional[array]:
+    """MinHash сигнатура множества шинглов по схеме one-permutation hashing.
+
+    Каждый шингл хешируется один раз: младшие биты хеша выбирают корзину,
+    остальные — значение, в корзине остается минимум. Пустые корзины
+    заполняются значением ближайшей непустой справа со смещением (densification).
+    """
+    if len(tokens) < SHINGLE_SIZE:
+        return None
+    vocabulary: Dict[str, int] = {}
+    ids = [vocabulary.setdefault(token, zlib.crc32(token.encode("utf-8"))) for token in tokens]
+    shingles = set(map(hash, zip(*(ids[i:] for i in range(SHINGLE_SIZE)))))
+
+    bins = [-1] * NUM_BINS
+    for value in shingles:
+        value &= 0xFFFFFFFFFFFFFFFF
+        slot = value % NUM_BINS
+        value = (value // NUM_BINS) & VALUE_MASK
+        if bins[slot] < 0 or value < bins[slot]:
+            bins[slot] = value
+
+    signature = array('Q', bytes(8 * NUM_BINS))
+    for slot in range(NUM_BINS):
+        if bins[slot] < 0:
+            for distance in range(1, NUM_BINS):
+                borrowed = bins[(slot + distance) % NUM_BINS]
+                if borrowed >= 0:
+                    signature[slot] = (distance << VALUE_BITS) | borrowed
+                    break
+        else:
+            signature[slot] = bins[slot]
+    return signature
+
+def similarity(first: array, second: array) -> float:
+    """Оценка коэффициента Жаккара по доле совпавших корзин"""
+    return sum(1 for a, b in zip(first, second) if a == b) / NUM_BINS
+
+def _signature_file(path: str) -> Tuple[int, Optional[str]]:
+    """Читает исходник и считает его сигнатуру (в пуле процессов); HTML и заглушки пропускаются"""
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        content = f.read()
+    if not looks_like_plugin_source(content):
+        return 0, None
+    tokens = tokenize(content)
+    signature = minhash_signature(tokens)
+    return len(tokens), signature.tobytes().hex() if signature is not None else None
+
+class SignatureIndex:
+    """Сохраненные MinHash сигнатуры исходников плагинов и поиск похожих через LSH.
+
+    Сигнатура пересчитывается только для файлов с изменившимися размером или
+    mtime; кандидаты в дубликаты находятся по совпадению полос сигнатуры,
+    без попарного сравнения всех файлов.
+    """
+
+    def __init__(self, index_file: str = "minhash_signatures.json"):
+        self.index_file = Path(index_file)
+        self.plugins: Dict[str, Dict] = {}
+        if self.index_file.exists():
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == SIGNATURE_VERSION and data.get("hash_check") == HASH_CHECK:
+                self.plugins = data.get("plugins", {})
+        self._signatures: Dict[str, array] = {}
+
+    def signature(self, slug: str) -> Optional[array]:
+        signature = self._signatures.get(slug)
+        if signature is None:
+            entry = self.plugins.get(slug)
+            if not entry or not entry["signature"]:
+                return None
+            signature = array('Q')
+            signature.frombytes(bytes.fromhex(entry["signature"]))
+            self._signatures[slug] = signature
+        return signature
+
+    def update(self, tree_root: str = "plugins", workers: Optional[int] = None) -> Dict[str, int]:
+        """Пересчитывает сигнатуры новых и измененных исходников параллельно"""
+        start = time.monotonic()
+        previous = self.plugins
+        current: Dict[str, Dict] = {}
+        pending: List[Tuple[str, Path, os.stat_result]] = []
+
+        for plugin_dir in iter_plugin_dirs(tree_root):
+            source = plugin_source(plugin_dir)
+            data = load_plugin_json(plugin_dir)
+            if not source.exists() or not data or not data.get("id"):
+                continue
+            slug = data["id"]
+            stat = source.stat()
+            cached = previous.get(slug)
+            if cached and cached["path"] == str(source) and cached["size"] == stat.st_size \
+                    and cached["mtime_ns"] == stat.st_mtime_ns:
+                current[slug] = cached
+            else:
+                pending.append((slug, source, stat))
+
+        if pending:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(_signature_file, [str(source) for _, source, _ in pending], chunksize=4)
+                for (slug, source, stat), (tokens, signature) in zip(pending, results):
+                    current[slug] = {
+                        "path": str(source),
+                        "size": stat.st_size,
+                        "mtime_ns": stat.st_mtime_ns,
+                        "tokens": tokens,
+                        "signature": signature
+                    }
+                    self._signatures.pop(slug, None)
+
+        self.plugins = dict(sorted(current.items()))
+        self.save()
+
+        stats = {"plugins": len(self.plugins), "hashed": len(pending),
+                 "removed": len(set(previous) - set(current))}
+        logger.info(f"Signatures updated in {time.monotonic() - start:.2f}s: {stats}")
+        return stats
+
+    def save(self):
+        tmp_file = self.index_file.with_name(self.index_file.name + ".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"version": SIGNATURE_VERSION, "hash_check": HASH_CHECK, "plugins": self.plugins},
+                      f, separators=(",", ":"))
+        os.replace(tmp_file, self.index_file)
+
+    def candidate_pairs(self) -> List[Tuple[str, str]]:
+        """Пары плагинов, у которых совпала хотя бы одна полоса сигнатуры"""
+        pairs = set()
+        for band in range(BANDS):
+            buckets = defaultdict(list)
+            for slug in self.plugins:
+                signature = self.signature(slug)
+                if signature is not None:
+                    buckets[tuple(signature[band * ROWS:(band + 1) * ROWS])].append(slug)
+            for members in buckets.values():
+                for i, first in enumerate(members):
+                    for second in members[i + 1:]:
+                        pairs.add((first, second))
+        return sorted(pairs)
+
+    def similar_pairs(self, threshold: float = 0.7) -> List[Tuple[str, str, float]]:
+        """Пары с оценкой сходства не ниже threshold, от самых похожих"""
+        result = []
+        for first, second in self.candidate_pairs():
+            score = similarity(self.signature(first), self.signature(second))
+            if score >= threshold:
+                result.append((first, second, score))
+        return sorted(result, key=lambda item: (-item[2], item[0], item[1]))
+
+    def similar_to(self, slug: str, threshold: float = 0.5) -> List[Tuple[str, float]]:
+        """Плагины, похожие на данный (сравнение со всеми сигнатурами, без LSH)"""
+        target = self.signature(slug)
+        if target is None:
+            return []
+        result = []
+        for other in self.plugins:
+            signature = self.signature(other)
+            if other != slug and signature is not None:
+                score = similarity(target, signature)
+                if score >= threshold:
+                    result.append((other, score))
+        return sorted(result, key=lambda item: (-item[1], item[0]))
+
+    def clusters(self, threshold: float = 0.7) -> List[Dict]:
+        """Группы похожих плагинов (связные компоненты графа похожих пар)"""
+        parent: Dict[str, str] = {}
+
+        def find(slug: str) -> str:
+            while parent.setdefault(slug, slug) != slug:
+                parent[slug] = parent[parent[slug]]
+                slug = parent[slug]
+            return slug
+
+        pairs = self.similar_pairs(threshold)
+        for first, second, _ in pairs:
+            parent[find(first)] = find(second)
+
+        groups = defaultdict(lambda: {"members": set(), "scores": []})
+        for first, second, score in pairs:
+            group = groups[find(first)]
+            group["members"].update((first, second))
+            group["scores"].append(score)
+
+        result = [
+            {"members": sorted(group["members"]), "max_similarity": max(group["scores"]),
+             "min_similarity": min(group["scores"])}
+            for group in groups.values()
+        ]
+        return sorted(result, key=lambda cluster: (-len(cluster["members"]), cluster["members"]))
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Find near-duplicate and forked plugin sources")
+    arg_parser.add_argument("--tree", default="plugins", help="organized plugin tree")
+    arg_parser.add_argument("--index", default="minhash_signatures.json", help="signature file")
+    arg_parser.add_argument("--workers", type=int, help="number of worker processes")
+    arg_parser.add_argument("--threshold", type=float, default=0.7, help="minimum estimated Jaccard similarity")
+    arg_parser.add_argument("--similar-to", metavar="SLUG", help="list plugins similar to this one")
+    args = arg_parser.parse_args()
+
+    index = SignatureIndex(args.index)
+    index.update(args.tree, args.workers)
+
+    if args.similar_to:
+        for slug, score in index.similar_to(args.similar_to, args.threshold):
+            print(f"{score:.2f}  {slug}")
+        return
+
+    for cluster in index.clusters(args.threshold):
+        print(f"{len(cluster['members']):>3} plugins, similarity {cluster['min_similarity']:.2f}-"
+              f"{cluster['max_similarity']:.2f}: {', '.join(cluster['members'])}")
+
+if __name__ == "__main__":
+    main()
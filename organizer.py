@@ -1,131 +1,447 @@
 import os
 import json
+import argparse
+import hashlib
 import requests
 import time
-import random
 import logging
-import shutil
+import threading
 from pathlib import Path
+from urllib.parse import urlparse
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, List, Optional, Tuple
 import re
 
+from blob_store import BlobStore
+from cs_metadata import looks_like_plugin_source
+from dataset_store import DatasetReader
+from http_cache import PageCache
+from manifest import Manifest
+from metrics import metrics
+from models import dumps, load_json_file
+from plugin_tree import category_letter, is_lettered_tree
+from rate_limiter import AdaptiveRateLimiter, parse_retry_after
+from storage import WriteBatch, WriteJournal, atomic_copy, atomic_write
+from version_history import VersionStore
+
 # Настройка логирования
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+class CheckpointJournal:
+    """Журнал обработанных плагинов, позволяющий продолжить прерванный запуск.
+    
+    Каждая строка — JSON запись с ключом плагина (имя исходного JSON файла) и
+    версией источника (mtime файла или хеш записи датасета): если источник с
+    тех пор изменился, плагин будет обработан заново.
+    """
+    
+    def __init__(self, journal_file: Path):
+        self.journal_file = Path(journal_file)
+        self.completed: Dict[str, object] = {}
+        self._lock = threading.Lock()
+    
+    def load(self):
+        """Читает журнал; оборванная последняя строка после сбоя пропускается"""
+        if not self.journal_file.exists():
+            return
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self.completed[entry["key"]] = entry["version"]
+        logger.info(f"Loaded {len(self.completed)} completed plugins from {self.journal_file}")
+    
+    def reset(self):
+        """Очищает журнал для запуска с нуля"""
+        with self._lock:
+            self.completed.clear()
+            if self.journal_file.exists():
+                self.journal_file.unlink()
+    
+    def is_done(self, key: str, version) -> bool:
+        return key in self.completed and self.completed[key] == version
+    
+    def mark_done(self, key: str, version):
+        """Дописывает запись в журнал сразу, чтобы она пережила аварийное завершение"""
+        with self._lock:
+            self.completed[key] = version
+            with open(self.journal_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({"key": key, "version": version}) + "\n")
+
+class ProgressReporter:
+    """Отчет о прогрессе с пропускной способностью и оценкой оставшегося времени"""
+    
+    def __init__(self, total: int):
+        self.total = total
+        self.processed = 0
+        self.failed = 0
+        self.start_time = time.monotonic()
+    
+    def update(self, success: bool) -> str:
+        if success:
+            self.processed += 1
+        else:
+            self.failed += 1
+        
+        done = self.processed + self.failed
+        elapsed = time.monotonic() - self.start_time
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - done) / rate if rate > 0 else 0.0
+        
+        return (f"Progress: {done}/{self.total} ({self.processed} successful, {self.failed} failed), "
+                f"{rate:.2f} plugins/s, ETA {eta:.0f}s")
+
 class PluginOrganizer:
     """Класс для организации плагинов в новую структуру"""
     
-    def __init__(self, source_dir: str = "plugins_data", output_dir: str = "plugins", max_workers: int = 3):
+    BASE_URL = "https://umod.org"
+    
+    def __init__(self, source_dir: str = "plugins_data", output_dir: str = "plugins", max_workers: int = 3,
+                 rate_limiter: Optional[AdaptiveRateLimiter] = None, max_retries: int = 3,
+                 per_host_limit: int = 2, journal_file: Optional[str] = None,
+                 http_cache_dir: Optional[str] = None, blob_dir: str = "plugin_blobs",
+                 dataset_file: Optional[str] = None, history_dir: Optional[str] = "plugin_history",
+                 base_url: str = BASE_URL, session: Optional[requests.Session] = None,
+                 durable_writes: bool = True, conditional_requests: bool = True,
+                 manifest: Optional[Manifest] = None):
         self.source_dir = Path(source_dir)
+        # Если задан единый JSONL датасет, плагины читаются из него, а не из source_dir
+        self.dataset_file = dataset_file
         self.output_dir = Path(output_dir)
         self.max_workers = max_workers
         
+        # Темп запросов подстраивается под ответы сервера; ограничитель можно
+        # разделить с UmodParser, чтобы 429 замедлял всех сразу
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        self.max_retries = max_retries
+        
+        # Ограничение одновременных запросов к одному хосту
+        self.per_host_limit = per_host_limit
+        self._host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_semaphores_lock = threading.Lock()
+        
         # Создаем основную директорию
         self.output_dir.mkdir(parents=True, exist_ok=True)
         logger.info(f"Created output directory: {os.path.abspath(self.output_dir)}")
         
+        # Базовый URL и сессию можно подменить, например, mock-сервером или воспроизведением фикстур
+        self.base_url = base_url.rstrip("/")
+        
         # Настройка сессии запросов
-        self.session = requests.Session()
+        self.session = session or requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'text/plain,application/json,text/html',
             'Accept-Language': 'en-US,en;q=0.9',
-            'Referer': 'https://umod.org/plugins',
+            'Referer': f'{self.base_url}/plugins',
             'Cache-Control': 'no-cache'
         })
+        # Пул соединений должен вмещать всех воркеров
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(10, max_workers))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        
+        # Страница плагина нужна нескольким методам — загружаем ее один раз,
+        # а при заданном http_cache_dir повторные запуски используют условные запросы
+        self.page_cache = PageCache(self._get, http_cache_dir)
+        
+        # Исходники хранятся по хешу содержимого, а в дереве плагинов — ссылки на них
+        self.blob_store = BlobStore(blob_dir)
+        # Без условных запросов исходники загружаются заново, даже если сервер считает их
+        # неизменными (нужно для восстановления плагинов с испорченными блобами)
+        self.conditional_requests = conditional_requests
+        
+        # Старые версии хранятся дельтами в истории версий, а не полными копиями
+        self.history = VersionStore(history_dir) if history_dir else None
+        
+        # Журнал для продолжения прерванного запуска
+        self.journal = CheckpointJournal(journal_file or self.output_dir / ".organize_journal.jsonl")
+        
+        # Файлы плагина (JSON, исходник, README) записываются одним пакетом через журнал записи:
+        # прерванная обработка не оставит полузаписанных или затертых файлов
+        self.storage = WriteJournal(self.output_dir / ".write_journal.jsonl", durable=durable_writes)
+        
+        # Манифест выходного дерева обновляется после каждого записанного плагина; его можно
+        # передать снаружи, если output_dir — лишь часть дерева (например, одна буква)
+        self.manifest = manifest or Manifest(self.output_dir)
+        self.manifest.ensure_built()
+        
+        # Плагины пишутся в раскладке уже существующего дерева (<Letter>/<Name>/ или <Name>/):
+        # иначе один плагин оказался бы в дереве дважды под разными ключами манифеста
+        self.lettered = is_lettered_tree(self.output_dir)
+    
+    def _rebase_url(self, url: str) -> str:
+        """Переносит абсолютный URL umod.org из данных плагина на заданный base_url"""
+        if self.base_url != self.BASE_URL and url.startswith(self.BASE_URL):
+            return self.base_url + url[len(self.BASE_URL):]
+        return url
+    
+    def _host_semaphore(self, url: str) -> threading.BoundedSemaphore:
+        """Возвращает семафор, ограничивающий число одновременных запросов к хосту url"""
+        host = urlparse(url).netloc
+        with self._host_semaphores_lock:
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_semaphores[host]
+    
+    def _get(self, url: str, **kwargs) -> requests.Response:
+        """Выполняет GET запрос через общий ограничитель темпа с повторами при 429"""
+        for attempt in range(self.max_retries):
+            if attempt:
+                metrics.inc("http_retries_total", client="organizer")
+            self.rate_limiter.acquire()
+            
+            try:
+                start = time.monotonic()
+                with self._host_semaphore(url):
+                    response = self.session.get(url, **kwargs)
+            except requests.exceptions.RequestException:
+                self.rate_limiter.on_error()
+                metrics.inc("http_errors_total", client="organizer", kind="network")
+                if attempt == self.max_retries - 1:
+                    raise
+                continue
+            
+            latency = time.monotonic() - start
+            metrics.observe("http_request_duration_seconds", latency, client="organizer")
+            metrics.inc("http_requests_total", client="organizer", status=response.status_code)
+            
+            if response.status_code == 429:
+                response.close()
+                metrics.inc("http_throttled_total", client="organizer")
+                wait_time = self.rate_limiter.on_throttle(parse_retry_after(response.headers.get("Retry-After")))
+                logger.warning(f"Rate limit hit, slowing down to {self.rate_limiter.current_rate:.2f} req/s "
+                               f"and waiting {wait_time:.2f} seconds before retry")
+                continue
+            
+            if response.status_code >= 500:
+                self.rate_limiter.on_error()
+                metrics.inc("http_errors_total", client="organizer", kind="server")
+            else:
+                self.rate_limiter.on_success(latency)
+            return response
+        
+        raise requests.exceptions.RetryError(f"Max retries exceeded for {url}")
     
-    def organize_plugins(self, limit: Optional[int] = None):
-        """Организует все плагины из source_dir в output_dir"""
-        # Получаем список JSON файлов
-        json_files = list(self.source_dir.glob("*.json"))
+    def _list_sources(self) -> List[Tuple[str, object, object]]:
+        """Список источников для обработки: (ключ, версия, Path JSON файла или запись датасета)"""
+        if self.dataset_file:
+            # Весь каталог читается одним чтением вместо открытия тысячи файлов
+            with DatasetReader(self.dataset_file) as reader:
+                records = reader.load_all()
+            return [
+                (f"{record['id']}.json",
+                 hashlib.sha1(json.dumps(record, sort_keys=True).encode("utf-8")).hexdigest(),
+                 record)
+                for record in records
+            ]
+        
+        # Список файлов берется из директории: файлы, записанные в обход манифеста (вручную,
+        # старыми запусками), тоже обрабатываются. Манифест plugins_data (его ведет UmodParser)
+        # избавляет от stat для уже известных ему файлов
+        known = dict(Manifest(self.source_dir).file_entries())
+        sources = []
+        unknown = 0
+        for json_file in sorted(self.source_dir.glob("*.json")):
+            entry = known.get(json_file.name)
+            if entry is not None:
+                version = entry["files"][json_file.name][1]
+            else:
+                version = json_file.stat().st_mtime_ns
+                unknown += 1
+            sources.append((json_file.name, version, json_file))
+        if known and unknown:
+            logger.warning(f"{unknown} source files are missing from the {self.source_dir} manifest")
+        return sources
+    
+    def organize_plugins(self, limit: Optional[int] = None, resume: bool = True):
+        """Организует все плагины из source_dir (или dataset_file) в output_dir.
+        
+        Плагины обрабатываются параллельно в max_workers потоках. Уже обработанные
+        (по журналу) плагины пропускаются, если resume=True.
+        """
+        # Получаем список JSON файлов или записей датасета
+        sources = self._list_sources()
         
         if limit:
-            json_files = json_files[:limit]
-            
-        total_files = len(json_files)
+            sources = sources[:limit]
+        
+        if resume:
+            self.journal.load()
+            pending_sources = [source for source in sources if not self.journal.is_done(source[0], source[1])]
+            if len(pending_sources) < len(sources):
+                logger.info(f"Resuming: skipping {len(sources) - len(pending_sources)} already organized plugins")
+            sources = pending_sources
+        else:
+            self.journal.reset()
+            
+        total_files = len(sources)
         logger.info(f"Found {total_files} plugin JSON files to organize")
         
-        # Обрабатываем файлы с помощью ThreadPoolExecutor
-        processed_count = 0
-        failed_count = 0
+        progress = ProgressReporter(total_files)
         
-        # Обрабатываем файлы последовательно для избежания rate limit
-        for json_file in json_files:
-            try:
-                success = self.process_plugin_file(json_file)
-                if success:
-                    processed_count += 1
+        # Обрабатываем файлы с помощью ThreadPoolExecutor; темп запросов
+        # и нагрузку на каждый хост ограничивают rate_limiter и per_host_limit
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            future_to_source = {}
+            for key, version, source in sources:
+                if isinstance(source, Path):
+                    future = executor.submit(self.process_plugin_file, source)
                 else:
-                    failed_count += 1
-            except Exception as e:
-                logger.error(f"Error processing {json_file.name}: {e}")
-                failed_count += 1
-            
-            # Выводим прогресс
-            logger.info(f"Progress: {processed_count + failed_count}/{total_files} ({processed_count} successful, {failed_count} failed)")
-            
-            # Добавляем задержку между обработкой плагинов
-            time.sleep(random.uniform(0.5, 2.0))
+                    future = executor.submit(self.process_plugin_data, source)
+                future_to_source[future] = (key, version)
+            
+            for future in as_completed(future_to_source):
+                key, version = future_to_source[future]
+                try:
+                    success = future.result()
+                except Exception as e:
+                    logger.error(f"Error processing {key}: {e}")
+                    success = False
+                
+                if success:
+                    self.journal.mark_done(key, version)
+                
+                # Выводим прогресс
+                status = progress.update(success)
+                logger.info("%s, %.2f req/s", status, self.rate_limiter.current_rate)
+                
+                # Периодически сохраняем индекс блобов, чтобы сбой не обнулил его
+                if success and progress.processed % 50 == 0:
+                    self.blob_store.save()
         
-        logger.info(f"Completed organizing {processed_count} plugins with {failed_count} failures")
+        self.storage.close()
+        self.blob_store.save()
+        self.manifest.save()
+        logger.info(f"Completed organizing {progress.processed} plugins with {progress.failed} failures")
+        logger.info(f"Rate limiter: {self.rate_limiter.stats()}")
+        logger.info(f"Page cache: {self.page_cache.stats()}")
     
     def process_plugin_file(self, json_file: Path) -> bool:
         """Обрабатывает один JSON файл с данными плагина"""
         try:
             # Загружаем JSON
-            with open(json_file, 'r', encoding='utf-8') as f:
-                plugin_data = json.load(f)
-            
-            plugin_id = plugin_data.get("id")
-            plugin_name = plugin_data.get("name")
-            
-            if not plugin_id or not plugin_name:
-                logger.error(f"Missing ID or name in {json_file.name}")
-                return False
-            
-            # Безопасное имя директории
-            safe_name = self.get_safe_directory_name(plugin_name)
-            
-            # Создаем директорию для плагина
-            plugin_dir = self.output_dir / safe_name
-            plugin_dir.mkdir(exist_ok=True)
-            
-            # Сохраняем JSON файл
-            json_target = plugin_dir / f"{safe_name}.json"
-            shutil.copy2(json_file, json_target)
-            
-            # Получаем URL страницы плагина
-            plugin_url = plugin_data.get("url", f"https://umod.org/plugins/{plugin_id}")
-            
-            # Загружаем .cs файл
-            cs_file_url, cs_filename = self.get_plugin_download_url(plugin_data, plugin_url)
-            cs_target_path = plugin_dir / f"{safe_name}.cs"
-            
-            if cs_file_url:
-                self.download_plugin_code(cs_file_url, cs_target_path)
-            
-            # Попытка загрузить README и другие документы
-            readme_created = self.try_get_documentation(plugin_url, plugin_dir)
-            
-            # Если не удалось создать README из страницы, создаем из JSON
-            if not (plugin_dir / "README.md").exists():
-                self.create_readme_from_json(plugin_data, plugin_dir)
-            
-            # Создаем директорию для старых версий
-            old_versions_dir = plugin_dir / "oldVersions"
-            old_versions_dir.mkdir(exist_ok=True)
-            
-            # Пытаемся найти старые версии
-            self.try_get_old_versions(plugin_url, plugin_data, old_versions_dir, safe_name)
-            
-            logger.info(f"Successfully organized plugin: {plugin_name}")
+            plugin_data = load_json_file(json_file)
+        except Exception as e:
+            logger.error(f"Error organizing plugin from {json_file.name}: {e}")
+            return False
+        
+        return self.process_plugin_data(plugin_data, json_file)
+    
+    def process_plugin_data(self, plugin_data: Dict, source_file: Optional[Path] = None) -> bool:
+        """Обрабатывает данные одного плагина (из JSON файла source_file или записи датасета)"""
+        source_name = source_file.name if source_file else f"{plugin_data.get('id')}.json"
+        plugin_dir = None
+        try:
+            with metrics.span("process_plugin"), self.storage.batch() as write_batch:
+                with metrics.span("prepare"):
+                    plugin_dir = self.prepare_plugin_dir(plugin_data, source_file, write_batch)
+                if plugin_dir is None:
+                    logger.error(f"Missing ID or name in {source_name}")
+                    return False
+                
+                with metrics.span("fetch_code"):
+                    if not self.fetch_plugin_code(plugin_data, plugin_dir, write_batch):
+                        # Исключение откатывает пакет: плагин не считается обработанным и будет загружен снова
+                        raise RuntimeError(f"Failed to fetch plugin code for {plugin_data['name']}")
+                with metrics.span("fetch_docs"):
+                    self.fetch_plugin_docs(plugin_data, plugin_dir, write_batch)
+            self.manifest.record_dir(plugin_dir)
+            
+            logger.info("Successfully organized plugin: %s", plugin_data['name'])
             return True
             
         except Exception as e:
-            logger.error(f"Error organizing plugin from {json_file.name}: {e}")
+            logger.error(f"Error organizing plugin from {source_name}: {e}")
+            if plugin_dir is not None:
+                # Директория, созданная для откаченного пакета, не должна остаться пустой
+                try:
+                    plugin_dir.rmdir()
+                except OSError:
+                    pass
+            return False
+    
+    def _write_file(self, path: Path, data: bytes, write_batch: Optional[WriteBatch] = None):
+        """Записывает файл в составе пакета write_batch или, без пакета, атомарно сам по себе"""
+        if write_batch is not None:
+            write_batch.write(path, data)
+        else:
+            atomic_write(path, data)
+    
+    def _after_commit(self, write_batch: Optional[WriteBatch], callback):
+        """Вызывает callback после коммита write_batch (при откате — никогда), а без пакета — сразу"""
+        if write_batch is not None:
+            write_batch.after_commit(callback)
+        else:
+            callback()
+    
+    def prepare_plugin_dir(self, plugin_data: Dict, source_file: Optional[Path] = None,
+                           write_batch: Optional[WriteBatch] = None) -> Optional[Path]:
+        """Создает директорию плагина и сохраняет в нее JSON; None, если в данных нет ID или имени"""
+        if not plugin_data.get("id") or not plugin_data.get("name"):
+            return None
+        
+        # Безопасное имя директории
+        safe_name = self.get_safe_directory_name(plugin_data["name"])
+        
+        # Создаем директорию для плагина
+        if self.lettered:
+            plugin_dir = self.output_dir / category_letter(safe_name) / safe_name
+        else:
+            plugin_dir = self.output_dir / safe_name
+        plugin_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Сохраняем JSON файл
+        json_target = plugin_dir / f"{safe_name}.json"
+        if source_file and write_batch is not None:
+            write_batch.copy(source_file, json_target)
+        elif source_file:
+            atomic_copy(source_file, json_target)
+        else:
+            self._write_file(json_target, dumps(plugin_data, indent=True), write_batch)
+        metrics.inc("files_written_total", kind="json")
+        return plugin_dir
+    
+    def _plugin_url(self, plugin_data: Dict) -> str:
+        """URL страницы плагина"""
+        return self._rebase_url(plugin_data.get("url", f"{self.base_url}/plugins/{plugin_data['id']}"))
+    
+    def fetch_plugin_code(self, plugin_data: Dict, plugin_dir: Path, write_batch: Optional[WriteBatch] = None) -> bool:
+        """Загружает .cs файл плагина в его директорию и добавляет текущую версию в историю"""
+        cs_file_url, cs_filename = self.get_plugin_download_url(plugin_data, self._plugin_url(plugin_data))
+        cs_target_path = plugin_dir / f"{plugin_dir.name}.cs"
+        
+        if not cs_file_url or not self.download_plugin_code(cs_file_url, cs_target_path, write_batch):
             return False
+        
+        # Если загруженное содержимое отвергнуто и остался прежний исходник, история не меняется
+        if self.history and (write_batch is None or cs_target_path in write_batch):
+            # Текущая версия тоже попадает в историю: от нее строятся дельты старых
+            latest = (plugin_data.get("versions") or [{}])[0]
+            version = plugin_data.get("latest_version") or latest.get("version", "unknown")
+            code_path = write_batch.staged_path(cs_target_path) if write_batch is not None else cs_target_path
+            content = code_path.read_bytes()
+            # История пополняется только версией, которая действительно оказалась в дереве
+            self._after_commit(write_batch, lambda: self.history.add_version(
+                plugin_data["id"], version, content, latest.get("released_at")))
+        return True
+    
+    def fetch_plugin_docs(self, plugin_data: Dict, plugin_dir: Path, write_batch: Optional[WriteBatch] = None):
+        """Загружает README (со страницы плагина или из JSON) и старые версии"""
+        # Попытка загрузить README и другие документы
+        self.try_get_documentation(self._plugin_url(plugin_data), plugin_dir, write_batch)
+        
+        # Если не удалось создать README из страницы, создаем из JSON
+        readme_path = plugin_dir / "README.md"
+        if not readme_path.exists() and (write_batch is None or readme_path not in write_batch):
+            self.create_readme_from_json(plugin_data, plugin_dir, write_batch)
+        
+        # Пытаемся найти старые версии
+        if self.history:
+            self.try_get_old_versions(plugin_data["id"], plugin_data, write_batch)
     
     def get_safe_directory_name(self, name: str) -> str:
         """Преобразует имя плагина в безопасное имя директории"""
@@ -146,17 +462,13 @@ class PluginOrganizer:
         # Формируем URL по шаблону
         if plugin_id:
             # Пытаемся использовать прямой URL для загрузки .cs файла
-            download_url = f"https://umod.org/plugins/{plugin_id}.cs"
+            download_url = f"{self.base_url}/plugins/{plugin_id}.cs"
             filename = f"{plugin_id}.cs"
         
         # Если не можем использовать прямой URL, пытаемся извлечь из страницы
         if not download_url or not plugin_id:
             try:
-                time.sleep(random.uniform(1, 3))
-                response = self.session.get(plugin_url)
-                response.raise_for_status()
-                
-                html_content = response.text
+                html_content = self.page_cache.get(plugin_url)
                 
                 # Ищем ссылку на загрузку
                 download_pattern = r'href="([^"]+\.cs)"'
@@ -165,7 +477,7 @@ class PluginOrganizer:
                 if matches:
                     for match in matches:
                         if "download" in match or "plugins" in match:
-                            download_url = match if match.startswith('http') else f"https://umod.org{match}"
+                            download_url = match if match.startswith('http') else f"{self.base_url}{match}"
                             filename = download_url.split('/')[-1]
                             break
             except Exception as e:
@@ -173,63 +485,94 @@ class PluginOrganizer:
         
         # Если все еще нет URL, используем стандартный формат с именем плагина
         if not download_url and plugin_name:
-            download_url = f"https://umod.org/plugins/{plugin_name.replace(' ', '-').lower()}.cs"
+            download_url = f"{self.base_url}/plugins/{plugin_name.replace(' ', '-').lower()}.cs"
             filename = f"{plugin_name}.cs"
         
         # Логируем URL, который будем использовать
-        logger.debug(f"Using download URL: {download_url}")
+        logger.debug("Using download URL: %s", download_url)
         
         return download_url, filename
     
-    def download_plugin_code(self, url: str, target_path: Path) -> bool:
-        """Загружает исходный код плагина"""
+    def download_plugin_code(self, url: str, target_path: Path, write_batch: Optional[WriteBatch] = None) -> bool:
+        """Загружает исходный код плагина в хранилище блобов и связывает его с target_path.
+        
+        Неудачная загрузка никогда не заменяет уже сохраненный исходник. Содержимое,
+        не похожее на C# (HTML страница, заглушка), не записывается: если хороший
+        исходник уже есть, он остается на месте и загрузка считается успешной,
+        иначе возвращается False.
+        """
         try:
-            # Добавляем случайную задержку для избежания блокировки
-            time.sleep(random.uniform(1, 3))
+            logger.debug("Downloading plugin code from %s", url)
             
-            logger.debug(f"Downloading plugin code from {url}")
+            # Если файл уже загружался, просим сервер прислать его только при изменении
+            remote = self.blob_store.get_remote(url) if self.conditional_requests else None
+            headers = {}
+            if remote and remote.get("etag"):
+                headers["If-None-Match"] = remote["etag"]
+            if remote and remote.get("last_modified"):
+                headers["If-Modified-Since"] = remote["last_modified"]
             
             # Используем stream=True для постепенной загрузки
-            with self.session.get(url, stream=True) as response:
-                response.raise_for_status()
-                
-                # Открываем файл в бинарном режиме для записи
-                with open(target_path, 'wb') as f:
-                    # Загружаем и записываем данные частями
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:  # фильтруем keep-alive новые куски
-                            f.write(chunk)
-            
-            # Теперь проверяем содержимое файла
-            with open(target_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
+            with self._get(url, stream=True, headers=headers) as response:
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+                content_length = response.headers.get("Content-Length")
+                content_length = int(content_length) if content_length and content_length.isdigit() else None
                 
-                # Проверяем, что содержимое похоже на C# код
-                if "using " in content and ("class " in content or "namespace " in content):
-                    logger.info(f"Downloaded plugin code to {target_path} ({target_path.stat().st_size} bytes)")
-                    return True
+                if remote and (response.status_code == 304 or self._is_unchanged(remote, etag, last_modified, content_length)):
+                    # Содержимое не изменилось — тело не читаем, используем сохраненный блоб
+                    sha256 = remote["sha256"]
+                    logger.debug("Plugin code not modified, reusing blob %.12s: %s", sha256, url)
                 else:
-                    logger.warning(f"Downloaded content doesn't look like C# code, saving anyway: {url}")
-                    return False
+                    response.raise_for_status()
+                    
+                    # Загружаем данные частями прямо в хранилище, попутно считая хеш
+                    sha256 = self.blob_store.put_stream(
+                        metrics.count_bytes(response.iter_content(chunk_size=8192), "bytes_downloaded_total", kind="code"))
+                    self.blob_store.set_remote(url, sha256, etag, last_modified, content_length)
+            
+            # Проверяем содержимое до записи: похоже ли оно на C# код, а не на HTML страницу
+            blob_path = self.blob_store.path_for(sha256)
+            is_source = looks_like_plugin_source(blob_path.read_text(encoding='utf-8', errors='ignore'))
+            if not is_source:
+                if target_path.exists() and looks_like_plugin_source(
+                        target_path.read_text(encoding='utf-8', errors='ignore')):
+                    # JSON и README плагина обновляются, исходник остается прежним
+                    logger.warning(f"Downloaded content doesn't look like C# code, keeping existing file: {url}")
+                    return True
+                logger.warning(f"Downloaded content doesn't look like C# code, skipping: {url}")
+                return False
+            
+            # Одинаковые файлы хранятся один раз
+            if write_batch is not None:
+                write_batch.link(blob_path, target_path)
+            else:
+                self.blob_store.link(sha256, target_path)
+            metrics.inc("files_written_total", kind="code")
+            
+            logger.info("Downloaded plugin code to %s", target_path)
+            return True
                     
         except Exception as e:
+            # Ничего не записываем: уже сохраненный исходник остается на месте,
+            # а незавершенная загрузка не попадает в хранилище блобов
             logger.error(f"Failed to download plugin code from {url}: {e}")
-            # Создаем пустой файл, чтобы отметить, что мы пытались
-            with open(target_path, 'w', encoding='utf-8') as f:
-                f.write(f"// Failed to download plugin code: {str(e)}")
             return False
     
-    def try_get_documentation(self, plugin_url: str, plugin_dir: Path) -> bool:
+    def _is_unchanged(self, remote: Dict, etag: Optional[str], last_modified: Optional[str],
+                      content_length: Optional[int]) -> bool:
+        """Проверяет по заголовкам ответа 200, что файл совпадает с уже сохраненным блобом"""
+        if etag:
+            return etag == remote.get("etag")
+        return (last_modified is not None and content_length is not None
+                and last_modified == remote.get("last_modified")
+                and content_length == remote.get("content_length"))
+    
+    def try_get_documentation(self, plugin_url: str, plugin_dir: Path, write_batch: Optional[WriteBatch] = None) -> bool:
         """Пытается получить README и другую документацию"""
         try:
-            # Добавляем случайную задержку
-            time.sleep(random.uniform(1, 3))
-            
-            logger.debug(f"Checking for documentation at {plugin_url}")
-            response = self.session.get(plugin_url)
-            response.raise_for_status()
-            
-            html_content = response.text
+            logger.debug("Checking for documentation at %s", plugin_url)
+            html_content = self.page_cache.get(plugin_url)
             
             # Ищем ссылки на документацию
             readme_pattern = r'href="([^"]+(?:README|readme)\.md)"'
@@ -240,8 +583,8 @@ class PluginOrganizer:
             
             # Загружаем README если нашли
             for url in readme_matches:
-                full_url = url if url.startswith('http') else f"https://umod.org{url}"
-                self.download_documentation(full_url, plugin_dir / "README.md")
+                full_url = url if url.startswith('http') else f"{self.base_url}{url}"
+                self.download_documentation(full_url, plugin_dir / "README.md", write_batch)
                 break
             
             # Создаем документацию если есть
@@ -250,20 +593,21 @@ class PluginOrganizer:
                 docs_dir.mkdir(exist_ok=True)
                 
                 for i, url in enumerate(docs_matches[:5]):  # Ограничиваем количество
-                    full_url = url if url.startswith('http') else f"https://umod.org{url}"
+                    full_url = url if url.startswith('http') else f"{self.base_url}{url}"
                     filename = url.split('/')[-1]
-                    self.download_documentation(full_url, docs_dir / filename)
+                    self.download_documentation(full_url, docs_dir / filename, write_batch)
             
             # Ищем информацию о плагине на странице и создаем README если не нашли
             if not readme_matches:
-                self.create_readme_from_page(html_content, plugin_dir, plugin_url)
+                self.create_readme_from_page(html_content, plugin_dir, plugin_url, write_batch)
             
             return True
         except Exception as e:
             logger.error(f"Failed to check for documentation at {plugin_url}: {e}")
             return False
     
-    def create_readme_from_page(self, html_content: str, plugin_dir: Path, plugin_url: str):
+    def create_readme_from_page(self, html_content: str, plugin_dir: Path, plugin_url: str,
+                                write_batch: Optional[WriteBatch] = None):
         """Создает README.md из информации на странице плагина"""
         try:
             # Ищем описание плагина
@@ -277,20 +621,23 @@ class PluginOrganizer:
             if title_match or description_match:
                 readme_path = plugin_dir / "README.md"
                 
-                with open(readme_path, 'w', encoding='utf-8') as f:
-                    if title_match:
-                        f.write(f"# {title_match.group(1).strip()}\n\n")
-                    
-                    f.write(f"Plugin URL: {plugin_url}\n\n")
-                    
-                    if description_match:
-                        # Очищаем HTML теги
-                        description = re.sub(r'<[^>]+>', '', description_match.group(1))
-                        description = description.strip()
-                        f.write("## Description\n\n")
-                        f.write(f"{description}\n")
+                parts = []
+                if title_match:
+                    parts.append(f"# {title_match.group(1).strip()}\n\n")
+                
+                parts.append(f"Plugin URL: {plugin_url}\n\n")
                 
-                logger.info(f"Created README.md from page information")
+                if description_match:
+                    # Очищаем HTML теги
+                    description = re.sub(r'<[^>]+>', '', description_match.group(1))
+                    description = description.strip()
+                    parts.append("## Description\n\n")
+                    parts.append(f"{description}\n")
+                
+                self._write_file(readme_path, "".join(parts).encode("utf-8"), write_batch)
+                
+                metrics.inc("files_written_total", kind="readme")
+                logger.info("Created README.md from page information")
                 return True
             
             return False
@@ -298,66 +645,74 @@ class PluginOrganizer:
             logger.error(f"Failed to create README from page: {e}")
             return False
     
-    def try_get_old_versions(self, plugin_url: str, plugin_data: Dict, old_versions_dir: Path, plugin_name: str):
-        """Пытается получить старые версии плагина"""
+    def try_get_old_versions(self, plugin_id: str, plugin_data: Dict,
+                             write_batch: Optional[WriteBatch] = None) -> bool:
+        """Загружает старые версии плагина и добавляет их в историю версий после коммита write_batch"""
         try:
             # Получаем информацию о версиях
             versions = plugin_data.get("versions", [])
             if not versions or len(versions) <= 1:
                 return False
             
-            # Пропускаем первую версию (она уже загружена как текущая)
-            for i, version_info in enumerate(versions[1:], 1):
+            # Пропускаем первую версию (она уже загружена как текущая), а версии,
+            # которые политика хранения все равно удалит, не загружаем
+            keep_last = self.history.policy(plugin_id).get("keep_last")
+            old_versions = versions[1:keep_last] if keep_last else versions[1:]
+            
+            downloaded = []
+            for version_info in old_versions:
                 version = version_info.get("version")
-                if not version:
-                    continue
-                
-                download_url = version_info.get("download_url")
-                if not download_url:
+                download_url = self._rebase_url(version_info.get("download_url") or "")
+                if not version or not download_url or self.history.has_version(plugin_id, version):
                     continue
                 
-                # Создаем имя файла для версии
-                version_filename = f"{plugin_name}_v{version}.cs"
-                version_path = old_versions_dir / version_filename
-                
-                # Загружаем версию
-                self.download_plugin_code(download_url, version_path)
+                with self._get(download_url) as response:
+                    response.raise_for_status()
+                    content = response.content
                 
-                # Ограничиваем количество старых версий
-                if i >= 5:  # Ограничиваем 5 старыми версиями
-                    break
+                if not looks_like_plugin_source(content.decode("utf-8", errors="ignore")):
+                    logger.warning(f"Old version {version} of {plugin_id} doesn't look like C# code, skipping")
+                    continue
+                downloaded.append((version, content, version_info.get("released_at")))
+            
+            def record():
+                try:
+                    for version, content, released_at in downloaded:
+                        self.history.add_version(plugin_id, version, content, released_at)
+                    self.history.apply_retention(plugin_id)
+                except Exception as e:
+                    logger.error(f"Failed to record old versions of {plugin_id}: {e}")
             
+            self._after_commit(write_batch, record)
             return True
         except Exception as e:
             logger.error(f"Failed to get old versions: {e}")
             return False
     
-    def download_documentation(self, url: str, target_path: Path) -> bool:
+    def download_documentation(self, url: str, target_path: Path, write_batch: Optional[WriteBatch] = None) -> bool:
         """Загружает документацию"""
         try:
-            # Добавляем случайную задержку
-            time.sleep(random.uniform(1, 3))
-            
-            logger.debug(f"Downloading documentation from {url}")
+            logger.debug("Downloading documentation from %s", url)
             
             # Используем stream=True для постепенной загрузки
-            with self.session.get(url, stream=True) as response:
+            with self._get(url, stream=True) as response:
                 response.raise_for_status()
                 
-                # Открываем файл в бинарном режиме для записи
-                with open(target_path, 'wb') as f:
-                    # Загружаем и записываем данные частями
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:  # фильтруем keep-alive новые куски
-                            f.write(chunk)
-            
-            logger.info(f"Downloaded documentation to {target_path} ({target_path.stat().st_size} bytes)")
+                # Документы небольшие: собираем ответ целиком, чтобы оборванная
+                # загрузка не затерла уже сохраненный файл
+                content = b"".join(metrics.count_bytes(response.iter_content(chunk_size=8192),
+                                                       "bytes_downloaded_total", kind="docs"))
+            
+            self._write_file(target_path, content, write_batch)
+            
+            metrics.inc("files_written_total", kind="docs")
+            logger.info("Downloaded documentation to %s", target_path)
             return True
         except Exception as e:
             logger.error(f"Failed to download documentation from {url}: {e}")
             return False
     
-    def create_readme_from_json(self, plugin_data: Dict, plugin_dir: Path):
+    def create_readme_from_json(self, plugin_data: Dict, plugin_dir: Path, write_batch: Optional[WriteBatch] = None):
         """Создает README.md на основе данных из JSON файла плагина"""
         try:
             readme_path = plugin_dir / "README.md"
@@ -379,44 +734,66 @@ class PluginOrganizer:
             plugin_id = plugin_data.get("id", "")
             url = plugin_data.get("url", "")
             if not url and plugin_id:
-                url = f"https://umod.org/plugins/{plugin_id}"
+                url = f"{self.base_url}/plugins/{plugin_id}"
             
             # Получаем информацию о версиях
             latest_version = plugin_data.get("latest_version", "")
             
-            with open(readme_path, 'w', encoding='utf-8') as f:
-                f.write(f"# {name}\n\n")
-                
-                if url:
-                    f.write(f"Plugin URL: {url}\n\n")
-                
-                f.write(f"Author: {author}\n\n")
-                
-                if latest_version:
-                    f.write(f"Latest Version: {latest_version}\n\n")
-                
-                if categories and len(categories) > 0:
-                    f.write("Categories: " + ", ".join(categories) + "\n\n")
-                
-                if description:
-                    f.write("## Description\n\n")
-                    f.write(f"{description}\n")
+            parts = [f"# {name}\n\n"]
             
-            logger.info(f"Created README.md from JSON data")
+            if url:
+                parts.append(f"Plugin URL: {url}\n\n")
+            
+            parts.append(f"Author: {author}\n\n")
+            
+            if latest_version:
+                parts.append(f"Latest Version: {latest_version}\n\n")
+            
+            if categories and len(categories) > 0:
+                parts.append("Categories: " + ", ".join(categories) + "\n\n")
+            
+            if description:
+                parts.append("## Description\n\n")
+                parts.append(f"{description}\n")
+            
+            self._write_file(readme_path, "".join(parts).encode("utf-8"), write_batch)
+            
+            metrics.inc("files_written_total", kind="readme")
+            logger.info("Created README.md from JSON data")
             return True
         except Exception as e:
             logger.error(f"Failed to create README from JSON: {e}")
             return False
 
 def main():
+    arg_parser = argparse.ArgumentParser(description="Organize parsed plugins into the plugins/ tree")
+    arg_parser.add_argument("--workers", type=int, default=8, help="number of worker threads")
+    arg_parser.add_argument("--fresh", action="store_true", help="ignore the checkpoint journal and start over")
+    arg_parser.add_argument("--http-cache", metavar="DIR", help="directory for the conditional-request page cache")
+    arg_parser.add_argument("--history", default="plugin_history", metavar="DIR",
+                            help="version history directory for old plugin versions")
+    arg_parser.add_argument("--dataset", metavar="FILE", help="read plugins from a consolidated JSONL dataset")
+    arg_parser.add_argument("--prune-blobs", action="store_true",
+                            help="after organizing, delete stored blobs no longer used by the tree or the URL index")
+    arg_parser.add_argument("--metrics", metavar="FILE",
+                            help="collect metrics and write them here (.json snapshot or Prometheus text)")
+    args = arg_parser.parse_args()
+    metrics.enabled = bool(args.metrics)
+    
     # Создаем экземпляр класса и запускаем организацию плагинов
-    organizer = PluginOrganizer(max_workers=3)
+    organizer = PluginOrganizer(max_workers=args.workers, http_cache_dir=args.http_cache, dataset_file=args.dataset,
+                                history_dir=args.history)
     
     try:
         # Обрабатываем все плагины (без ограничения)
-        organizer.organize_plugins()
+        organizer.organize_plugins(resume=not args.fresh)
+        if args.prune_blobs:
+            organizer.blob_store.prune()
     except Exception as e:
         logger.error(f"Error during organization: {e}")
+    finally:
+        if args.metrics:
+            metrics.write(args.metrics)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
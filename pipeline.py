@@ -0,0 +1,278 @@
+import argparse
+import logging
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from materialize import MATERIALIZE_MODES, LayoutSync
+from metrics import metrics
+from organizer import PluginOrganizer
+from plugin_tree import category_letter
+from rate_limiter import AdaptiveRateLimiter
+from umod_parser import UmodParser
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Маркер конца потока: каждый воркер возвращает его во входную очередь для соседей,
+# последний завершившийся воркер стадии передает его следующей стадии
+_DONE = object()
+
+class Stage:
+    """Стадия конвейера: пул потоков между двумя ограниченными очередями.
+
+    Функция стадии получает элемент и возвращает его (дополненным) для
+    следующей стадии или None, если элемент дальше не идет. Полная выходная
+    очередь блокирует воркеров — так давление передается вверх по конвейеру.
+    """
+
+    def __init__(self, name: str, func: Callable[[Dict], Optional[Dict]], workers: int,
+                 inbox: queue.Queue, outbox: Optional[queue.Queue]):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.inbox = inbox
+        self.outbox = outbox
+        self.processed = 0
+        self.failed = 0
+        self._active = workers
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self):
+        while True:
+            item = self.inbox.get()
+            if item is _DONE:
+                self.inbox.put(_DONE)
+                break
+            try:
+                result = self.func(item)
+            except Exception as e:
+                logger.error(f"Stage {self.name} failed on {item.get('slug')}: {e}", exc_info=True)
+                result = None
+            with self._lock:
+                if result is None:
+                    self.failed += 1
+                else:
+                    self.processed += 1
+            if result is not None and self.outbox is not None:
+                self.outbox.put(result)
+
+        with self._lock:
+            self._active -= 1
+            last = self._active == 0
+        if last and self.outbox is not None:
+            self.outbox.put(_DONE)
+
+class StreamingPipeline:
+    """Обход uMod, загрузка плагинов и размещение по категориям за один проход.
+
+    Каждая запись из поисковой выдачи проходит стадии parse -> download ->
+    docs -> place через ограниченные очереди, не дожидаясь окончания обхода.
+    Промежуточные проходы по plugins_data/ и plugins/ не нужны: организатор
+    получает запись из памяти, а категория плагина известна сразу (первая
+    буква имени, как в AlphabeticalCategorizer).
+    """
+
+    def __init__(self, parser: UmodParser, organizer: PluginOrganizer, layout: Optional[LayoutSync] = None,
+                 queue_size: int = 32, parse_workers: int = 2, download_workers: int = 8,
+                 docs_workers: int = 4, save_every: int = 50, metrics_file: Optional[str] = None):
+        self.parser = parser
+        self.organizer = organizer
+        self.layout = layout
+        self.queue_size = queue_size
+        self.parse_workers = parse_workers
+        self.download_workers = download_workers
+        self.docs_workers = docs_workers
+        self.save_every = save_every
+        # Файл метрик переписывается на каждом сохранении состояния: длинный обход виден по ходу работы
+        self.metrics_file = metrics_file
+        self.plugins = []
+        self.first_placed_after: Optional[float] = None
+        self._start = 0.0
+
+    def _parse(self, item: Dict) -> Optional[Dict]:
+        with metrics.span("parse"):
+            plugin = self.parser._process_plugin(item["raw"])
+        # Несохраненный плагин дальше не идет: стадия засчитает его как ошибку
+        if plugin is None or not self.parser._save_plugin_data(plugin):
+            return None
+        item["plugin"] = plugin
+        item["record"] = plugin.to_dict()
+        return item
+
+    def _abort(self, write_batch, plugin_dir: Optional[Path]):
+        """Откатывает файлы плагина; созданная для него директория не должна остаться пустой"""
+        write_batch.rollback()
+        if plugin_dir is not None:
+            try:
+                plugin_dir.rmdir()
+            except OSError:
+                pass
+
+    def _download(self, item: Dict) -> Optional[Dict]:
+        # Файлы плагина (JSON, исходник, README) пишутся одним пакетом через журнал записи,
+        # как в PluginOrganizer.process_plugin_data: пакет открывается здесь, а принимается в _docs
+        write_batch = self.organizer.storage.batch()
+        plugin_dir = None
+        try:
+            with metrics.span("prepare"):
+                plugin_dir = self.organizer.prepare_plugin_dir(item["record"], write_batch=write_batch)
+            if plugin_dir is None:
+                self._abort(write_batch, None)
+                return None
+            with metrics.span("fetch_code"):
+                if not self.organizer.fetch_plugin_code(item["record"], plugin_dir, write_batch):
+                    # Без исходника плагин не размещается, а состояние обхода для него не продвигается
+                    self._abort(write_batch, plugin_dir)
+                    return None
+        except BaseException:
+            self._abort(write_batch, plugin_dir)
+            raise
+        item["plugin_dir"] = plugin_dir
+        item["batch"] = write_batch
+        return item
+
+    def _docs(self, item: Dict) -> Optional[Dict]:
+        write_batch = item.pop("batch")
+        try:
+            with metrics.span("fetch_docs"):
+                self.organizer.fetch_plugin_docs(item["record"], item["plugin_dir"], write_batch)
+            write_batch.commit()
+        except BaseException:
+            self._abort(write_batch, item["plugin_dir"])
+            raise
+        # Плагин записан полностью — манифест дерева узнает о нем до размещения по категориям
+        self.organizer.manifest.record_dir(item["plugin_dir"])
+        return item
+
+    def _place(self, item: Dict) -> Optional[Dict]:
+        plugin_dir = item["plugin_dir"]
+        if self.layout is not None:
+            with metrics.span("place"):
+                self.layout.place(category_letter(plugin_dir.name), plugin_dir)
+
+        # Состояние обхода обновляется только для прошедших весь конвейер плагинов,
+        # чтобы прерванный запуск повторил остальные
+        if self.parser.crawl_state is not None:
+            self.parser.crawl_state.update(item["raw"])
+        self.plugins.append(item["plugin"])
+
+        if self.first_placed_after is None:
+            self.first_placed_after = time.monotonic() - self._start
+            logger.info(f"First plugin organized {self.first_placed_after:.2f}s after the crawl started")
+        if len(self.plugins) % self.save_every == 0:
+            self._checkpoint()
+        return item
+
+    def _checkpoint(self):
+        """Периодически сохраняет состояние, чтобы сбой не потерял уже сделанную работу"""
+        self.organizer.storage.checkpoint()
+        if self.parser.crawl_state is not None:
+            self.parser.crawl_state.save()
+        if self.layout is not None:
+            self.layout.save()
+        if self.parser.manifest is not None:
+            self.parser.manifest.save()
+        self.organizer.manifest.save()
+        self.organizer.blob_store.save()
+        if self.metrics_file:
+            metrics.write(self.metrics_file)
+
+    def run(self, incremental: bool = False, limit: Optional[int] = None) -> Dict[str, Dict[str, int]]:
+        """Запускает конвейер и ждет, пока все записи пройдут все стадии"""
+        self._start = time.monotonic()
+        self.plugins = []
+        self.first_placed_after = None
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(4)]
+        stages = [
+            Stage("parse", self._parse, self.parse_workers, queues[0], queues[1]),
+            Stage("download", self._download, self.download_workers, queues[1], queues[2]),
+            Stage("docs", self._docs, self.docs_workers, queues[2], queues[3]),
+            # Размещение и учет состояния — в одном потоке, без блокировок
+            Stage("place", self._place, 1, queues[3], None),
+        ]
+        for stage in stages:
+            stage.start()
+
+        crawled = 0
+        try:
+            for page_data in self.parser.iter_search_pages(incremental):
+                for raw in page_data:
+                    if limit is not None and crawled >= limit:
+                        break
+                    # put блокируется, пока parse не освободит место: обход не убегает вперед
+                    queues[0].put({"slug": raw.get("slug"), "raw": raw})
+                    crawled += 1
+                if limit is not None and crawled >= limit:
+                    break
+        finally:
+            queues[0].put(_DONE)
+            for stage in stages:
+                stage.join()
+
+        self._checkpoint()
+        self.organizer.storage.close()
+        self.parser._save_dataset(self.plugins)
+
+        elapsed = time.monotonic() - self._start
+        stats = {stage.name: {"processed": stage.processed, "failed": stage.failed} for stage in stages}
+        logger.info(f"Pipeline finished in {elapsed:.1f}s: crawled {crawled}, organized {len(self.plugins)} "
+                    f"({len(self.plugins) / elapsed if elapsed else 0:.2f} plugins/s), stages: {stats}")
+        logger.info(f"Rate limiter: {self.organizer.rate_limiter.stats()}")
+        return stats
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Crawl, organize and categorize plugins in one streaming pass")
+    arg_parser.add_argument("--incremental", action="store_true", help="only process plugins changed since the last run")
+    arg_parser.add_argument("--max-pages", type=int, default=100000, help="maximum number of search pages")
+    arg_parser.add_argument("--limit", type=int, help="stop after this many plugins")
+    arg_parser.add_argument("--workers", type=int, default=8, help="download worker threads")
+    arg_parser.add_argument("--docs-workers", type=int, default=4, help="documentation worker threads")
+    arg_parser.add_argument("--queue-size", type=int, default=32, help="capacity of each inter-stage queue")
+    arg_parser.add_argument("--data-dir", default="plugins_data", help="directory for per-plugin JSON files")
+    arg_parser.add_argument("--no-per-file", action="store_true", help="do not write per-plugin JSON files")
+    arg_parser.add_argument("--dataset", metavar="FILE", help="maintain a consolidated JSONL dataset")
+    arg_parser.add_argument("--output", default="plugins", help="organized plugin directory")
+    arg_parser.add_argument("--categorized", default="alpha_plugins", help="alphabetical category directory")
+    arg_parser.add_argument("--no-categorize", action="store_true", help="skip category placement")
+    arg_parser.add_argument("--mode", default="hardlink", choices=MATERIALIZE_MODES,
+                            help="how plugins are placed into categories")
+    arg_parser.add_argument("--http-cache", metavar="DIR", help="directory for the conditional-request page cache")
+    arg_parser.add_argument("--history", default="plugin_history", metavar="DIR", help="version history directory")
+    arg_parser.add_argument("--metrics", metavar="FILE",
+                            help="collect metrics and write them here (.json snapshot or Prometheus text)")
+    args = arg_parser.parse_args()
+    metrics.enabled = bool(args.metrics)
+
+    # Обход и загрузка ходят на один сервер, поэтому делят один ограничитель темпа
+    rate_limiter = AdaptiveRateLimiter()
+    parser = UmodParser(output_dir=args.data_dir, max_pages=args.max_pages, rate_limiter=rate_limiter,
+                        dataset_file=args.dataset, write_per_file=not args.no_per_file)
+    organizer = PluginOrganizer(source_dir=args.data_dir, output_dir=args.output, max_workers=args.workers,
+                                rate_limiter=rate_limiter, http_cache_dir=args.http_cache, history_dir=args.history)
+    layout = None
+    if not args.no_categorize:
+        Path(args.categorized).mkdir(parents=True, exist_ok=True)
+        layout = LayoutSync(args.categorized, args.mode, manifest=organizer.manifest)
+
+    pipeline = StreamingPipeline(parser, organizer, layout, queue_size=args.queue_size,
+                                 download_workers=args.workers, docs_workers=args.docs_workers,
+                                 metrics_file=args.metrics)
+    pipeline.run(incremental=args.incremental, limit=args.limit)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def is_plugin_dir(path: Path) -> bool:
+    """Директория плагина содержит <Name>.json с тем же именем, что и сама директория"""
+    return path.is_dir() and (path / f"{path.name}.json").exists()
+
+
+def iter_plugin_dirs(root: str = "plugins") -> Iterator[Path]:
+    """Перебирает директории плагинов в раскладках <root>/<Name>/ и <root>/<Letter>/<Name>/"""
+    root = Path(root)
+    if not root.exists():
+        return
+    for entry in sorted(root.iterdir()):
+        if not entry.is_dir():
+            continue
+        if is_plugin_dir(entry):
+            yield entry
+            continue
+        # Директория категории (буквы) — плагины на уровень ниже
+        for sub_entry in sorted(entry.iterdir()):
+            if is_plugin_dir(sub_entry):
+                yield sub_entry
+
+
+def category_letter(name: str) -> str:
+    """Буква категории плагина в раскладке <root>/<Letter>/<Name>/"""
+    return name[0].upper()
+
+
+def is_lettered_tree(root: str = "plugins") -> bool:
+    """Разложено ли дерево по буквам; пустое дерево считается плоским"""
+    first = next(iter_plugin_dirs(root), None)
+    return first is not None and first.parent != Path(root)
+
+
+def load_plugin_json(plugin_dir: Path) -> Optional[Dict]:
+    """Читает <Name>.json директории плагина, None если файл поврежден"""
+    json_file = plugin_dir / f"{plugin_dir.name}.json"
+    try:
+        with open(json_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Cannot read {json_file}: {e}")
+        return None
+
+
+def plugin_source(plugin_dir: Path) -> Path:
+    """Путь к основному .cs файлу плагина"""
+    return plugin_dir / f"{plugin_dir.name}.cs"
@@ -0,0 +1,151 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """Потокобезопасный token bucket: rate запросов в секунду с запасом до capacity"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity is not None else max(1.0, self.rate)
+
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        """Пополняет запас токенов за прошедшее время (вызывается под блокировкой)"""
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _reserve(self, tokens: float = 1.0) -> float:
+        """Резервирует токены и возвращает время, которое нужно подождать до их появления"""
+        with self._lock:
+            self._refill(time.monotonic())
+            # Запас может уйти в минус: так ожидающие выстраиваются в очередь,
+            # и каждый следующий ждет дольше предыдущего
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens: float = 1.0):
+        """Блокирует поток, пока не появится токен"""
+        wait_time = self._reserve(tokens)
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+    async def acquire_async(self, tokens: float = 1.0):
+        """Асинхронный вариант acquire для использования внутри event loop"""
+        wait_time = self._reserve(tokens)
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Разбирает заголовок Retry-After: число секунд или HTTP-дата"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class AdaptiveRateLimiter(TokenBucket):
+    """Общий AIMD-ограничитель темпа запросов.
+
+    Пока ответы быстрые и успешные, темп растет на increase_step за каждый ответ
+    (аддитивное увеличение). При 429 или ошибке сервера темп умножается на
+    decrease_factor (мультипликативное уменьшение), а при 429 все воркеры,
+    использующие этот экземпляр, дополнительно выдерживают паузу Retry-After.
+    """
+
+    def __init__(self, initial_rate: float = 1.0, min_rate: float = 0.1, max_rate: float = 10.0,
+                 increase_step: float = 0.05, decrease_factor: float = 0.5, slow_latency: float = 2.0,
+                 decrease_cooldown: float = 1.0, capacity: Optional[float] = None):
+        if not 0 < min_rate <= initial_rate <= max_rate:
+            raise ValueError("expected 0 < min_rate <= initial_rate <= max_rate")
+        if not 0 < decrease_factor < 1:
+            raise ValueError("decrease_factor must be between 0 and 1")
+
+        super().__init__(initial_rate, capacity)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.increase_step = float(increase_step)
+        self.decrease_factor = float(decrease_factor)
+        self.slow_latency = float(slow_latency)
+        self.decrease_cooldown = float(decrease_cooldown)
+
+        self._last_decrease = float("-inf")
+        self.successes = 0
+        self.throttles = 0
+        self.errors = 0
+
+    @property
+    def current_rate(self) -> float:
+        """Текущий разрешенный темп, запросов в секунду"""
+        return self.rate
+
+    def _decrease(self, now: float):
+        """Мультипликативно уменьшает темп (вызывается под блокировкой).
+
+        Несколько воркеров обычно получают 429 почти одновременно, поэтому
+        повторные уменьшения в пределах decrease_cooldown игнорируются.
+        """
+        if now - self._last_decrease >= self.decrease_cooldown:
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self._last_decrease = now
+
+    def on_success(self, latency: float):
+        """Учитывает успешный ответ; медленные ответы не увеличивают темп"""
+        with self._lock:
+            self.successes += 1
+            if latency <= self.slow_latency:
+                self._refill(time.monotonic())
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> float:
+        """Учитывает ответ 429 и возвращает паузу, которую выдержат все воркеры"""
+        with self._lock:
+            now = time.monotonic()
+            self.throttles += 1
+            self._refill(now)
+            self._decrease(now)
+
+            # Уводим запас в минус: следующие acquire() у всех воркеров дождутся конца паузы
+            pause = retry_after if retry_after is not None else 1.0 / self.rate
+            self._tokens = min(self._tokens, -pause * self.rate)
+            return pause
+
+    def on_error(self):
+        """Учитывает сетевую ошибку или ответ 5xx"""
+        with self._lock:
+            now = time.monotonic()
+            self.errors += 1
+            self._refill(now)
+            self._decrease(now)
+
+    def stats(self) -> Dict:
+        """Снимок состояния ограничителя для логов и отчетов"""
+        with self._lock:
+            return {
+                "rate": round(self.rate, 3),
+                "successes": self.successes,
+                "throttles": self.throttles,
+                "errors": self.errors
+            }
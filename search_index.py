@@ -0,0 +1,305 @@
+import argparse
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from materialize import tree_signature
+from plugin_tree import iter_plugin_dirs, load_plugin_json, plugin_source
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+# Вес попадания слова в поле: совпадение в названии важнее, чем в коде
+FIELD_WEIGHTS = {"name": 5, "author": 3, "categories": 2, "description": 2, "code": 1}
+
+# Параметры BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+WORD_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|[0-9]+")
+CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from in is it of on or that the this to with
+using namespace class public private protected internal static void return if else
+var new null true false string int bool float double object this base get set
+for foreach while do break continue out ref readonly const override virtual
+""".split())
+
+@lru_cache(maxsize=200000)
+def _split_identifier(word: str) -> Tuple[str, ...]:
+    """Разбивает идентификатор на термы: целиком и по частям camelCase/snake_case"""
+    terms = []
+    lower = word.lower()
+    if len(lower) > 1 and lower not in STOPWORDS:
+        terms.append(lower)
+    parts = [part.lower() for piece in word.split("_") for part in CAMEL_RE.findall(piece)]
+    if len(parts) > 1:
+        terms.extend(part for part in parts if len(part) > 1 and part not in STOPWORDS and part != lower)
+    return tuple(terms)
+
+def tokenize(text: str) -> Iterator[str]:
+    """Токенизатор для текста и кода; запрос разбирается тем же способом"""
+    for word in WORD_RE.findall(text):
+        yield from _split_identifier(word)
+
+def _count_terms(text: str, weight: int, counts: Counter):
+    # Сначала считаем одинаковые слова, затем разбиваем каждое уникальное один раз
+    for word, count in Counter(WORD_RE.findall(text)).items():
+        for term in _split_identifier(word):
+            counts[term] += count * weight
+
+def _analyze_document(plugin_dir: Optional[str], json_file: Optional[str]) -> Tuple[Dict, Dict[str, int]]:
+    """Извлекает метаданные и взвешенные частоты термов одного плагина (выполняется в пуле процессов)"""
+    data = {}
+    if json_file:
+        with open(json_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    elif plugin_dir:
+        data = load_plugin_json(Path(plugin_dir)) or {}
+
+    counts = Counter()
+    _count_terms(str(data.get("name", "")), FIELD_WEIGHTS["name"], counts)
+    _count_terms(str(data.get("author", "")), FIELD_WEIGHTS["author"], counts)
+    _count_terms(str(data.get("description", "")), FIELD_WEIGHTS["description"], counts)
+    categories = data.get("categories") or []
+    if isinstance(categories, str):
+        categories = categories.split(",")
+    _count_terms(" ".join(categories), FIELD_WEIGHTS["categories"], counts)
+
+    if plugin_dir:
+        source = plugin_source(Path(plugin_dir))
+        if source.exists():
+            with open(source, 'r', encoding='utf-8', errors='ignore') as f:
+                _count_terms(f.read(), FIELD_WEIGHTS["code"], counts)
+
+    meta = {"id": data.get("id", ""), "name": data.get("name", ""), "path": plugin_dir}
+    return meta, dict(counts)
+
+def _encode_varint(value: int, out: bytearray):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _decode_postings(data: bytes) -> Iterator[Tuple[int, int]]:
+    """Разбирает список (номер документа, tf); номера документов хранятся разностями"""
+    position = 0
+    doc = 0
+    length = len(data)
+    while position < length:
+        values = []
+        for _ in range(2):
+            value = shift = 0
+            while True:
+                byte = data[position]
+                position += 1
+                value |= (byte & 0x7F) << shift
+                if byte < 0x80:
+                    break
+                shift += 7
+            values.append(value)
+        doc += values[0]
+        yield doc, values[1]
+
+class SearchIndex:
+    """Инвертированный индекс по названию, автору, описанию, категориям и идентификаторам .cs.
+
+    Файлы индекса в index_dir:
+      postings.bin  — списки (разность номера документа, взвешенный tf) в varint
+      terms.json    — терм -> [смещение, длина в байтах, число документов]
+      docs.json     — документы (slug, название, путь, длина) в порядке номеров
+      forward.jsonl — частоты термов каждого документа с сигнатурой источника,
+                      чтобы при обновлении заново разбирать только изменившиеся плагины
+    """
+
+    def __init__(self, index_dir: str = "search_index"):
+        self.index_dir = Path(index_dir)
+        self._terms: Optional[Dict[str, List[int]]] = None
+        self._docs: Optional[List[Dict]] = None
+        self._meta: Optional[Dict] = None
+        self._postings = None
+
+    def _collect_sources(self, tree_root: str, data_dir: str) -> Dict[str, Dict]:
+        sources: Dict[str, Dict] = defaultdict(dict)
+        for plugin_dir in iter_plugin_dirs(tree_root):
+            data = load_plugin_json(plugin_dir)
+            if data and data.get("id"):
+                sources[data["id"]]["dir"] = plugin_dir
+        data_path = Path(data_dir)
+        if data_path.exists():
+            for json_file in data_path.glob("*.json"):
+                sources[json_file.stem]["json"] = json_file
+
+        for source in sources.values():
+            signature = []
+            if "dir" in source:
+                signature += tree_signature(source["dir"])
+            if "json" in source:
+                stat = source["json"].stat()
+                signature += [stat.st_size, stat.st_mtime_ns]
+            source["signature"] = signature
+        return sources
+
+    def _load_forward(self) -> Dict[str, Dict]:
+        forward = {}
+        forward_file = self.index_dir / "forward.jsonl"
+        if forward_file.exists():
+            with open(forward_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    forward[entry["key"]] = entry
+        return forward
+
+    def update(self, tree_root: str = "plugins", data_dir: str = "plugins_data",
+               workers: Optional[int] = None) -> Dict[str, int]:
+        """Обновляет индекс, заново разбирая только новые и изменившиеся плагины"""
+        start = time.monotonic()
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        sources = self._collect_sources(tree_root, data_dir)
+        forward = self._load_forward()
+
+        changed = [key for key, source in sources.items()
+                   if forward.get(key, {}).get("signature") != source["signature"]]
+        removed = len(set(forward) - set(sources))
+
+        if changed:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(
+                    _analyze_document,
+                    [str(sources[key]["dir"]) if "dir" in sources[key] else None for key in changed],
+                    [str(sources[key]["json"]) if "json" in sources[key] else None for key in changed],
+                    chunksize=16
+                )
+                for key, (meta, terms) in zip(changed, results):
+                    forward[key] = {"key": key, "signature": sources[key]["signature"], "meta": meta, "terms": terms}
+
+        forward = {key: forward[key] for key in sorted(sources)}
+        self._write(forward)
+
+        stats = {"documents": len(forward), "reindexed": len(changed), "removed": removed}
+        logger.info(f"Search index updated in {time.monotonic() - start:.2f}s: {stats}")
+        return stats
+
+    def _write(self, forward: Dict[str, Dict]):
+        """Записывает индекс целиком во временные файлы и атомарно подменяет старые"""
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        docs = []
+        for doc_number, entry in enumerate(forward.values()):
+            terms = entry["terms"]
+            docs.append({**entry["meta"], "length": sum(terms.values())})
+            for term, tf in terms.items():
+                postings[term].append((doc_number, tf))
+
+        terms_table = {}
+        data = bytearray()
+        for term in sorted(postings):
+            offset = len(data)
+            previous = 0
+            for doc_number, tf in postings[term]:
+                _encode_varint(doc_number - previous, data)
+                _encode_varint(tf, data)
+                previous = doc_number
+            terms_table[term] = [offset, len(data) - offset, len(postings[term])]
+
+        meta = {
+            "version": INDEX_VERSION,
+            "documents": len(docs),
+            "avg_length": (sum(doc["length"] for doc in docs) / len(docs)) if docs else 0.0
+        }
+
+        outputs = {
+            "postings.bin": bytes(data),
+            "terms.json": json.dumps(terms_table, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+            "docs.json": json.dumps(docs, ensure_ascii=False).encode("utf-8"),
+            "forward.jsonl": "".join(
+                json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n" for entry in forward.values()
+            ).encode("utf-8"),
+            "meta.json": json.dumps(meta, indent=2).encode("utf-8"),
+        }
+        self.close()
+        for filename, content in outputs.items():
+            tmp_path = self.index_dir / f"{filename}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, self.index_dir / filename)
+
+    def _load(self):
+        if self._terms is not None:
+            return
+        with open(self.index_dir / "meta.json", 'r', encoding='utf-8') as f:
+            self._meta = json.load(f)
+        if self._meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"Incompatible search index in {self.index_dir}, rebuild it with update()")
+        with open(self.index_dir / "terms.json", 'r', encoding='utf-8') as f:
+            self._terms = json.load(f)
+        with open(self.index_dir / "docs.json", 'r', encoding='utf-8') as f:
+            self._docs = json.load(f)
+        postings_file = self.index_dir / "postings.bin"
+        if postings_file.stat().st_size:
+            with open(postings_file, 'rb') as f:
+                self._postings = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._postings = b""
+
+    def close(self):
+        if isinstance(self._postings, mmap.mmap):
+            self._postings.close()
+        self._terms = self._docs = self._meta = self._postings = None
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """Ищет плагины по запросу и возвращает лучшие результаты по BM25"""
+        self._load()
+        doc_count = self._meta["documents"]
+        avg_length = self._meta["avg_length"] or 1.0
+
+        scores: Dict[int, float] = defaultdict(float)
+        for term in dict.fromkeys(tokenize(query)):
+            entry = self._terms.get(term)
+            if entry is None:
+                continue
+            offset, length, df = entry
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            for doc_number, tf in _decode_postings(self._postings[offset:offset + length]):
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._docs[doc_number]["length"] / avg_length)
+                scores[doc_number] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [{**self._docs[doc_number], "score": round(score, 4)} for doc_number, score in best]
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Full-text search over plugin metadata and C# sources")
+    arg_parser.add_argument("query", nargs="*", help="search terms")
+    arg_parser.add_argument("--index", default="search_index", help="index directory")
+    arg_parser.add_argument("--update", action="store_true", help="update the index before searching")
+    arg_parser.add_argument("--tree", default="plugins", help="organized plugin tree")
+    arg_parser.add_argument("--data", default="plugins_data", help="directory with per-plugin JSON files")
+    arg_parser.add_argument("--limit", type=int, default=10, help="number of results")
+    args = arg_parser.parse_args()
+
+    index = SearchIndex(args.index)
+    if args.update or not (Path(args.index) / "meta.json").exists():
+        index.update(args.tree, args.data)
+
+    if args.query:
+        start = time.monotonic()
+        results = index.search(" ".join(args.query), args.limit)
+        for result in results:
+            print(f"{result['score']:>8.3f}  {result['name']} ({result['id']})  {result['path'] or ''}")
+        logger.info(f"{len(results)} results in {(time.monotonic() - start) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
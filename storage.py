@@ -0,0 +1,341 @@
+import itertools
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+PathLike = Union[str, Path]
+
+# Для данных файла достаточно fdatasync: mtime и прочие метаданные, кроме размера, не нужны при восстановлении
+_datasync = getattr(os, "fdatasync", os.fsync)
+
+def _fsync_file(path: Path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        _datasync(fd)
+    finally:
+        os.close(fd)
+
+def _fsync_dir(path: Path):
+    """Сбрасывает на диск запись директории (переименования); там, где это невозможно, — ничего не делает"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def temp_path_for(path: Path, token: str) -> Path:
+    """Временный файл рядом с целевым (та же файловая система — rename атомарен)"""
+    return path.with_name(f"{path.name}.{token}.tmp")
+
+def atomic_write(path: PathLike, data: bytes, sync: bool = False):
+    """Записывает файл целиком или не трогает его: временный файл, затем os.replace.
+
+    sync=True дополнительно дожидается записи данных и директории на диск;
+    для множества файлов дешевле WriteBatch, синхронизирующий их разом.
+    """
+    path = Path(path)
+    tmp_path = temp_path_for(path, uuid.uuid4().hex[:12])
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+    if sync:
+        _fsync_dir(path.parent)
+
+def atomic_copy(src: PathLike, path: PathLike):
+    """Копирует файл (с метаданными, как shutil.copy2) атомарно"""
+    path = Path(path)
+    tmp_path = temp_path_for(path, uuid.uuid4().hex[:12])
+    try:
+        shutil.copy2(src, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+
+def _link_or_copy(src: Path, dst: Path):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+class WriteBatch:
+    """Группа файлов, которые появляются на своих местах вместе или не появляются вовсе.
+
+    Каждый файл сначала пишется во временный рядом с целевым. commit()
+    синхронизирует все временные файлы одним проходом, записывает в журнал
+    список переименований и только затем переименовывает; rollback() удаляет
+    временные файлы, не трогая существующие.
+    """
+
+    def __init__(self, journal: "WriteJournal", batch_id: str):
+        self.journal = journal
+        self.id = batch_id
+        self._files: Dict[Path, Path] = {}
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def __contains__(self, path: PathLike) -> bool:
+        return Path(path) in self._files
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+    def _stage(self, path: PathLike) -> Path:
+        path = Path(path)
+        tmp_path = temp_path_for(path, self.id)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"Write batch {self.id} is already closed")
+            if path not in self._files:
+                self._files[path] = tmp_path
+                self.journal._log({"batch": self.id, "stage": str(tmp_path)})
+        return tmp_path
+
+    def staged_path(self, path: PathLike) -> Path:
+        """Где сейчас лежит содержимое path: временный файл батча или сам path"""
+        path = Path(path)
+        return self._files.get(path, path)
+
+    def after_commit(self, callback: Callable[[], None]):
+        """Вызывает callback после того, как файлы батча окажутся на своих местах (при rollback — нет)"""
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def write(self, path: PathLike, data: bytes):
+        with open(self._stage(path), 'wb') as f:
+            f.write(data)
+
+    def copy(self, src: PathLike, path: PathLike):
+        shutil.copy2(src, self._stage(path))
+
+    def link(self, src: PathLike, path: PathLike):
+        """Ставит в батч жесткую ссылку на src (или копию, если ссылку создать нельзя)"""
+        tmp_path = self._stage(path)
+        if tmp_path.exists():
+            tmp_path.unlink()
+        _link_or_copy(Path(src), tmp_path)
+
+    def commit(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            files: List[Tuple[Path, Path]] = [(tmp_path, path) for path, tmp_path in self._files.items()]
+        try:
+            if files:
+                if self.journal.durable:
+                    for tmp_path, _ in files:
+                        _fsync_file(tmp_path)
+                # После этой записи батч считается принятым: восстановление доведет переименования до конца
+                self.journal._log({"batch": self.id,
+                                   "commit": [[str(tmp_path), str(path)] for tmp_path, path in files]}, sync=True)
+                for tmp_path, path in files:
+                    os.replace(tmp_path, path)
+        except BaseException:
+            # Не попавшие на место файлы убираем: без этого они пережили бы обрезку журнала
+            for tmp_path, _ in files:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+            raise
+        finally:
+            self.journal._finish(self.id, {path.parent for _, path in files})
+        for callback in self._callbacks:
+            callback()
+
+    def rollback(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            tmp_paths = list(self._files.values())
+        for tmp_path in tmp_paths:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        self.journal._finish(self.id)
+
+class WriteJournal:
+    """Журнал упреждающей записи для батчей WriteBatch.
+
+    В журнал (JSONL) пишутся временные файлы батча, затем при commit список
+    переименований. Если запуск прервался, recover() доводит до конца
+    переименования принятых батчей и удаляет временные файлы непринятых.
+
+    Синхронизация групповая: потоки, одновременно принимающие батчи, делят
+    один fsync журнала, а директории с переименованиями синхронизируются
+    подряд раз в checkpoint_every принятых батчей (следующие за первым fsync
+    директорий почти бесплатны). До этого принятые батчи остаются в журнале,
+    и восстановление может повторить их переименования. На checkpoint в
+    журнале остаются только записи еще открытых батчей; close() в конце
+    запуска удаляет его.
+    """
+
+    def __init__(self, journal_file: PathLike, durable: bool = True, checkpoint_every: int = 64):
+        self.journal_file = Path(journal_file)
+        self.durable = durable
+        self.checkpoint_every = checkpoint_every
+        # Порядок захвата: _sync_lock, затем _lock
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._open_batches: Dict[str, List[str]] = {}
+        self._dirty_dirs = set()
+        self._counter = itertools.count(1)
+        self._prefix = uuid.uuid4().hex[:8]
+        self._file = None
+        self._written = 0
+        self._synced = 0
+        self._unsynced_batches = 0
+        self.recover()
+
+    def batch(self) -> WriteBatch:
+        batch_id = f"{self._prefix}{next(self._counter)}"
+        with self._lock:
+            self._open_batches[batch_id] = []
+        return WriteBatch(self, batch_id)
+
+    def _open(self):
+        """Открывает файл журнала на дописывание; только что созданный файл фиксируется в директории"""
+        created = not self.journal_file.exists()
+        self._file = open(self.journal_file, 'a', encoding='utf-8')
+        if created and self.durable:
+            _fsync_dir(self.journal_file.parent)
+
+    def _log(self, record: Dict, sync: bool = False):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._open()
+            self._file.write(line)
+            self._file.flush()
+            self._open_batches[record["batch"]].append(line)
+            # Номера записей растут монотонно и не сбрасываются при checkpoint
+            self._written += 1
+            position = self._written
+        if sync and self.durable:
+            self._sync(position)
+
+    def _sync(self, position: int):
+        """Групповой fsync: пока один поток синхронизирует журнал, остальные ждут и
+        не повторяют fsync, если их записи уже вошли в синхронизированную часть"""
+        with self._sync_lock:
+            if self._synced >= position:
+                return
+            with self._lock:
+                covered = self._written
+                fd = self._file.fileno()
+            # checkpoint, который мог бы заменить файл, ждет освобождения _sync_lock
+            os.fsync(fd)
+            self._synced = covered
+
+    def _finish(self, batch_id: str, directories=()):
+        with self._lock:
+            self._open_batches.pop(batch_id, None)
+            if directories:
+                self._dirty_dirs.update(directories)
+                self._unsynced_batches += 1
+            due = self._unsynced_batches >= self.checkpoint_every
+        if due:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Синхронизирует директории принятых батчей и оставляет в журнале только открытые батчи"""
+        with self._sync_lock, self._lock:
+            if self.durable:
+                for directory in self._dirty_dirs:
+                    _fsync_dir(directory)
+            self._dirty_dirs.clear()
+            self._unsynced_batches = 0
+            if self._file is None:
+                return
+            if not self._open_batches:
+                self._file.truncate(0)
+            else:
+                # Записи открытых батчей переносятся в новый файл журнала, уже синхронизированный
+                self._file.close()
+                lines = [line for batch_lines in self._open_batches.values() for line in batch_lines]
+                atomic_write(self.journal_file, "".join(lines).encode("utf-8"), sync=self.durable)
+                self._file = open(self.journal_file, 'a', encoding='utf-8')
+            self._synced = self._written
+
+    def close(self):
+        """Завершает запуск: синхронизирует оставшееся и удаляет файл журнала"""
+        self.checkpoint()
+        with self._lock:
+            if self._open_batches:
+                logger.warning(f"Keeping {self.journal_file}: {len(self._open_batches)} write batches are still open")
+                return
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self.journal_file.unlink()
+
+    def recover(self) -> Dict[str, int]:
+        """Восстанавливает согласованное состояние после прерванного запуска"""
+        stats = {"rolled_forward": 0, "rolled_back": 0}
+        if not self.journal_file.exists():
+            return stats
+
+        staged: Dict[str, List[str]] = {}
+        committed: Dict[str, List[List[str]]] = {}
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Оборванная последняя строка: запись не успела попасть в журнал
+                    continue
+                batch_id = record.get("batch")
+                if "stage" in record:
+                    staged.setdefault(batch_id, []).append(record["stage"])
+                elif "commit" in record:
+                    committed[batch_id] = record["commit"]
+
+        # Временные файлы уникальны для батча: у уже переименованных их нет, и повтор ничего не меняет
+        for files in committed.values():
+            for tmp_name, name in files:
+                if os.path.exists(tmp_name):
+                    os.replace(tmp_name, name)
+                    stats["rolled_forward"] += 1
+        for batch_id, tmp_names in staged.items():
+            if batch_id in committed:
+                continue
+            for tmp_name in tmp_names:
+                if os.path.exists(tmp_name):
+                    os.unlink(tmp_name)
+                    stats["rolled_back"] += 1
+
+        self.journal_file.unlink()
+        if stats["rolled_forward"] or stats["rolled_back"]:
+            logger.warning(f"Recovered interrupted writes from {self.journal_file}: {stats}")
+        return stats
@@ -0,0 +1,80 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Модули проекта лежат в корне репозитория, а не в пакете
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+SOURCE_TEMPLATE = '''namespace Oxide.Plugins
+{
+    [Info("%s", "tester", "%s")]
+    class %s : RustPlugin
+    {
+        void OnServerInitialized() { }
+    }
+}
+'''
+
+@pytest.fixture
+def make_plugin():
+    """Создает директорию плагина <root>/<Name>/ с JSON и исходником"""
+    def make(root: Path, name: str, version: str = "1.0.0") -> Path:
+        plugin_dir = Path(root) / name
+        plugin_dir.mkdir(parents=True, exist_ok=True)
+        data = {"id": name.lower(), "name": name, "latest_version": version}
+        (plugin_dir / f"{name}.json").write_text(json.dumps(data), encoding="utf-8")
+        (plugin_dir / f"{name}.cs").write_text(SOURCE_TEMPLATE % (name, version, name), encoding="utf-8")
+        return plugin_dir
+    return make
+
+@pytest.fixture
+def fast_limiter():
+    """Ограничитель темпа без заметных пауз: тесты проверяют поведение, а не ожидание"""
+    from rate_limiter import AdaptiveRateLimiter
+    return lambda: AdaptiveRateLimiter(initial_rate=1000, min_rate=100, max_rate=1000)
+
+@pytest.fixture
+def umod_archive(tmp_path, make_plugin):
+    """Собирает архив фикстур umod.org (synthesize_archive) из дерева с плагинами names.
+
+    Исходники плагинов из broken отдаются HTML страницей вместо C# кода.
+    """
+    pytest.importorskip("requests")
+    from fixtures import FixtureArchive, synthesize_archive
+
+    def build(names, broken=()) -> "FixtureArchive":
+        tree = tmp_path / "fixture_tree"
+        for index, name in enumerate(names):
+            plugin_dir = make_plugin(tree, name)
+            json_file = plugin_dir / f"{name}.json"
+            data = json.loads(json_file.read_text(encoding="utf-8"))
+            data.update(author="tester", description=f"{name} plugin",
+                        created_at="2024-01-01T00:00:00", updated_at=f"2024-02-{index + 1:02d}T12:00:00")
+            json_file.write_text(json.dumps(data), encoding="utf-8")
+        archive_path = tmp_path / "fixtures.zip"
+        synthesize_archive(str(archive_path), str(tree))
+        archive = FixtureArchive(str(archive_path))
+        for name in broken:
+            archive.add(f"GET /plugins/{name.lower()}.cs", 200, {"Content-Type": "text/html; charset=utf-8"},
+                        b"<html><body>Please log in</body></html>")
+        return archive
+    return build
+
+@pytest.fixture
+def complete_plugins():
+    """Проверяет, что в дереве нет недописанных плагинов, и возвращает имена записанных.
+
+    Каждая директория плагина должна быть полной (JSON и исходник), а
+    временных файлов батчей остаться не должно.
+    """
+    def check(root: Path):
+        root = Path(root)
+        assert not list(root.rglob("*.tmp"))
+        for plugin_dir in root.iterdir():
+            if plugin_dir.is_dir():
+                assert (plugin_dir / f"{plugin_dir.name}.json").exists(), plugin_dir
+                assert (plugin_dir / f"{plugin_dir.name}.cs").exists(), plugin_dir
+        return sorted(plugin_dir.name for plugin_dir in root.iterdir() if plugin_dir.is_dir())
+    return check
@@ -0,0 +1,29 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from async_parser import AsyncUmodParser
+from fixtures import MockProfile, MockUmodServer
+from manifest import Manifest
+
+NAMES = ["Alpha", "Bravo", "Charlie", "Delta", "Echo", "Foxtrot", "Golf", "Hotel"]
+
+@pytest.mark.parametrize("profile", [dict(throttle_rate=0.3, retry_after=0), dict(error_rate=0.2)])
+def test_async_crawl_saves_pages_through_write_batches(tmp_path, monkeypatch, umod_archive, fast_limiter, profile):
+    # Файл состояния обхода по умолчанию лежит в текущей директории
+    monkeypatch.chdir(tmp_path)
+    archive = umod_archive(NAMES)
+    with MockUmodServer(archive, MockProfile(**profile)) as server:
+        parser = AsyncUmodParser(output_dir=str(tmp_path / "data"), max_pages=10, per_page=3, max_retries=10,
+                                 base_url=server.base_url, rate_limiter=fast_limiter())
+        plugins = asyncio.run(parser.get_all_plugins_async())
+
+    slugs = sorted(name.lower() for name in NAMES)
+    assert sorted(plugin.id for plugin in plugins) == slugs
+    assert sorted(path.stem for path in (tmp_path / "data").glob("*.json")) == slugs
+    # Файлы записаны батчами: манифест знает о каждом, журнал записи закрыт
+    assert sorted(key for key, _ in Manifest(tmp_path / "data").file_entries()) == [f"{slug}.json" for slug in slugs]
+    assert not (tmp_path / "data" / ".write_journal.jsonl").exists()
+    assert sorted(parser.crawl_state.plugins) == slugs
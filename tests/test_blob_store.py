@@ -0,0 +1,29 @@
+from blob_store import BlobStore
+
+def test_prune_keeps_linked_and_indexed_blobs(tmp_path):
+    store = BlobStore(tmp_path / "blobs")
+    linked = store.put_stream([b"class Linked {}"])
+    indexed = store.put_stream([b"class Indexed {}"])
+    stale = store.put_stream([b"<html>login</html>"])
+    store.link(linked, tmp_path / "Linked.cs")
+    store.set_remote("https://umod.org/plugins/indexed.cs", indexed, '"v1"', None, None)
+
+    stats = store.prune()
+
+    assert stats["removed"] == 1 and stats["kept"] == 2
+    assert store.has(linked) and store.has(indexed) and not store.has(stale)
+    assert (tmp_path / "Linked.cs").read_bytes() == b"class Linked {}"
+
+def test_prune_drops_blob_replaced_in_index(tmp_path):
+    store = BlobStore(tmp_path / "blobs")
+    url = "https://umod.org/plugins/changed.cs"
+    old = store.put_stream([b"class V1 {}"])
+    store.set_remote(url, old, '"v1"', None, None)
+    new = store.put_stream([b"class V2 {}"])
+    store.set_remote(url, new, '"v2"', None, None)
+
+    assert store.prune(referenced=[])["removed"] == 1
+    assert store.has(new) and not store.has(old)
+    # Явно переданные ссылки тоже удерживают блоб
+    store.set_remote(url, old, '"v1"', None, None)
+    assert store.prune(referenced=[new])["removed"] == 0
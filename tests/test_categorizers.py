@@ -0,0 +1,73 @@
+import pytest
+
+from alphabetical_categorizer import AlphabeticalCategorizer
+from categorize_plugins import PluginCategorizer
+from manifest import Manifest
+
+NAMES = ("Alpha", "Apex", "Beta", "Zeta")
+
+@pytest.fixture
+def lettered_tree(tmp_path, make_plugin):
+    """Дерево в раскладке репозитория: plugins/<Letter>/<Name>/"""
+    source = tmp_path / "plugins"
+    for name in NAMES:
+        make_plugin(source / name[0], name)
+    return source
+
+def _names(categories):
+    return sorted(plugin_dir.name for plugins in categories.values() for plugin_dir in plugins)
+
+@pytest.mark.parametrize("with_manifest", [False, True])
+def test_plugin_categorizer_lists_plugins_of_lettered_tree(tmp_path, lettered_tree, with_manifest):
+    if with_manifest:
+        Manifest(lettered_tree).ensure_built()
+    categorizer = PluginCategorizer(source_dir=lettered_tree, output_dir=tmp_path / "out",
+                                    max_plugins_per_category=2)
+
+    assert sorted(plugin_dir.name for plugin_dir in categorizer.list_plugin_dirs()) == sorted(NAMES)
+    assert _names(categorizer.categorize_by_alphabet()) == sorted(NAMES)
+    assert (tmp_path / "out" / "A" / "Apex" / "Apex.cs").exists()
+
+@pytest.mark.parametrize("with_manifest", [False, True])
+def test_alphabetical_categorizer_lists_plugins_of_lettered_tree(tmp_path, lettered_tree, with_manifest):
+    if with_manifest:
+        Manifest(lettered_tree).ensure_built()
+    categories = AlphabeticalCategorizer(source_dir=lettered_tree, output_dir=tmp_path / "out").categorize()
+
+    assert sorted(categories) == ["A", "B", "Z"]
+    assert _names(categories) == sorted(NAMES)
+
+def test_categorizer_handles_flat_tree(tmp_path, make_plugin):
+    source = tmp_path / "plugins"
+    for name in NAMES:
+        make_plugin(source, name)
+    categories = AlphabeticalCategorizer(source_dir=source, output_dir=tmp_path / "out").categorize()
+    assert _names(categories) == sorted(NAMES)
+
+def _organizer(output_dir, tmp_path):
+    pytest.importorskip("requests")
+    from organizer import PluginOrganizer
+    return PluginOrganizer(source_dir=tmp_path / "data", output_dir=output_dir, blob_dir=tmp_path / "blobs",
+                           history_dir=None, journal_file=tmp_path / "journal.jsonl", durable_writes=False)
+
+def test_organizer_keeps_layout_of_lettered_tree(tmp_path, lettered_tree):
+    organizer = _organizer(lettered_tree, tmp_path)
+    for name in ("Apex", "Gamma"):
+        plugin_dir = organizer.prepare_plugin_dir({"id": name.lower(), "name": name})
+        organizer.manifest.record_dir(plugin_dir)
+    organizer.storage.close()
+
+    # Обновленный плагин остается на месте, новый попадает в директорию своей буквы
+    assert not (lettered_tree / "Apex").exists()
+    assert (lettered_tree / "G" / "Gamma" / "Gamma.json").exists()
+    # Ключи записей писателя совпадают с ключами манифеста, построенного по дереву
+    rebuilt = Manifest(lettered_tree, manifest_file=tmp_path / "rebuilt.jsonl")
+    rebuilt.build()
+    assert sorted(organizer.manifest.keys()) == sorted(rebuilt.keys())
+    assert len(organizer.manifest.plugin_dirs()) == len(NAMES) + 1
+
+def test_organizer_writes_flat_layout_into_new_tree(tmp_path):
+    organizer = _organizer(tmp_path / "plugins", tmp_path)
+    plugin_dir = organizer.prepare_plugin_dir({"id": "alpha", "name": "Alpha"})
+    organizer.storage.close()
+    assert plugin_dir == tmp_path / "plugins" / "Alpha"
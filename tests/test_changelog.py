@@ -0,0 +1,20 @@
+import pytest
+
+from changelog import SnapshotStore
+
+def test_snapshots_never_overwrite_each_other(tmp_path):
+    (tmp_path / "data").mkdir()
+    store = SnapshotStore(tmp_path / "snapshots")
+    paths = [store.create(tmp_path / "data", tmp_path / "plugins") for _ in range(3)]
+
+    assert len(set(paths)) == 3
+    assert store.names() == sorted(path.stem for path in paths)
+    with pytest.raises(FileExistsError):
+        store.create(tmp_path / "data", tmp_path / "plugins", name=paths[0].stem)
+
+def test_missing_snapshot_is_reported(tmp_path):
+    store = SnapshotStore(tmp_path / "snapshots")
+    with pytest.raises(FileNotFoundError):
+        store.load("latest")
+    with pytest.raises(FileNotFoundError):
+        store.load("20200101-000000")
@@ -0,0 +1,25 @@
+import os
+import shutil
+
+from cs_metadata import MetadataIndex
+
+def test_known_sources_are_not_parsed_again(tmp_path, make_plugin):
+    tree = tmp_path / "plugins"
+    alpha = make_plugin(tree, "Alpha", "1.2.0")
+    make_plugin(tree, "Beta")
+    index = MetadataIndex(str(tmp_path / "cs_metadata.json"))
+
+    stats = index.update(str(tree), workers=1)
+    assert (stats["checked"], stats["parsed"]) == (2, 2)
+    assert index.get("alpha")["meta"]["info"]["version"] == "1.2.0"
+
+    # Изменился только mtime: файл хешируется, но не разбирается
+    os.utime(alpha / "Alpha.cs", ns=(1, 1))
+    # Форк с тем же исходником получает готовые метаданные по хешу
+    fork = tree / "AlphaFork"
+    fork.mkdir()
+    shutil.copy(alpha / "Alpha.cs", fork / "AlphaFork.cs")
+    (fork / "AlphaFork.json").write_text('{"id": "alpha-fork", "name": "AlphaFork"}', encoding="utf-8")
+
+    stats = MetadataIndex(str(tmp_path / "cs_metadata.json")).update(str(tree), workers=1)
+    assert (stats["plugins"], stats["checked"], stats["parsed"]) == (3, 2, 0)
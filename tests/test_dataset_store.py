@@ -0,0 +1,57 @@
+import json
+
+from dataset_store import DatasetReader, index_path_for, update_dataset, write_dataset
+
+def _records(*slugs):
+    return [{"id": slug, "name": slug.title(), "description": "line one\nline two"} for slug in slugs]
+
+def test_index_gives_random_access(tmp_path):
+    dataset_file = tmp_path / "plugins.jsonl"
+    assert write_dataset(_records("beta", "alpha", "gamma"), str(dataset_file)) == 3
+    assert index_path_for(dataset_file).exists()
+
+    with DatasetReader(str(dataset_file)) as reader:
+        assert reader.slugs() == ["alpha", "beta", "gamma"]
+        assert reader.get("gamma")["name"] == "Gamma"
+        assert reader.get("missing") is None
+        assert [record["id"] for record in reader.load_all()] == ["alpha", "beta", "gamma"]
+
+def test_stale_index_is_rebuilt_from_data(tmp_path, caplog):
+    dataset_file = tmp_path / "plugins.jsonl"
+    write_dataset(_records("alpha", "beta"), str(dataset_file))
+    # Запись добавлена в обход write_dataset: размер файла данных больше не совпадает с индексом
+    with open(dataset_file, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"id": "delta", "name": "Delta"}) + "\n")
+
+    with DatasetReader(str(dataset_file)) as reader:
+        assert "delta" in reader
+        assert reader.get("delta")["name"] == "Delta"
+        assert reader.get("beta")["name"] == "Beta"
+    assert "missing or stale" in caplog.text
+
+def test_corrupted_index_is_ignored(tmp_path):
+    dataset_file = tmp_path / "plugins.jsonl"
+    write_dataset(_records("alpha"), str(dataset_file))
+    index_path_for(dataset_file).write_bytes(b"garbage")
+
+    with DatasetReader(str(dataset_file)) as reader:
+        assert reader.get("alpha")["id"] == "alpha"
+
+def test_update_merges_by_id(tmp_path):
+    dataset_file = tmp_path / "plugins.jsonl"
+    write_dataset(_records("alpha", "beta"), str(dataset_file))
+    update_dataset(str(dataset_file), [{"id": "beta", "name": "Beta 2"}, {"id": "gamma", "name": "Gamma"}])
+
+    with DatasetReader(str(dataset_file)) as reader:
+        assert len(reader) == 3
+        assert reader.get("beta")["name"] == "Beta 2"
+        assert reader.get("alpha")["description"] == "line one\nline two"
+
+def test_compressed_dataset_reads_without_index(tmp_path):
+    dataset_file = tmp_path / "plugins.jsonl.gz"
+    write_dataset(_records("alpha", "beta"), str(dataset_file), compress=True)
+    assert not index_path_for(dataset_file).exists()
+
+    with DatasetReader(str(dataset_file)) as reader:
+        assert reader.get("beta")["name"] == "Beta"
+        assert len(reader) == 2
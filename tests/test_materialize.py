@@ -0,0 +1,41 @@
+from manifest import Manifest
+from materialize import LayoutSync, tree_signature
+
+def test_sync_replaces_only_changed_plugins(tmp_path, make_plugin):
+    source = tmp_path / "plugins"
+    plugins = [make_plugin(source, name) for name in ("Alpha", "Beta", "Gamma")]
+    layout = LayoutSync(tmp_path / "out", "copy")
+
+    assert layout.sync({"A-G": plugins}) == {"placed": 3, "unchanged": 0, "removed": 0}
+    assert (tmp_path / "out" / "A-G" / "Beta" / "Beta.cs").exists()
+
+    (plugins[1] / "Beta.cs").write_text("// changed", encoding="utf-8")
+    assert layout.sync({"A-G": plugins}) == {"placed": 1, "unchanged": 2, "removed": 0}
+    assert (tmp_path / "out" / "A-G" / "Beta" / "Beta.cs").read_text(encoding="utf-8") == "// changed"
+
+def test_sync_moves_and_removes_plugins(tmp_path, make_plugin):
+    source = tmp_path / "plugins"
+    alpha, beta = make_plugin(source, "Alpha"), make_plugin(source, "Beta")
+    layout = LayoutSync(tmp_path / "out", "hardlink")
+    layout.sync({"A": [alpha], "B": [beta]})
+
+    assert layout.sync({"A-B": [alpha]}) == {"placed": 1, "unchanged": 0, "removed": 1}
+    assert (tmp_path / "out" / "A-B" / "Alpha").is_dir()
+    assert not (tmp_path / "out" / "A").exists()
+    assert not (tmp_path / "out" / "B").exists()
+
+def test_signature_is_the_same_with_and_without_manifest(tmp_path, make_plugin):
+    source = tmp_path / "plugins"
+    plugins = [make_plugin(source, name) for name in ("Alpha", "Beta")]
+    # Временные файлы незавершенной записи не входят ни в одну из сигнатур
+    (plugins[0] / "Alpha.cs.0123.tmp").write_bytes(b"partial")
+    manifest = Manifest(source)
+    manifest.build()
+
+    for plugin_dir in plugins:
+        assert manifest.signature(manifest.key_for(plugin_dir)) == tree_signature(plugin_dir)
+
+    # Появление манифеста между запусками не переразмещает плагины
+    LayoutSync(tmp_path / "out", "copy").sync({"A-B": plugins})
+    stats = LayoutSync(tmp_path / "out", "copy", manifest=manifest).sync({"A-B": plugins})
+    assert stats == {"placed": 0, "unchanged": 2, "removed": 0}
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+pytest.importorskip("requests")
+
+from manifest import Manifest
+from organizer import PluginOrganizer
+
+def _organizer(tmp_path, **kwargs):
+    return PluginOrganizer(source_dir=tmp_path / "data", output_dir=tmp_path / "plugins",
+                           blob_dir=tmp_path / "blobs", journal_file=tmp_path / "journal.jsonl",
+                           durable_writes=False, **kwargs)
+
+def test_list_sources_includes_files_missing_from_manifest(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    for slug in ("alpha", "beta"):
+        (data_dir / f"{slug}.json").write_text(json.dumps({"id": slug, "name": slug.title()}), encoding="utf-8")
+    manifest = Manifest(data_dir)
+    manifest.build()
+    manifest.save()
+    # Записан в обход манифеста (вручную или старым запуском)
+    (data_dir / "gamma.json").write_text(json.dumps({"id": "gamma", "name": "Gamma"}), encoding="utf-8")
+    (data_dir / "alpha.json").unlink()
+
+    sources = _organizer(tmp_path, history_dir=None)._list_sources()
+
+    assert [key for key, _, _ in sources] == ["beta.json", "gamma.json"]
+    assert sources[0][1] == manifest.get("beta.json")["files"]["beta.json"][1]
+
+NAMES = ["Alpha", "Bravo", "Charlie", "Delta", "Echo", "Foxtrot", "Golf", "Hotel"]
+BROKEN = "Delta"
+PROFILES = {
+    "429": dict(throttle_rate=0.3, retry_after=0),
+    "500": dict(error_rate=0.5),
+}
+
+def _crawl(tmp_path, archive, fast_limiter):
+    from fixtures import MockUmodServer
+    from umod_parser import UmodParser
+    with MockUmodServer(archive) as server:
+        UmodParser(output_dir=tmp_path / "data", max_pages=10, base_url=server.base_url, state_file=None,
+                   rate_limiter=fast_limiter(), durable_writes=False).get_all_plugins()
+
+def _record_requests(archive):
+    requested = []
+    get = archive.get
+    archive.get = lambda key: requested.append(key) or get(key)
+    return requested
+
+@pytest.mark.parametrize("profile", sorted(PROFILES))
+def test_organize_resumes_after_failures(tmp_path, umod_archive, fast_limiter, complete_plugins, profile):
+    from fixtures import MockProfile, MockUmodServer
+    archive = umod_archive(NAMES, broken=[BROKEN])
+    _crawl(tmp_path, archive, fast_limiter)
+
+    with MockUmodServer(archive, MockProfile(**PROFILES[profile])) as server:
+        organizer = _organizer(tmp_path, history_dir=tmp_path / "history", base_url=server.base_url,
+                               rate_limiter=fast_limiter(), max_retries=10, max_workers=1)
+        organizer.organize_plugins()
+        throttled, errors = server.stats["throttled"], server.stats["errors"]
+    assert throttled + errors > 0
+    # Отвергнутый исходник не оставляет ни директории, ни версии в истории
+    first_run = complete_plugins(tmp_path / "plugins")
+    assert BROKEN not in first_run
+    assert not organizer.history.has_version(BROKEN.lower(), "1.0.0")
+    if profile == "429":
+        assert first_run == sorted(set(NAMES) - {BROKEN})
+    else:
+        # Ответ 500 на исходник не повторяется: такие плагины остаются на следующий запуск
+        assert len(first_run) < len(NAMES) - 1
+
+    # Повторный запуск загружает только то, что не удалось в первый раз
+    requested = _record_requests(archive)
+    with MockUmodServer(archive) as server:
+        _organizer(tmp_path, history_dir=tmp_path / "history", base_url=server.base_url,
+                   rate_limiter=fast_limiter()).organize_plugins()
+    assert complete_plugins(tmp_path / "plugins") == sorted(set(NAMES) - {BROKEN})
+    assert {key for key in requested if key.endswith(".cs")} == {
+        f"GET /plugins/{name.lower()}.cs" for name in set(NAMES) - set(first_run)}
@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip("requests")
+
+from fixtures import MockProfile, MockUmodServer
+from materialize import LayoutSync
+from organizer import PluginOrganizer
+from pipeline import StreamingPipeline
+from umod_parser import UmodParser
+
+NAMES = ["Alpha", "Bravo", "Charlie", "Delta", "Echo", "Foxtrot", "Golf", "Hotel"]
+BROKEN = "Delta"
+PROFILES = {
+    "429": dict(throttle_rate=0.3, retry_after=0),
+    "500": dict(error_rate=0.3),
+}
+
+def _pipeline(tmp_path, base_url, limiter):
+    parser = UmodParser(output_dir=tmp_path / "data", max_pages=10, base_url=base_url,
+                        state_file=tmp_path / "crawl_state.json", rate_limiter=limiter, max_retries=10,
+                        durable_writes=False)
+    organizer = PluginOrganizer(source_dir=tmp_path / "data", output_dir=tmp_path / "plugins",
+                                blob_dir=tmp_path / "blobs", history_dir=tmp_path / "history",
+                                journal_file=tmp_path / "journal.jsonl", base_url=base_url, rate_limiter=limiter,
+                                max_retries=10, durable_writes=False)
+    layout = LayoutSync(tmp_path / "alpha", "hardlink", manifest=organizer.manifest)
+    return StreamingPipeline(parser, organizer, layout, download_workers=2, docs_workers=2)
+
+@pytest.mark.parametrize("profile", sorted(PROFILES))
+def test_pipeline_advances_crawl_state_only_for_placed_plugins(tmp_path, umod_archive, fast_limiter,
+                                                              complete_plugins, profile):
+    archive = umod_archive(NAMES, broken=[BROKEN])
+
+    with MockUmodServer(archive, MockProfile(**PROFILES[profile])) as server:
+        pipeline = _pipeline(tmp_path, server.base_url, fast_limiter())
+        stats = pipeline.run(limit=6)
+
+    placed = complete_plugins(tmp_path / "plugins")
+    assert BROKEN not in placed
+    assert len(placed) == stats["place"]["processed"] <= 5
+    assert sorted(pipeline.parser.crawl_state.plugins) == [name.lower() for name in placed]
+    assert sorted(path.name for path in (tmp_path / "alpha").glob("*/*")) == placed
+    assert not (tmp_path / "plugins" / ".write_journal.jsonl").exists()
+
+    # Исходник снова доступен: инкрементальный запуск догоняет все, что не прошло конвейер
+    source = tmp_path / "fixture_tree" / BROKEN / f"{BROKEN}.cs"
+    archive.add(f"GET /plugins/{BROKEN.lower()}.cs", 200, {"Content-Type": "text/plain; charset=utf-8"},
+                source.read_bytes())
+    with MockUmodServer(archive) as server:
+        pipeline = _pipeline(tmp_path, server.base_url, fast_limiter())
+        stats = pipeline.run(incremental=True)
+
+    assert stats["place"]["processed"] == len(NAMES) - len(placed)
+    assert complete_plugins(tmp_path / "plugins") == sorted(NAMES)
+    assert sorted(pipeline.parser.crawl_state.plugins) == sorted(name.lower() for name in NAMES)
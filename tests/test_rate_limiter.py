@@ -0,0 +1,44 @@
+import pytest
+
+from rate_limiter import AdaptiveRateLimiter, parse_retry_after
+
+def test_throttle_halves_rate_and_pauses_all_callers():
+    limiter = AdaptiveRateLimiter(initial_rate=4.0, max_rate=10.0, decrease_factor=0.5)
+    pause = limiter.on_throttle(retry_after=2.0)
+
+    assert pause == 2.0
+    assert limiter.current_rate == pytest.approx(2.0)
+    # Запас ушел в минус на всю паузу: следующий acquire будет ждать Retry-After
+    assert limiter._reserve() == pytest.approx(2.0 + 1 / limiter.rate, abs=0.05)
+    assert limiter.stats()["throttles"] == 1
+
+def test_throttles_within_cooldown_decrease_once():
+    limiter = AdaptiveRateLimiter(initial_rate=8.0, decrease_cooldown=60.0)
+    limiter.on_throttle()
+    limiter.on_throttle()
+    limiter.on_error()
+
+    assert limiter.current_rate == pytest.approx(4.0)
+
+def test_rate_stays_within_bounds():
+    limiter = AdaptiveRateLimiter(initial_rate=1.0, min_rate=0.5, max_rate=1.1, increase_step=0.05,
+                                  decrease_cooldown=0.0)
+    for _ in range(10):
+        limiter.on_success(latency=0.01)
+    assert limiter.current_rate == pytest.approx(1.1)
+
+    for _ in range(10):
+        limiter.on_throttle(retry_after=0)
+    assert limiter.current_rate == pytest.approx(0.5)
+
+def test_slow_responses_do_not_increase_rate():
+    limiter = AdaptiveRateLimiter(initial_rate=1.0, slow_latency=2.0)
+    limiter.on_success(latency=5.0)
+
+    assert limiter.current_rate == pytest.approx(1.0)
+    assert limiter.stats()["successes"] == 1
+
+@pytest.mark.parametrize("value, expected", [("3", 3.0), ("-1", 0.0), (None, None), ("soon", None),
+                                             ("Wed, 21 Oct 2015 07:28:00 GMT", 0.0)])
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value) == expected
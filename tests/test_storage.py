@@ -0,0 +1,109 @@
+import json
+
+import pytest
+
+from storage import WriteJournal, temp_path_for
+
+def _journal_lines(journal_file):
+    return [json.loads(line) for line in journal_file.read_text(encoding="utf-8").splitlines()]
+
+def test_batch_commit_places_all_files(tmp_path):
+    journal = WriteJournal(tmp_path / "journal.jsonl")
+    with journal.batch() as batch:
+        batch.write(tmp_path / "a.json", b"a")
+        batch.write(tmp_path / "b.json", b"b")
+        assert not (tmp_path / "a.json").exists()
+    journal.close()
+
+    assert (tmp_path / "a.json").read_bytes() == b"a"
+    assert (tmp_path / "b.json").read_bytes() == b"b"
+    assert not list(tmp_path.glob("*.tmp"))
+    assert not (tmp_path / "journal.jsonl").exists()
+
+def test_batch_rollback_keeps_existing_file(tmp_path):
+    (tmp_path / "a.cs").write_bytes(b"good")
+    journal = WriteJournal(tmp_path / "journal.jsonl")
+    with pytest.raises(RuntimeError):
+        with journal.batch() as batch:
+            batch.write(tmp_path / "a.cs", b"broken")
+            raise RuntimeError("download failed")
+
+    assert (tmp_path / "a.cs").read_bytes() == b"good"
+    assert not list(tmp_path.glob("*.tmp"))
+
+def _crash_journal(journal_file, records, tail=""):
+    """Журнал, каким его оставил прерванный запуск"""
+    journal_file.write_text("".join(json.dumps(record) + "\n" for record in records) + tail, encoding="utf-8")
+
+def test_recover_rolls_committed_batch_forward(tmp_path):
+    journal_file = tmp_path / "journal.jsonl"
+    journal = WriteJournal(journal_file)
+    target = tmp_path / "a.json"
+    target.write_bytes(b"old")
+    tmp_file = temp_path_for(target, "dead1")
+    tmp_file.write_bytes(b"new")
+    _crash_journal(journal_file, [{"batch": "dead1", "stage": str(tmp_file)},
+                                  {"batch": "dead1", "commit": [[str(tmp_file), str(target)]]}])
+
+    assert journal.recover() == {"rolled_forward": 1, "rolled_back": 0}
+    assert target.read_bytes() == b"new"
+    assert not tmp_file.exists()
+    assert not journal_file.exists()
+
+def test_recover_rolls_uncommitted_batch_back(tmp_path):
+    journal_file = tmp_path / "journal.jsonl"
+    journal = WriteJournal(journal_file)
+    target = tmp_path / "a.json"
+    target.write_bytes(b"old")
+    tmp_file = temp_path_for(target, "dead2")
+    tmp_file.write_bytes(b"half")
+    # Запись commit оборвана на середине: батч не считается принятым
+    _crash_journal(journal_file, [{"batch": "dead2", "stage": str(tmp_file)}], tail='{"batch": "dead2", "comm')
+
+    assert journal.recover() == {"rolled_forward": 0, "rolled_back": 1}
+    assert target.read_bytes() == b"old"
+    assert not tmp_file.exists()
+
+def test_recover_ignores_already_applied_batches(tmp_path):
+    journal_file = tmp_path / "journal.jsonl"
+    journal = WriteJournal(journal_file)
+    target = tmp_path / "a.json"
+    target.write_bytes(b"applied")
+    tmp_file = temp_path_for(target, "done1")
+    _crash_journal(journal_file, [{"batch": "done1", "stage": str(tmp_file)},
+                                  {"batch": "done1", "commit": [[str(tmp_file), str(target)]]}])
+
+    assert journal.recover() == {"rolled_forward": 0, "rolled_back": 0}
+    assert target.read_bytes() == b"applied"
+
+def test_checkpoint_keeps_only_open_batches(tmp_path):
+    journal_file = tmp_path / "journal.jsonl"
+    journal = WriteJournal(journal_file, checkpoint_every=2)
+    open_batch = journal.batch()
+    open_batch.write(tmp_path / "pending.json", b"p")
+    for name in ("a", "b"):
+        with journal.batch() as batch:
+            batch.write(tmp_path / f"{name}.json", name.encode())
+
+    # Два принятых батча вызвали checkpoint, хотя один батч еще открыт
+    assert {record["batch"] for record in _journal_lines(journal_file)} == {open_batch.id}
+    open_batch.commit()
+    journal.close()
+    assert (tmp_path / "pending.json").read_bytes() == b"p"
+    assert not journal_file.exists()
+
+def test_failed_rename_still_finishes_batch(tmp_path, monkeypatch):
+    journal = WriteJournal(tmp_path / "journal.jsonl")
+    batch = journal.batch()
+    batch.write(tmp_path / "a.json", b"a")
+
+    def fail_replace(src, dst):
+        raise OSError("rename failed")
+    monkeypatch.setattr("storage.os.replace", fail_replace)
+    with pytest.raises(OSError):
+        batch.commit()
+    monkeypatch.undo()
+
+    journal.close()
+    assert not (tmp_path / "journal.jsonl").exists()
+    assert not list(tmp_path.glob("*.tmp"))
@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+pytest.importorskip("requests")
+
+from fixtures import MockProfile, MockUmodServer
+from manifest import Manifest
+from umod_parser import UmodParser
+
+# Три страницы поисковой выдачи по 10 записей
+NAMES = [f"Plugin{chr(ord('A') + index)}" for index in range(25)]
+
+def _parser(tmp_path, base_url, limiter):
+    return UmodParser(output_dir=tmp_path / "data", max_pages=10, base_url=base_url,
+                      state_file=tmp_path / "crawl_state.json", rate_limiter=limiter, max_retries=10,
+                      durable_writes=False)
+
+def test_incremental_crawl_fetches_only_changed_plugins(tmp_path, umod_archive, fast_limiter):
+    archive = umod_archive(NAMES)
+    with MockUmodServer(archive, MockProfile(throttle_rate=0.3, retry_after=0)) as server:
+        assert len(_parser(tmp_path, server.base_url, fast_limiter()).get_all_plugins()) == len(NAMES)
+    assert len(Manifest(tmp_path / "data").file_entries()) == len(NAMES)
+
+    # Новый выпуск одного плагина поднимает его в начало выдачи по updated_at
+    changed = next(item for item in archive.catalog if item["slug"] == "pluginc")
+    changed.update(updated_at="2024-03-01 12:00:00", latest_release_version="1.1.0")
+    with MockUmodServer(archive) as server:
+        plugins = _parser(tmp_path, server.base_url, fast_limiter()).get_updated_plugins()
+        # Обход останавливается на второй странице, в которой изменений уже нет; третья не запрашивается
+        assert server.stats["requests"] == 2
+
+    assert [plugin.id for plugin in plugins] == ["pluginc"]
+    assert json.loads((tmp_path / "data" / "pluginc.json").read_text(encoding="utf-8"))["latest_version"] == "1.1.0"
+    state = json.loads((tmp_path / "crawl_state.json").read_text(encoding="utf-8"))["plugins"]
+    assert state["pluginc"]["latest_version"] == "1.1.0"
+
+    with MockUmodServer(archive) as server:
+        assert _parser(tmp_path, server.base_url, fast_limiter()).get_updated_plugins() == []
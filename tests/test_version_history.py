@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+import version_history
+from version_history import VersionStore, apply_delta, encode_delta
+
+BASE = b"".join(b"line %d\n" % number for number in range(200))
+
+def _edit(content: bytes, changed_every: int, label: bytes) -> bytes:
+    lines = content.splitlines(keepends=True)
+    return b"".join(b"// " + label + b"\n" if number % changed_every == 0 else line
+                    for number, line in enumerate(lines))
+
+@pytest.mark.parametrize("target", [
+    b"",
+    BASE + b"tail without newline",
+    _edit(BASE, 7, b"edited"),
+    b"new head\n" + BASE[::-1],
+    BASE.replace(b"line 1\n", b"") + b"line 1\n",
+])
+def test_delta_round_trip(target):
+    for base, other in ((BASE, target), (target, BASE)):
+        assert apply_delta(base, encode_delta(base, other)) == other
+
+def test_delta_gives_up_when_too_expensive(monkeypatch):
+    monkeypatch.setattr(version_history, "DELTA_WORK_FACTOR", 0)
+    assert encode_delta(BASE, _edit(BASE, 3, b"x")) is None
+    # Общие начало и конец отбрасываются без затрат бюджета
+    assert encode_delta(BASE, BASE) is not None
+
+def _referenced_files(store, slug):
+    return {entry["file"] for entry in store.versions(slug)} | {"manifest.json"}
+
+def test_history_stores_deltas_and_reads_every_version(tmp_path):
+    store = VersionStore(str(tmp_path), keyframe_interval=4)
+    contents = {}
+    content = BASE
+    for number in range(6):
+        content = _edit(content, 11 + number, b"v%d" % number)
+        contents[f"1.{number}"] = content
+        assert store.add_version("demo", f"1.{number}", content, f"2024-01-0{number + 1}T00:00:00")
+    assert not store.add_version("demo", "1.0", BASE)
+
+    # Версия из прошлого встраивается в цепочку по дате
+    contents["0.9"] = BASE
+    store.add_version("demo", "0.9", BASE, "2023-12-31T00:00:00")
+
+    entries = store.versions("demo")
+    assert [entry["version"] for entry in entries] == ["0.9"] + [f"1.{number}" for number in range(6)]
+    assert entries[-1]["kind"] == "full"
+    assert any(entry["kind"] == "delta" for entry in entries)
+    for version, expected in contents.items():
+        assert store.get_version("demo", version) == expected
+    assert store.get_version("demo") == contents["1.5"]
+    assert set(path.name for path in (tmp_path / "demo").iterdir()) == _referenced_files(store, "demo")
+
+def test_retention_keeps_latest_versions(tmp_path):
+    store = VersionStore(str(tmp_path))
+    for number in range(5):
+        store.add_version("demo", f"2.{number}", _edit(BASE, 5 + number, b"r"), f"2024-02-0{number + 1}")
+    store.set_policy("demo", keep_last=2)
+
+    assert store.apply_retention() == 3
+    assert [entry["version"] for entry in store.versions("demo")] == ["2.3", "2.4"]
+    assert store.get_version("demo", "2.3") == _edit(BASE, 8, b"r")
+    assert set(path.name for path in (tmp_path / "demo").iterdir()) == _referenced_files(store, "demo")
+    assert json.loads((tmp_path / "policies.json").read_text())["plugins"]["demo"] == {"keep_last": 2}
+
+def test_similar_version_names_do_not_share_files(tmp_path):
+    store = VersionStore(str(tmp_path))
+    store.add_version("demo", "1 0", b"first\n", "2024-01-01")
+    store.add_version("demo", "1_0", b"second\n", "2024-01-02")
+
+    assert store.get_version("demo", "1 0") == b"first\n"
+    assert store.get_version("demo", "1_0") == b"second\n"
+
+def test_crash_before_manifest_keeps_old_history_readable(tmp_path, monkeypatch):
+    store = VersionStore(str(tmp_path))
+    store.add_version("demo", "1.0", BASE, "2024-01-01")
+    store.add_version("demo", "1.1", _edit(BASE, 9, b"a"), "2024-01-02")
+
+    def crash(*args):
+        raise OSError("killed")
+    monkeypatch.setattr(store, "_save_manifest", crash)
+    with pytest.raises(OSError):
+        store.add_version("demo", "1.2", _edit(BASE, 13, b"b"), "2024-01-03")
+    monkeypatch.undo()
+
+    # Манифест прежний, и все файлы, на которые он ссылается, на месте
+    assert store.get_version("demo", "1.0") == BASE
+    assert store.get_version("demo", "1.1") == _edit(BASE, 9, b"a")
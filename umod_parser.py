@@ -1,154 +1,291 @@
 import requests
 import json
-from typing import Dict, List, Optional
-from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
 from datetime import datetime
 import time
 from pathlib import Path
 import logging
 from concurrent.futures import ThreadPoolExecutor, as_completed
-import random
 import threading
 import os
+import argparse
+
+from dataset_store import update_dataset
+from manifest import Manifest
+from metrics import metrics
+from models import Plugin, PluginVersion, dump_json_file, dumps, load_json_file, now_micros, to_micros
+from rate_limiter import AdaptiveRateLimiter, parse_retry_after
+from storage import WriteBatch, WriteJournal
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-@dataclass
-class PluginVersion:
-    version: str
-    released_at: datetime
-    download_url: str
-    changelog: Optional[str] = None
+def _normalize_timestamp(value: str) -> str:
+    """Приводит дату из API ("%Y-%m-%d %H:%M:%S") и из сохраненного JSON (ISO) к одному виду"""
+    try:
+        return datetime.fromisoformat(value).isoformat()
+    except (TypeError, ValueError):
+        return str(value or "")
 
-@dataclass
-class Plugin:
-    id: str
-    name: str
-    author: str
-    description: str
-    versions: List[PluginVersion]
-    categories: List[str]
-    total_downloads: int
-    latest_version: str
-    created_at: datetime
-    updated_at: datetime
+class CrawlState:
+    """Состояние инкрементального обхода: последний увиденный updated_at и latest_version каждого плагина"""
+    
+    def __init__(self, state_file: str = "crawl_state.json"):
+        self.state_file = Path(state_file)
+        self.plugins: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+    
+    def load(self, output_dir: Optional[Path] = None):
+        """Загружает состояние из файла, а если его нет — восстанавливает из уже сохраненных JSON"""
+        if self.state_file.exists():
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                self.plugins = json.load(f).get("plugins", {})
+            logger.info(f"Loaded crawl state for {len(self.plugins)} plugins from {self.state_file}")
+        elif output_dir is not None and output_dir.exists():
+            for plugin_file in output_dir.glob("*.json"):
+                try:
+                    data = load_json_file(plugin_file)
+                    self.plugins[data["id"]] = {
+                        "updated_at": _normalize_timestamp(data.get("updated_at", "")),
+                        "latest_version": str(data.get("latest_version", ""))
+                    }
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning(f"Skipping {plugin_file.name} while seeding crawl state: {e}")
+            logger.info(f"Seeded crawl state for {len(self.plugins)} plugins from {output_dir}")
+    
+    def is_changed(self, data: Dict) -> bool:
+        """Проверяет, изменился ли плагин из поисковой выдачи с прошлого обхода"""
+        known = self.plugins.get(str(data.get("slug", "")))
+        if known is None:
+            return True
+        return (known.get("updated_at") != _normalize_timestamp(data.get("updated_at", ""))
+                or known.get("latest_version") != str(data.get("latest_release_version", "")))
+    
+    def update(self, data: Dict):
+        """Запоминает состояние плагина после успешного сохранения"""
+        with self._lock:
+            self.plugins[str(data.get("slug", ""))] = {
+                "updated_at": _normalize_timestamp(data.get("updated_at", "")),
+                "latest_version": str(data.get("latest_release_version", ""))
+            }
+    
+    def save(self):
+        """Сохраняет состояние через временный файл, чтобы не оставить его обрезанным"""
+        with self._lock:
+            tmp_file = self.state_file.with_name(self.state_file.name + ".tmp")
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump({"plugins": self.plugins}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, self.state_file)
 
 class UmodParser:
     BASE_URL = "https://umod.org"
     SEARCH_URL = f"{BASE_URL}/plugins/search.json"
     PLUGIN_URL = f"{BASE_URL}/plugins"
     
-    def __init__(self, output_dir: str = "plugins_data", max_workers: int = 3, max_pages: int = 3):
+    def __init__(self, output_dir: str = "plugins_data", max_workers: int = 3, max_pages: int = 3,
+                 base_url: str = BASE_URL, state_file: Optional[str] = "crawl_state.json",
+                 rate_limiter: Optional[AdaptiveRateLimiter] = None, max_retries: int = 3,
+                 dataset_file: Optional[str] = None, write_per_file: bool = True,
+                 fetch_versions: bool = False, session: Optional[requests.Session] = None,
+                 durable_writes: bool = True):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
         logger.info(f"Created/using output directory: {os.path.abspath(self.output_dir)}")
         
-        self.session = requests.Session()
+        # Базовый URL можно переопределить, например, для локального mock-сервера
+        self.base_url = base_url.rstrip("/")
+        self.SEARCH_URL = f"{self.base_url}/plugins/search.json"
+        self.PLUGIN_URL = f"{self.base_url}/plugins"
+        
+        # Сессию можно подменить, например, воспроизведением записанных фикстур
+        self.session = session or requests.Session()
         self.max_workers = max_workers
         self.max_pages = max_pages  # Ограничиваем количество страниц для тестирования
         
+        # Единый JSONL датасет; раскладка по файлам <slug>.json остается необязательной
+        self.dataset_file = dataset_file
+        self.write_per_file = write_per_file
+        
+        # Файлы плагинов пишутся пакетами через журнал: пакет появляется на диске целиком
+        # или не появляется вовсе, а fsync выполняется один раз на пакет
+        self.storage = None
+        # Манифест файлов plugins_data: по нему статистику и списки плагинов получают без обхода директории
+        self.manifest = None
+        if write_per_file:
+            self.storage = WriteJournal(self.output_dir / ".write_journal.jsonl", durable=durable_writes)
+            self.manifest = Manifest(self.output_dir)
+            self.manifest.ensure_built()
+        
+        # Запрашивать ли полный список выпусков каждого плагина (для истории версий)
+        self.fetch_versions = fetch_versions
+        
+        # Состояние для инкрементального обхода (None — не отслеживать)
+        self.crawl_state = None
+        if state_file:
+            self.crawl_state = CrawlState(state_file)
+            self.crawl_state.load(self.output_dir)
+        
         # Добавляем заголовки для имитации браузера
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'application/json',
             'Accept-Language': 'en-US,en;q=0.9',
-            'Referer': 'https://umod.org/plugins',
+            'Referer': f'{self.base_url}/plugins',
             'Cache-Control': 'no-cache'
         })
         
         # Добавляем семафор для ограничения одновременных запросов
         self.request_semaphore = threading.Semaphore(2)
         
-    def _make_request(self, url: str, params: Dict = None) -> Dict:
-        """Выполняет HTTP запрос с обработкой ошибок и задержкой"""
-        max_retries = 3
-        retry_delay = 10  # увеличенная начальная задержка
-        
-        # Добавляем случайную задержку для имитации человеческого поведения
-        jitter = random.uniform(1.5, 4.0)
-        time.sleep(jitter)
+        # Темп запросов подстраивается под ответы сервера; один экземпляр
+        # ограничителя можно передать нескольким парсерам и органайзеру
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        self.max_retries = max_retries
         
-        # Используем семафор для ограничения количества одновременных запросов
-        with self.request_semaphore:
-            for attempt in range(max_retries):
+    def _make_request(self, url: str, params: Dict = None) -> Dict:
+        """Выполняет HTTP запрос с обработкой ошибок; темп запросов задает rate_limiter"""
+        for attempt in range(self.max_retries):
+            if attempt:
+                metrics.inc("http_retries_total", client="parser")
+            # Ждем разрешения ограничителя вне семафора, чтобы не держать слот
+            self.rate_limiter.acquire()
+            
+            # Используем семафор для ограничения количества одновременных запросов
+            with self.request_semaphore:
                 try:
-                    logger.debug(f"Making request to {url}")
+                    logger.debug("Making request to %s", url)
+                    start = time.monotonic()
                     response = self.session.get(url, params=params)
+                    latency = time.monotonic() - start
+                    metrics.observe("http_request_duration_seconds", latency, client="parser")
+                    metrics.inc("http_requests_total", client="parser", status=response.status_code)
                     
                     if response.status_code == 429:
-                        wait_time = retry_delay * (2 ** attempt) + random.uniform(1, 5)
-                        logger.warning(f"Rate limit hit, waiting {wait_time:.2f} seconds before retry")
-                        time.sleep(wait_time)
+                        metrics.inc("http_throttled_total", client="parser")
+                        wait_time = self.rate_limiter.on_throttle(parse_retry_after(response.headers.get("Retry-After")))
+                        logger.warning(f"Rate limit hit, slowing down to {self.rate_limiter.current_rate:.2f} req/s "
+                                       f"and waiting {wait_time:.2f} seconds before retry")
                         continue
                         
                     response.raise_for_status()
-                    
-                    # Добавляем паузу после успешного запроса
-                    time.sleep(3 + random.uniform(0, 2))
+                    self.rate_limiter.on_success(latency)
+                    metrics.inc("bytes_downloaded_total", len(response.content), kind="api")
                     
                     return response.json()
                 except requests.exceptions.RequestException as e:
-                    if attempt == max_retries - 1:  # последняя попытка
+                    # Замедляемся только при проблемах на стороне сервера или сети, а не при 4xx
+                    status_code = getattr(e.response, "status_code", None)
+                    if status_code is None or status_code >= 500:
+                        self.rate_limiter.on_error()
+                        metrics.inc("http_errors_total", client="parser",
+                                    kind="network" if status_code is None else "server")
+                    if attempt == self.max_retries - 1:  # последняя попытка
                         logger.error(f"Error making request to {url}: {e}")
                         raise
-                    wait_time = retry_delay * (2 ** attempt) + random.uniform(1, 5)
-                    logger.warning(f"Request failed, retrying in {wait_time:.2f} seconds...")
-                    time.sleep(wait_time)
+                    logger.warning(f"Request failed, retrying at {self.rate_limiter.current_rate:.2f} req/s...")
             
-            raise Exception("Max retries exceeded")
+        raise Exception("Max retries exceeded")
 
-    def get_all_plugins(self) -> List[Plugin]:
-        """Получает список плагинов с использованием bulk-загрузки (ограничено для тестирования)"""
-        all_plugin_data = []
+    def _search_params(self, page: int, per_page: int, sort: str = "title", sortdir: str = "asc") -> Dict:
+        """Параметры запроса страницы поиска"""
+        return {
+            "page": page,
+            "per_page": per_page,
+            "sort": sort,
+            "sortdir": sortdir,
+            "categories[0]": "universal",
+            "categories[1]": "rust"
+        }
+
+    def iter_search_pages(self, incremental: bool = False) -> Iterator[List[Dict]]:
+        """Отдает записи плагинов постранично, по мере загрузки страниц поиска.
+        
+        При incremental=True страницы запрашиваются в порядке убывания
+        updated_at, отдаются только изменившиеся с прошлого запуска плагины,
+        а обход останавливается на первой странице без изменений.
+        """
+        if incremental and self.crawl_state is None:
+            raise ValueError("Incremental crawl requires a state_file")
+        
         page = 1
         per_page = 10  # Уменьшаем размер страницы для снижения нагрузки
+        sort, sortdir = ("updated_at", "desc") if incremental else ("title", "asc")
         
-        # Сначала получаем метаданные плагинов (ограниченное количество страниц)
         while page <= self.max_pages:
-            logger.info(f"Fetching bulk page {page} (max: {self.max_pages})")
-            params = {
-                "page": page,
-                "per_page": per_page,
-                "sort": "title",
-                "sortdir": "asc",
-                "categories[0]": "universal",
-                "categories[1]": "rust"
-            }
-            
+            logger.info(f"Fetching page {page} (max: {self.max_pages})")
             try:
-                data = self._make_request(self.SEARCH_URL, params)
-                if not data.get("data"):
-                    logger.warning("No data in response")
+                data = self._make_request(self.SEARCH_URL, self._search_params(page, per_page, sort, sortdir))
+            except Exception as e:
+                logger.error(f"Error fetching page {page}: {e}")
+                break
+            
+            page_data = data.get("data") or []
+            if not page_data:
+                logger.warning("No data in response")
+                break
+            
+            total_pages = min(int(data.get("last_page", 1)), self.max_pages)
+            if incremental:
+                changed = [plugin_data for plugin_data in page_data if self.crawl_state.is_changed(plugin_data)]
+                logger.info(f"Page {page}: {len(changed)} of {len(page_data)} plugins changed")
+                # Страница без изменений — дальше только более старые плагины
+                if not changed:
                     break
-                
-                page_data = data["data"]
-                logger.info(f"Received {len(page_data)} plugins on page {page}")
-                all_plugin_data.extend(page_data)
-                
-                total_pages = min(int(data.get("last_page", 1)), self.max_pages)
+                yield changed
+            else:
                 logger.info(f"Fetched page {page} of {total_pages} ({len(page_data)} plugins)")
-                
-                if page >= total_pages:
-                    break
-                    
-                page += 1
-                # Увеличенная задержка между страницами
-                time.sleep(5 + random.uniform(1, 3))
-            except Exception as e:
-                logger.error(f"Error fetching bulk page {page}: {e}")
+                yield page_data
+            
+            if page >= total_pages:
                 break
+            page += 1
 
+    def get_all_plugins(self) -> List[Plugin]:
+        """Получает список плагинов с использованием bulk-загрузки (ограничено для тестирования)"""
+        # Сначала получаем метаданные плагинов (ограниченное количество страниц)
+        all_plugin_data = [plugin_data for page_data in self.iter_search_pages() for plugin_data in page_data]
         logger.info(f"Total plugins found: {len(all_plugin_data)}")
         
+        plugins = self._process_batches(all_plugin_data)
+        self._save_dataset(plugins)
+        return plugins
+    
+    def get_updated_plugins(self) -> List[Plugin]:
+        """Инкрементальный обход: обрабатывает только плагины, изменившиеся с прошлого запуска"""
+        changed_plugin_data = [
+            plugin_data for page_data in self.iter_search_pages(incremental=True) for plugin_data in page_data
+        ]
+        logger.info(f"Total changed plugins found: {len(changed_plugin_data)}")
+        
+        plugins = self._process_batches(changed_plugin_data)
+        self._save_dataset(plugins)
+        return plugins
+    
+    def _process_batches(self, all_plugin_data: List[Dict]) -> List[Plugin]:
+        """Обрабатывает и сохраняет данные плагинов пакетами"""
         # Обрабатываем данные пакетами для снижения нагрузки
         batch_size = 5  # Уменьшаем размер пакета
         plugins = []
         
         for i in range(0, len(all_plugin_data), batch_size):
             batch = all_plugin_data[i:i+batch_size]
-            logger.info(f"Processing batch {i//batch_size + 1} of {(len(all_plugin_data) + batch_size - 1) // batch_size}")
+            logger.info("Processing batch %d of %d", i // batch_size + 1, (len(all_plugin_data) + batch_size - 1) // batch_size)
+            self._process_batch(batch, plugins)
             
+            # Выводим текущую статистику после каждого пакета
+            self._print_current_stats()
+        
+        if self.storage is not None:
+            self.storage.close()
+        if self.manifest is not None:
+            self.manifest.save()
+        return plugins
+    
+    def _process_batch(self, batch: List[Dict], plugins: List[Plugin]):
+        """Обрабатывает записи одного пакета, сохраняет их одним батчем записи и продвигает состояние обхода"""
+        write_batch = self.storage.batch() if self.storage else None
+        saved = []
+        try:
             with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
                 future_to_plugin = {
                     executor.submit(self._process_plugin, plugin_data): plugin_data
@@ -161,30 +298,41 @@ class UmodParser:
                         plugin = future.result()
                         if plugin:
                             plugins.append(plugin)
-                            self._save_plugin_data(plugin)
+                            if self._save_plugin_data(plugin, write_batch):
+                                saved.append(plugin_data)
                     except Exception as e:
                         logger.error(f"Error processing plugin {plugin_data.get('name', 'unknown')}: {e}")
-            
-            # Выводим текущую статистику после каждого пакета
-            self._print_current_stats()
-            
-            # Добавляем паузу между пакетами
-            if i + batch_size < len(all_plugin_data):
-                wait_time = 10 + random.uniform(1, 5)
-                logger.info(f"Waiting {wait_time:.2f} seconds before processing next batch...")
-                time.sleep(wait_time)
+        except BaseException:
+            # Прерванный пакет не оставляет на диске ни одного своего файла
+            if write_batch is not None:
+                write_batch.rollback()
+            raise
+        if write_batch is not None:
+            write_batch.commit()
         
-        return plugins
+        # Состояние обхода продвигается только для плагинов, чьи файлы уже на месте
+        if self.crawl_state is not None:
+            for plugin_data in saved:
+                self.crawl_state.update(plugin_data)
+        
+        # Сохраняем состояние после каждого пакета (и только после записи его файлов),
+        # чтобы прерванный обход не начинался заново
+        if self.crawl_state is not None:
+            self.crawl_state.save()
         
     def _print_current_stats(self):
         """Выводит текущую статистику по обработанным файлам"""
-        if self.output_dir.exists():
-            files = list(self.output_dir.glob("*.json"))
-            logger.info(f"Current files in output directory: {len(files)}")
-            if len(files) > 0:
-                logger.info(f"Last 3 files: {', '.join([f.name for f in files[-3:]])}")
-                total_size = sum(f.stat().st_size for f in files)
-                logger.info(f"Total data size: {total_size} bytes")
+        # Обход директории вывода дорогой, поэтому без включенного INFO его не делаем
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        if self.manifest is not None:
+            # Манифест уже знает имена и размеры файлов: stat по каждому файлу не нужен
+            entries = self.manifest.file_entries()
+            logger.info(f"Current files in output directory: {len(entries)}")
+            if entries:
+                logger.info(f"Last 3 files: {', '.join(key for key, _ in entries[-3:])}")
+                logger.info(f"Total data size: {self.manifest.total_size()} bytes")
+        logger.info(f"Rate limiter: {self.rate_limiter.stats()}")
 
     def _process_plugin(self, data: Dict) -> Optional[Plugin]:
         """Обрабатывает данные одного плагина"""
@@ -194,7 +342,7 @@ class UmodParser:
                 logger.error("Plugin slug is missing")
                 return None
             
-            logger.info(f"Processing plugin: {plugin_id}")    
+            logger.info("Processing plugin: %s", plugin_id)
             name = str(data.get("name", data.get("title", "")))
             if not name:
                 logger.error(f"Plugin name is missing for slug: {plugin_id}")
@@ -208,24 +356,25 @@ class UmodParser:
             latest_version = str(data.get("latest_release_version", ""))
             total_downloads = int(data.get("downloads", 0))
             
-            # Упрощаем для тестирования - не запрашиваем дополнительные данные о версиях
-            versions = []
-            versions.append(PluginVersion(
-                version=latest_version or "unknown",
-                released_at=datetime.now(),
-                download_url=f"{self.PLUGIN_URL}/{plugin_id}/download/latest",
-                changelog=None
-            ))
+            # Полный список версий стоит дополнительных запросов, поэтому запрашивается по желанию
+            versions = self._get_plugin_versions(plugin_id) if self.fetch_versions else []
+            if not versions:
+                versions.append(PluginVersion(
+                    version=latest_version or "unknown",
+                    released_at=now_micros(),
+                    download_url=f"{self.PLUGIN_URL}/{plugin_id}/download/latest",
+                    changelog=None
+                ))
             
             created_at_str = data.get("created_at", "")
             updated_at_str = data.get("updated_at", "")
             
             try:
-                created_at = datetime.strptime(created_at_str, "%Y-%m-%d %H:%M:%S")
-                updated_at = datetime.strptime(updated_at_str, "%Y-%m-%d %H:%M:%S")
+                created_at = to_micros(created_at_str)
+                updated_at = to_micros(updated_at_str)
             except ValueError:
                 logger.warning(f"Invalid date format for plugin {plugin_id}, using current time")
-                created_at = updated_at = datetime.now()
+                created_at = updated_at = now_micros()
             
             # Разделяем категории, обрабатывая пустую строку
             category_tags = data.get("category_tags", "")
@@ -247,99 +396,120 @@ class UmodParser:
             logger.error(f"Error processing plugin data: {e}", exc_info=True)
             return None
 
+    def _parse_release_date(self, value: str) -> int:
+        """Разбирает дату выпуска версии (ISO с Z или "YYYY-MM-DD HH:MM:SS") в микросекунды"""
+        if value:
+            try:
+                return to_micros(value)
+            except ValueError:
+                logger.warning(f"Invalid date format: {value}, using current time")
+        return now_micros()
+
+    def _version_from_data(self, plugin_id: str, data: Dict) -> PluginVersion:
+        version = str(data.get("version") or "unknown")
+        return PluginVersion(
+            version=version,
+            released_at=self._parse_release_date(data.get("created_at") or data.get("released_at", "")),
+            download_url=data.get("download_url") or f"{self.PLUGIN_URL}/{plugin_id}/download/{version}",
+            changelog=data.get("changelog")
+        )
+
     def _get_plugin_versions(self, plugin_id: str) -> List[PluginVersion]:
-        """Получает все версии плагина"""
+        """Получает все версии плагина, от новой к старой.
+
+        Полный список выпусков берется из versions.json (постранично); если он
+        недоступен, возвращается только последняя версия из latest.json.
+        """
         versions = []
-        url = f"{self.PLUGIN_URL}/{plugin_id}/latest.json"
-        
         try:
-            data = self._make_request(url)
-            # Добавляем последнюю версию
-            # Обработка различных форматов дат
-            created_at_str = data.get("created_at", "")
-            if created_at_str:
-                try:
-                    if "Z" in created_at_str:
-                        released_at = datetime.fromisoformat(created_at_str.replace("Z", "+00:00"))
-                    else:
-                        released_at = datetime.strptime(created_at_str, "%Y-%m-%d %H:%M:%S")
-                except ValueError:
-                    logger.warning(f"Invalid date format: {created_at_str}, using current time")
-                    released_at = datetime.now()
-            else:
-                released_at = datetime.now()
-                
-            version = PluginVersion(
-                version=data.get("version", "unknown"),
-                released_at=released_at,
-                download_url=f"{self.PLUGIN_URL}/{plugin_id}/download/{data.get('version', 'latest')}",
-                changelog=data.get("changelog")
-            )
-            versions.append(version)
+            page = 1
+            while True:
+                data = self._make_request(f"{self.PLUGIN_URL}/{plugin_id}/versions.json", params={"page": page})
+                items = data.get("data", []) if isinstance(data, dict) else data
+                versions.extend(self._version_from_data(plugin_id, item) for item in items)
+                if not isinstance(data, dict) or not items or page >= int(data.get("last_page") or 1):
+                    break
+                page += 1
         except Exception as e:
-            logger.error(f"Error getting versions for plugin {plugin_id}: {e}")
+            logger.debug("Version list unavailable for plugin %s: %s", plugin_id, e)
+        
+        if not versions:
+            try:
+                data = self._make_request(f"{self.PLUGIN_URL}/{plugin_id}/latest.json")
+                versions.append(self._version_from_data(plugin_id, data))
+            except Exception as e:
+                logger.error(f"Error getting versions for plugin {plugin_id}: {e}")
         
+        versions.sort(key=lambda v: v.released_at_us, reverse=True)
         return versions
 
-    def _save_plugin_data(self, plugin: Plugin):
-        """Сохраняет данные плагина в JSON файл"""
-        plugin_file = self.output_dir / f"{plugin.id}.json"
-        logger.info(f"Saving plugin data to {plugin.name} ({plugin.id})")
+    def _save_dataset(self, plugins: List[Plugin]):
+        """Добавляет обработанные плагины в единый датасет, если он включен"""
+        if self.dataset_file and plugins:
+            update_dataset(self.dataset_file, [plugin.to_dict() for plugin in plugins])
+
+    def _save_plugin_data(self, plugin: Plugin, write_batch: Optional[WriteBatch] = None) -> bool:
+        """Сохраняет данные плагина в JSON файл (в составе пакета write_batch, если он задан).
+
+        Возвращает False, если файл записать не удалось; с пакетом файл окажется
+        на месте только после его commit.
+        """
+        if not self.write_per_file:
+            return True
         
-        plugin_data = {
-            "id": plugin.id,
-            "name": plugin.name,
-            "author": plugin.author,
-            "description": plugin.description,
-            "categories": plugin.categories,
-            "total_downloads": plugin.total_downloads,
-            "latest_version": plugin.latest_version,
-            "created_at": plugin.created_at.isoformat(),
-            "updated_at": plugin.updated_at.isoformat(),
-            "versions": [
-                {
-                    "version": v.version,
-                    "released_at": v.released_at.isoformat(),
-                    "download_url": v.download_url,
-                    "changelog": v.changelog
-                }
-                for v in plugin.versions
-            ]
-        }
+        plugin_file = self.output_dir / f"{plugin.id}.json"
+        logger.info("Saving plugin data to %s (%s)", plugin.name, plugin.id)
         
         try:
-            with open(plugin_file, "w", encoding="utf-8") as f:
-                json.dump(plugin_data, f, ensure_ascii=False, indent=2)
-                
-            # Проверка, что файл действительно создан
-            if plugin_file.exists():
-                logger.info(f"Successfully saved plugin data: {plugin.name} ({plugin_file.stat().st_size} bytes)")
+            if write_batch is not None:
+                write_batch.write(plugin_file, dumps(plugin.to_dict(), indent=True))
+                write_batch.after_commit(lambda: self.manifest.record_file(plugin_file))
             else:
-                logger.error(f"File not found after save attempt: {plugin.name}")
+                dump_json_file(plugin.to_dict(), plugin_file)
+                self.manifest.record_file(plugin_file)
+            metrics.inc("files_written_total", kind="json")
+            logger.info("Successfully saved plugin data: %s", plugin.name)
+            return True
         except Exception as e:
             logger.error(f"Error saving plugin data for {plugin.name}: {e}", exc_info=True)
+            return False
 
 def main():
+    arg_parser = argparse.ArgumentParser(description="Parse plugin metadata from umod.org")
+    arg_parser.add_argument("--incremental", action="store_true",
+                            help="only fetch plugins changed since the previous run")
+    arg_parser.add_argument("--dataset", metavar="FILE",
+                            help="also maintain a consolidated JSONL dataset (e.g. plugins_data.jsonl)")
+    arg_parser.add_argument("--versions", action="store_true",
+                            help="fetch the full release list of every plugin (one extra request per plugin)")
+    arg_parser.add_argument("--metrics", metavar="FILE",
+                            help="collect metrics and write them here (.json snapshot or Prometheus text)")
+    args = arg_parser.parse_args()
+    metrics.enabled = bool(args.metrics)
+    
     # Уменьшаем количество параллельных воркеров и ограничиваем страницы
-    parser = UmodParser(max_workers=2, max_pages=100000)
+    parser = UmodParser(max_workers=2, max_pages=100000, dataset_file=args.dataset, fetch_versions=args.versions)
     try:
-        plugins = parser.get_all_plugins()
+        if args.incremental:
+            plugins = parser.get_updated_plugins()
+        else:
+            plugins = parser.get_all_plugins()
         logger.info(f"Successfully parsed {len(plugins)} plugins")
         
-        # Выводим итоговую статистику
-        output_dir = Path("plugins_data")
-        if output_dir.exists():
-            files = list(output_dir.glob("*.json"))
-            logger.info(f"Total files in output directory: {len(files)}")
-            total_size = sum(f.stat().st_size for f in files)
-            logger.info(f"Total data size: {total_size} bytes")
-            
-            if len(files) > 0:
-                logger.info("Sample files:")
-                for file in files[:5]:  # Показываем первые 5 файлов
-                    logger.info(f"  - {file.name} ({file.stat().st_size} bytes)")
+        # Выводим итоговую статистику по манифесту, не обходя директорию
+        entries = parser.manifest.file_entries()
+        logger.info(f"Total files in output directory: {len(entries)}")
+        logger.info(f"Total data size: {parser.manifest.total_size()} bytes")
+        
+        if len(entries) > 0:
+            logger.info("Sample files:")
+            for key, entry in entries[:5]:  # Показываем первые 5 файлов
+                logger.info(f"  - {key} ({entry['files'][key][0]} bytes)")
     except Exception as e:
         logger.error(f"Error during parsing: {e}")
+    finally:
+        if args.metrics:
+            metrics.write(args.metrics)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
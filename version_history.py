@@ -0,0 +1,391 @@
+import argparse
+import bisect
+import hashlib
+import json
+import logging
+import re
+import struct
+import sys
+import threading
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from storage import atomic_write
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Операции дельты: скопировать строки [start, end) базовой версии или вставить байты
+COPY_OP = struct.Struct("<cII")
+INSERT_OP = struct.Struct("<cI")
+# Каждая KEYFRAME_INTERVAL-я версия (считая от самой старой) хранится целиком,
+# чтобы восстановление старой версии не проходило слишком длинную цепочку дельт
+KEYFRAME_INTERVAL = 10
+# Предел работы построения дельты: столько проходов по строкам обеих версий
+DELTA_WORK_FACTOR = 16
+
+def _match_lines(base_lines: List[bytes], target_lines: List[bytes], budget: int) -> Optional[List[Tuple[int, int]]]:
+    """Пары совпадающих строк (i, j) в порядке возрастания — patience diff.
+
+    В каждом участке отбрасываются общие начало и конец, затем опорными
+    становятся строки, встречающиеся в участке ровно по разу в обеих версиях
+    (наибольшая возрастающая подпоследовательность по base), и участки между
+    опорами разбираются так же. Участки без уникальных строк целиком считаются
+    замененными. Если просмотрено больше budget строк, возвращает None.
+    """
+    matches = []
+    regions = [(0, len(base_lines), 0, len(target_lines))]
+    while regions:
+        a_lo, a_hi, b_lo, b_hi = regions.pop()
+        while a_lo < a_hi and b_lo < b_hi and base_lines[a_lo] == target_lines[b_lo]:
+            matches.append((a_lo, b_lo))
+            a_lo += 1
+            b_lo += 1
+        while a_lo < a_hi and b_lo < b_hi and base_lines[a_hi - 1] == target_lines[b_hi - 1]:
+            a_hi -= 1
+            b_hi -= 1
+            matches.append((a_hi, b_hi))
+        if a_lo == a_hi or b_lo == b_hi:
+            continue
+
+        budget -= (a_hi - a_lo) + (b_hi - b_lo)
+        if budget < 0:
+            return None
+        # Счетчики строки в base и target и ее позиции
+        occurrences: Dict[bytes, List[int]] = {}
+        for i in range(a_lo, a_hi):
+            counts = occurrences.setdefault(base_lines[i], [0, 0, i, -1])
+            counts[0] += 1
+        for j in range(b_lo, b_hi):
+            counts = occurrences.get(target_lines[j])
+            if counts is not None:
+                counts[1] += 1
+                counts[3] = j
+        unique = sorted((j, i) for count_a, count_b, i, j in occurrences.values() if count_a == 1 and count_b == 1)
+        if not unique:
+            continue
+
+        # Наибольшая возрастающая по i подпоследовательность (patience sorting)
+        tails: List[int] = []
+        tail_pairs: List[int] = []
+        previous = [-1] * len(unique)
+        for index, (j, i) in enumerate(unique):
+            position = bisect.bisect_left(tails, i)
+            if position == len(tails):
+                tails.append(i)
+                tail_pairs.append(index)
+            else:
+                tails[position] = i
+                tail_pairs[position] = index
+            previous[index] = tail_pairs[position - 1] if position else -1
+        anchors = []
+        index = tail_pairs[-1]
+        while index != -1:
+            anchors.append(unique[index])
+            index = previous[index]
+        anchors.reverse()
+
+        start_a, start_b = a_lo, b_lo
+        for j, i in anchors:
+            matches.append((i, j))
+            regions.append((start_a, i, start_b, j))
+            start_a, start_b = i + 1, j + 1
+        regions.append((start_a, a_hi, start_b, b_hi))
+    matches.sort()
+    return matches
+
+def encode_delta(base: bytes, target: bytes) -> Optional[bytes]:
+    """Построчная дельта, превращающая base в target.
+
+    Работа линейна по числу строк (patience diff, см. _match_lines) и
+    ограничена DELTA_WORK_FACTOR проходами по обеим версиям; если дельта
+    оказывается дороже, возвращает None, и версия хранится целиком.
+    """
+    base_lines = base.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+    matches = _match_lines(base_lines, target_lines, DELTA_WORK_FACTOR * (len(base_lines) + len(target_lines)))
+    if matches is None:
+        return None
+
+    parts = []
+    next_target = 0
+    index = 0
+    while index < len(matches):
+        i, j = matches[index]
+        if j > next_target:
+            inserted = b"".join(target_lines[next_target:j])
+            parts.append(INSERT_OP.pack(b"I", len(inserted)))
+            parts.append(inserted)
+        # Подряд идущие совпадения — одна операция копирования
+        run = 1
+        while index + run < len(matches) and matches[index + run] == (i + run, j + run):
+            run += 1
+        parts.append(COPY_OP.pack(b"C", i, i + run))
+        next_target = j + run
+        index += run
+    if next_target < len(target_lines):
+        inserted = b"".join(target_lines[next_target:])
+        parts.append(INSERT_OP.pack(b"I", len(inserted)))
+        parts.append(inserted)
+    return b"".join(parts)
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    base_lines = base.splitlines(keepends=True)
+    result = []
+    position = 0
+    while position < len(delta):
+        op = delta[position:position + 1]
+        if op == b"C":
+            _, start, end = COPY_OP.unpack_from(delta, position)
+            result.extend(base_lines[start:end])
+            position += COPY_OP.size
+        elif op == b"I":
+            _, length = INSERT_OP.unpack_from(delta, position)
+            position += INSERT_OP.size
+            result.append(delta[position:position + length])
+            position += length
+        else:
+            raise ValueError(f"Corrupted delta at byte {position}")
+    return b"".join(result)
+
+def _version_file_name(version: str) -> str:
+    """Имя файла версии: читаемая часть и хеш самой версии, чтобы "1 0" и "1_0" не совпали"""
+    readable = re.sub(r'[^\w.-]', '_', version)
+    return f"{readable}-{hashlib.sha256(version.encode('utf-8')).hexdigest()[:8]}"
+
+class VersionStore:
+    """История версий исходников плагинов с дельта-сжатием.
+
+    Для каждого плагина хранится цепочка версий от старой к новой. Самая новая
+    версия лежит целиком (сжатой zlib), каждая более старая — обратной дельтой
+    от следующей за ней; каждая KEYFRAME_INTERVAL-я версия хранится целиком.
+    Последняя версия читается без восстановления, старые — проходом по цепочке.
+    Политики хранения задаются по умолчанию и для отдельных плагинов.
+    """
+
+    def __init__(self, root: str = "plugin_history", keyframe_interval: int = KEYFRAME_INTERVAL):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.keyframe_interval = keyframe_interval
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        self.policies_file = self.root / "policies.json"
+        self.policies = {"default": {}, "plugins": {}}
+        if self.policies_file.exists():
+            with open(self.policies_file, 'r', encoding='utf-8') as f:
+                self.policies = json.load(f)
+
+    def _lock(self, slug: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(slug, threading.Lock())
+
+    def _plugin_dir(self, slug: str) -> Path:
+        return self.root / slug
+
+    def versions(self, slug: str) -> List[Dict]:
+        """Записи о версиях плагина от самой старой к самой новой"""
+        manifest = self._plugin_dir(slug) / "manifest.json"
+        if not manifest.exists():
+            return []
+        with open(manifest, 'r', encoding='utf-8') as f:
+            return json.load(f)["versions"]
+
+    def _save_manifest(self, slug: str, entries: List[Dict]):
+        data = json.dumps({"slug": slug, "versions": entries}, ensure_ascii=False, indent=2).encode("utf-8")
+        atomic_write(self._plugin_dir(slug) / "manifest.json", data)
+
+    def has_version(self, slug: str, version: str) -> bool:
+        return any(entry["version"] == version for entry in self.versions(slug))
+
+    def _read_object(self, slug: str, entry: Dict) -> bytes:
+        return zlib.decompress((self._plugin_dir(slug) / entry["file"]).read_bytes())
+
+    def _reconstruct(self, slug: str, entries: List[Dict], index: int) -> bytes:
+        """Восстанавливает версию entries[index], поднимаясь по цепочке до полной копии"""
+        chain = []
+        position = index
+        while entries[position]["kind"] != "full":
+            chain.append(position)
+            position += 1
+        content = self._read_object(slug, entries[position])
+        for position in reversed(chain):
+            content = apply_delta(content, self._read_object(slug, entries[position]))
+        return content
+
+    def get_version(self, slug: str, version: Optional[str] = None) -> Optional[bytes]:
+        """Содержимое версии (последней, если version не задана) или None"""
+        entries = self.versions(slug)
+        for index in range(len(entries) - 1, -1, -1):
+            if version is None or entries[index]["version"] == version:
+                content = self._reconstruct(slug, entries, index)
+                if hashlib.sha256(content).hexdigest() != entries[index]["sha256"]:
+                    raise ValueError(f"Checksum mismatch for {slug} {entries[index]['version']}")
+                return content
+        return None
+
+    def _is_keyframe(self, index: int, count: int) -> bool:
+        return index == count - 1 or (index + 1) % self.keyframe_interval == 0
+
+    def _store_object(self, slug: str, entry: Dict, content: bytes, newer: Optional[bytes], keyframe: bool):
+        """Записывает версию целиком или дельтой от более новой версии, выбирая вариант меньше.
+
+        Имя файла содержит хеш записанных данных, поэтому новый объект никогда не
+        заменяет файл, на который еще ссылается сохраненный манифест; прежний
+        файл удаляет вызывающий код после сохранения нового манифеста.
+        """
+        data, kind = zlib.compress(content, 9), "full"
+        if not keyframe and newer is not None:
+            delta = encode_delta(newer, content)
+            # Дельта проверяется сразу: испорченная история хуже, чем лишние байты
+            if delta is not None and apply_delta(newer, delta) == content:
+                compressed_delta = zlib.compress(delta, 9)
+                if len(compressed_delta) < len(data):
+                    data, kind = compressed_delta, "delta"
+        file_name = f"{_version_file_name(entry['version'])}.{hashlib.sha256(data).hexdigest()[:12]}.{kind}"
+        atomic_write(self._plugin_dir(slug) / file_name, data)
+        entry.update(kind=kind, file=file_name, stored_size=len(data))
+
+    def _rewrite(self, slug: str, entries: List[Dict], contents: List[bytes]):
+        """Перезаписывает всю цепочку плагина по содержимому версий (от старой к новой)"""
+        plugin_dir = self._plugin_dir(slug)
+        keep_files = set()
+        for index in range(len(entries) - 1, -1, -1):
+            newer = contents[index + 1] if index + 1 < len(entries) else None
+            self._store_object(slug, entries[index], contents[index], newer,
+                               self._is_keyframe(index, len(entries)))
+            keep_files.add(entries[index]["file"])
+        # Прежние объекты удаляются только после того, как новый манифест перестал на них ссылаться
+        self._save_manifest(slug, entries)
+        for path in plugin_dir.iterdir():
+            if path.name != "manifest.json" and path.name not in keep_files:
+                path.unlink()
+
+    def add_version(self, slug: str, version: str, content: bytes, released_at: Optional[str] = None) -> bool:
+        """Добавляет версию в историю; False, если такая версия уже есть"""
+        with self._lock(slug):
+            self._plugin_dir(slug).mkdir(exist_ok=True)
+            entries = self.versions(slug)
+            if any(entry["version"] == version for entry in entries):
+                return False
+
+            entry = {
+                "version": version,
+                "released_at": released_at,
+                "sha256": hashlib.sha256(content).hexdigest(),
+                "size": len(content)
+            }
+            is_newest = not entries or (released_at or "") >= (entries[-1]["released_at"] or "")
+            if is_newest:
+                # Обычный случай: новая версия пишется целиком, прежняя последняя
+                # превращается в дельту от нее (если не должна остаться ключевой)
+                entries.append(entry)
+                self._store_object(slug, entry, content, None, keyframe=True)
+                replaced_file = None
+                if len(entries) > 1:
+                    previous = self._reconstruct(slug, entries, len(entries) - 2)
+                    replaced_file = entries[-2]["file"]
+                    self._store_object(slug, entries[-2], previous, content,
+                                       self._is_keyframe(len(entries) - 2, len(entries)))
+                self._save_manifest(slug, entries)
+                if replaced_file and replaced_file != entries[-2]["file"]:
+                    (self._plugin_dir(slug) / replaced_file).unlink(missing_ok=True)
+            else:
+                # Версия из прошлого: восстанавливаем все версии и пересобираем цепочку
+                contents = [self._reconstruct(slug, entries, index) for index in range(len(entries))]
+                position = next(index for index, other in enumerate(entries)
+                                if (other["released_at"] or "") > (released_at or ""))
+                entries.insert(position, entry)
+                contents.insert(position, content)
+                self._rewrite(slug, entries, contents)
+
+            logger.debug(f"Stored {slug} {version} as {entry['kind']} ({entry['stored_size']} bytes)")
+            return True
+
+    def policy(self, slug: str) -> Dict:
+        """Политика хранения плагина: keep_last (число версий) и max_age_days"""
+        return dict(self.policies["default"], **self.policies["plugins"].get(slug, {}))
+
+    def set_policy(self, slug: Optional[str] = None, keep_last: Optional[int] = None,
+                   max_age_days: Optional[int] = None):
+        """Задает политику для плагина или, если slug не указан, по умолчанию"""
+        policy = {key: value for key, value in (("keep_last", keep_last), ("max_age_days", max_age_days))
+                  if value is not None}
+        if slug:
+            self.policies["plugins"][slug] = policy
+        else:
+            self.policies["default"] = policy
+        atomic_write(self.policies_file, json.dumps(self.policies, indent=2).encode("utf-8"))
+
+    def apply_retention(self, slug: Optional[str] = None) -> int:
+        """Удаляет версии, не подходящие под политику; последняя версия сохраняется всегда"""
+        if slug is None:
+            return sum(self.apply_retention(path.name) for path in sorted(self.root.iterdir()) if path.is_dir())
+
+        with self._lock(slug):
+            entries = self.versions(slug)
+            policy = self.policy(slug)
+            keep = set(range(len(entries)))
+            if policy.get("keep_last"):
+                keep &= set(range(max(0, len(entries) - policy["keep_last"]), len(entries)))
+            if policy.get("max_age_days"):
+                cutoff = (datetime.now() - timedelta(days=policy["max_age_days"])).isoformat()
+                keep &= {index for index, entry in enumerate(entries) if (entry["released_at"] or "") >= cutoff}
+            if entries:
+                keep.add(len(entries) - 1)
+            if len(keep) == len(entries):
+                return 0
+
+            contents = [self._reconstruct(slug, entries, index) for index in sorted(keep)]
+            kept_entries = [entries[index] for index in sorted(keep)]
+            self._rewrite(slug, kept_entries, contents)
+            removed = len(entries) - len(kept_entries)
+            logger.info(f"Removed {removed} old versions of {slug}")
+            return removed
+
+    def stats(self) -> Dict[str, int]:
+        """Объем истории: число версий, исходный размер и занятое место"""
+        stats = {"plugins": 0, "versions": 0, "raw_bytes": 0, "stored_bytes": 0}
+        for path in self.root.iterdir():
+            if path.is_dir():
+                entries = self.versions(path.name)
+                stats["plugins"] += 1
+                stats["versions"] += len(entries)
+                stats["raw_bytes"] += sum(entry["size"] for entry in entries)
+                stats["stored_bytes"] += sum(entry["stored_size"] for entry in entries)
+        return stats
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Inspect and maintain the plugin version history")
+    arg_parser.add_argument("--root", default="plugin_history", help="history directory")
+    arg_parser.add_argument("--list", metavar="SLUG", help="list stored versions of a plugin")
+    arg_parser.add_argument("--show", nargs=2, metavar=("SLUG", "VERSION"), help="print a stored version")
+    arg_parser.add_argument("--policy", metavar="SLUG", nargs="?", const="",
+                            help="set the retention policy of a plugin (or the default without SLUG)")
+    arg_parser.add_argument("--keep-last", type=int, help="policy: number of most recent versions to keep")
+    arg_parser.add_argument("--max-age-days", type=int, help="policy: drop versions released earlier than this")
+    arg_parser.add_argument("--prune", action="store_true", help="apply retention policies")
+    args = arg_parser.parse_args()
+
+    store = VersionStore(args.root)
+    if args.policy is not None:
+        store.set_policy(args.policy or None, args.keep_last, args.max_age_days)
+    if args.prune:
+        logger.info(f"Removed {store.apply_retention()} versions")
+    if args.list:
+        for entry in store.versions(args.list):
+            print(f"{entry['version']:>12}  {entry['released_at'] or '-':<26} {entry['kind']:<5} "
+                  f"{entry['stored_size']:>8}/{entry['size']} bytes")
+    if args.show:
+        content = store.get_version(*args.show)
+        if content is None:
+            logger.error(f"Version not found: {args.show[0]} {args.show[1]}")
+        else:
+            sys.stdout.buffer.write(content)
+    if not (args.list or args.show):
+        logger.info(f"History: {store.stats()}")
+
+if __name__ == "__main__":
+    main()